@@ -1,9 +1,10 @@
 import os
+import hmac
 from datetime import datetime, timedelta
 from typing import Optional
 import jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
@@ -11,6 +12,8 @@ from sqlalchemy.orm import Session
 SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "b3c5e8d5f3a1b4e2c9a0d8f7e6c5b4a3")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
+# Shared secret for operator-only endpoints (profiling, bulk import); unset disables them
+ADMIN_API_TOKEN = os.environ.get("ADMIN_API_TOKEN", "").strip()
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/users/login")
@@ -38,3 +41,9 @@ def decode_token(token: str):
         return payload
     except jwt.PyJWTError:
         return None
+
+# Dependency for operator-only routes
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_API_TOKEN or not hmac.compare_digest(x_admin_token or "", ADMIN_API_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
+    return True
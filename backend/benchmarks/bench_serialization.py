@@ -0,0 +1,54 @@
+"""
+Serialization cost per /api/search response.
+Compares the previous path (build Pydantic models, re-validate through response_model,
+encode with stdlib json) with the SearchResult -> ORJSONResponse path.
+
+Run from backend/:  python -m benchmarks.bench_serialization
+"""
+
+import json
+import random
+import timeit
+from datetime import datetime, timedelta
+
+from pydantic import TypeAdapter
+
+from recommendation_engine import recommendation_engine
+from schemas import TravelSearchRequest, RecommendationResponse
+from streaming import ORJSONResponse
+
+ITERATIONS = 500
+
+
+def _legacy_encode(result, adapter):
+    response = result.to_schema()
+    validated = adapter.validate_python(response, from_attributes=True)
+    return json.dumps(adapter.dump_python(validated, mode="json")).encode()
+
+
+def _fast_encode(result):
+    return ORJSONResponse(result.to_payload()).body
+
+
+def main():
+    random.seed(42)
+    start = datetime(2026, 6, 1)
+    request = TravelSearchRequest(
+        origin="JFK", start_date=start, end_date=start + timedelta(days=6),
+        budget_max=6000, interests=["culture", "food", "adventure"]
+    )
+    result = recommendation_engine.search(request)
+    adapter = TypeAdapter(RecommendationResponse)
+
+    legacy = timeit.timeit(lambda: _legacy_encode(result, adapter), number=ITERATIONS)
+    fast = timeit.timeit(lambda: _fast_encode(result), number=ITERATIONS)
+    size = len(_fast_encode(result))
+
+    print(f"Response size: {size} bytes, {len(result.recommendations)} recommendations")
+    print(f"pydantic + json : {legacy / ITERATIONS * 1e6:8.1f} us/response")
+    print(f"orjson payload  : {fast / ITERATIONS * 1e6:8.1f} us/response")
+    print(f"speedup         : {legacy / fast:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Synthetic data generator
+Seeds the models with realistic volumes of users, preferences, itineraries, bookings,
+alerts and notifications using batched inserts.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from auth import get_password_hash
+from models import (
+    User, UserPreference, Itinerary, FlightBooking, HotelBooking, ActivityBooking,
+    FavoriteDestination, TravelHistory, PriceAlert, Notification
+)
+from services import AIRLINES, DESTINATIONS, HOTEL_CHAINS, ACTIVITIES_BY_CATEGORY
+
+BENCH_PASSWORD = "benchmark-password"
+
+VOLUMES = {
+    "small": {"users": 50, "itineraries_per_user": 4, "alerts_per_user": 3, "notifications_per_user": 40},
+    "medium": {"users": 500, "itineraries_per_user": 8, "alerts_per_user": 5, "notifications_per_user": 120},
+}
+
+STATUSES = ["draft", "draft", "confirmed", "completed", "cancelled"]
+
+
+def _bulk(db, model, rows):
+    if rows:
+        db.bulk_insert_mappings(model, rows)
+        rows.clear()
+
+
+def seed(db, volume: str = "small", seed: int = 1234) -> dict:
+    """Populate an empty database; returns the counts written and a sample user for the load driver."""
+    rng = random.Random(seed)
+    v = VOLUMES[volume]
+    # One bcrypt hash for every user keeps seeding fast while login still does a real verify
+    password_hash = get_password_hash(BENCH_PASSWORD)
+    now = datetime(2026, 6, 1)
+    dest_names = list(DESTINATIONS)
+    categories = list(ACTIVITIES_BY_CATEGORY)
+    tiers = list(HOTEL_CHAINS)
+
+    db.bulk_insert_mappings(User, [
+        {"email": f"bench{u}@example.com", "name": f"Bench User {u}", "password_hash": password_hash, "created_at": now}
+        for u in range(v["users"])
+    ])
+    db.commit()
+    user_ids = [uid for (uid,) in db.query(User.id).filter(User.email.like("bench%@example.com")).order_by(User.id)]
+
+    prefs, favorites, alerts, notifications, itineraries = [], [], [], [], []
+    for uid in user_ids:
+        prefs.append({
+            "user_id": uid,
+            "preferred_budget_min": 500,
+            "preferred_budget_max": rng.choice([2000, 4000, 8000]),
+            "preferred_activities": rng.sample(categories, 2),
+            "dietary_restrictions": [],
+            "preferred_travel_style": rng.choice(tiers),
+        })
+        for dest in rng.sample(dest_names, 3):
+            favorites.append({"user_id": uid, "destination_name": dest, "country": DESTINATIONS[dest]["country"], "created_at": now})
+        for _ in range(v["alerts_per_user"]):
+            active = rng.random() < 0.7
+            alerts.append({
+                "user_id": uid, "destination": rng.choice(dest_names), "target_price": rng.randint(300, 1500),
+                "is_active": active, "deactivated_at": None if active else now, "created_at": now,
+            })
+        for n in range(v["notifications_per_user"]):
+            notifications.append({
+                "user_id": uid, "type": rng.choice(["price_drop", "price_alert", "booking_confirmed"]),
+                "message": f"Synthetic notification {n}", "is_read": rng.random() < 0.6,
+                "created_at": now - timedelta(minutes=2 * n),
+            })
+        for i in range(v["itineraries_per_user"]):
+            start = now + timedelta(days=rng.randint(1, 180))
+            itineraries.append({
+                "user_id": uid, "name": f"Trip {i}", "destination": rng.choice(dest_names),
+                "start_date": start, "end_date": start + timedelta(days=rng.randint(3, 10)),
+                "total_budget": rng.randint(1500, 9000), "status": rng.choice(STATUSES),
+                "created_at": now, "updated_at": now,
+            })
+
+    for model, rows in ((UserPreference, prefs), (FavoriteDestination, favorites), (PriceAlert, alerts),
+                        (Notification, notifications), (Itinerary, itineraries)):
+        _bulk(db, model, rows)
+    db.commit()
+
+    flights, hotels, activities, history = [], [], [], []
+    for it in db.query(Itinerary.id, Itinerary.user_id, Itinerary.destination, Itinerary.start_date,
+                       Itinerary.end_date, Itinerary.status).filter(Itinerary.user_id.in_(user_ids)).order_by(Itinerary.id):
+        dest = DESTINATIONS[it.destination]
+        airline = rng.choice(AIRLINES)
+        flights.append({
+            "itinerary_id": it.id, "airline": airline["name"], "flight_number": f"{airline['code']}{rng.randint(100, 9999)}",
+            "departure_airport": "JFK", "arrival_airport": dest["airport"],
+            "departure_time": it.start_date + timedelta(hours=rng.randint(6, 20)),
+            "arrival_time": it.start_date + timedelta(hours=rng.randint(21, 30)),
+            "price": round(dest["base_price"] * rng.uniform(0.8, 1.4), 2), "is_booked": it.status != "draft",
+        })
+        chain = rng.choice(HOTEL_CHAINS[rng.choice(tiers)])
+        nights = max(1, (it.end_date - it.start_date).days)
+        nightly = round(chain["base_price"] * rng.uniform(0.85, 1.25), 2)
+        hotels.append({
+            "itinerary_id": it.id, "hotel_name": f"{chain['name']} {it.destination.title()}", "address": "123 Main Street",
+            "check_in_date": it.start_date, "check_out_date": it.end_date, "room_type": "King Room",
+            "price_per_night": nightly, "total_price": round(nightly * nights, 2), "rating": chain["rating"],
+            "is_booked": it.status != "draft",
+        })
+        for _ in range(rng.randint(2, 6)):
+            category = rng.choice(categories)
+            template = rng.choice(ACTIVITIES_BY_CATEGORY[category])
+            activities.append({
+                "itinerary_id": it.id, "activity_name": f"{template['name']} in {it.destination.title()}",
+                "description": f"Synthetic {category} activity", "location": it.destination.title(),
+                "scheduled_date": it.start_date + timedelta(days=rng.randint(0, nights), hours=rng.randint(9, 18)),
+                "duration_hours": template["duration"], "price": round(template["base_price"] * rng.uniform(0.9, 1.3), 2),
+                "category": category, "is_booked": it.status != "draft",
+            })
+        if it.status == "completed":
+            history.append({
+                "user_id": it.user_id, "itinerary_id": it.id, "destination": it.destination,
+                "travel_date": it.start_date, "rating": rng.randint(1, 5),
+            })
+
+    bookings = len(flights) + len(hotels) + len(activities)
+    for model, rows in ((FlightBooking, flights), (HotelBooking, hotels), (ActivityBooking, activities), (TravelHistory, history)):
+        _bulk(db, model, rows)
+    db.commit()
+
+    return {
+        "users": len(user_ids),
+        "bookings": bookings,
+        "itineraries": len(user_ids) * v["itineraries_per_user"],
+        "alerts": len(user_ids) * v["alerts_per_user"],
+        "notifications": len(user_ids) * v["notifications_per_user"],
+        "sample_user_id": user_ids[0],
+        "sample_email": "bench0@example.com",
+    }
@@ -0,0 +1,74 @@
+"""
+In-process load driver
+Fires concurrent requests at the ASGI app through httpx (no network, no uvicorn) and
+reports latency percentiles and throughput per endpoint scenario.
+"""
+
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.datagen import BENCH_PASSWORD
+from benchmarks.timing import summarize
+
+SEARCH_BODY = {
+    "origin": "JFK",
+    "start_date": "2026-06-01T00:00:00",
+    "end_date": "2026-06-07T00:00:00",
+    "budget_max": 6000,
+    "interests": ["culture", "food"],
+}
+
+
+def _scenarios(user_ids):
+    """Each scenario maps a request index to (method, url, json body)."""
+    def pick(i):
+        return user_ids[i % len(user_ids)]
+
+    return {
+        "http.search": lambda i: ("POST", "/api/search", SEARCH_BODY),
+        "http.itineraries_list": lambda i: ("GET", f"/api/itineraries/user/{pick(i)}", None),
+        "http.notifications": lambda i: ("GET", f"/api/users/{pick(i)}/notifications", None),
+        "http.login": lambda i: ("POST", "/api/users/login",
+                                 {"email": f"bench{i % len(user_ids)}@example.com", "password": BENCH_PASSWORD}),
+    }
+
+
+async def _drive(client, make_request, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        method, url, body = make_request(i)
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    stats = summarize(latencies, time.perf_counter() - wall_start)
+    stats["errors"] = errors
+    return stats
+
+
+async def _run(app, user_ids, requests: int, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, make_request in _scenarios(user_ids).items():
+            # Login is bcrypt-bound; keep its request count proportionate
+            count = max(concurrency, requests // 5) if name == "http.login" else requests
+            await _drive(client, make_request, min(count, concurrency), concurrency)  # warm-up
+            results[name] = await _drive(client, make_request, count, concurrency)
+    return results
+
+
+def run(app, user_ids, quick: bool = False, concurrency: int = 16) -> dict:
+    requests = 100 if quick else 600
+    return asyncio.run(_run(app, user_ids, requests, concurrency))
@@ -0,0 +1,97 @@
+"""
+Micro-benchmarks for the recommendation engine stages and PDFService.
+Candidate pools are generated once with a fixed seed so every run scores the same offers.
+"""
+
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from pydantic import TypeAdapter
+
+from recommendation_engine import RecommendationEngine, _top_k
+from schemas import TravelSearchRequest, RecommendationResponse
+from services import FlightService, HotelService, ActivityService
+from pdf_service import PDFService
+from benchmarks.bench_serialization import _legacy_encode, _fast_encode
+from benchmarks.timing import measure
+
+
+def _request() -> TravelSearchRequest:
+    start = datetime(2026, 6, 1)
+    return TravelSearchRequest(
+        origin="JFK", destination="paris", start_date=start, end_date=start + timedelta(days=6),
+        budget_max=6000, interests=["culture", "food", "adventure"], travel_style="mid-range"
+    )
+
+
+def _candidate_pool(request, copies: int):
+    """Scale up the mock provider output to a realistic candidate count."""
+    flights, hotels, activities = [], [], []
+    for _ in range(copies):
+        flights += FlightService.search_flights(request.origin, "paris", request.start_date, request.end_date)
+        hotels += HotelService.search_hotels("paris", request.start_date, request.end_date)
+        activities += ActivityService.search_activities("paris", request.start_date, request.end_date, request.interests)
+    return flights, hotels, activities
+
+
+def _sample_itinerary():
+    """Same fields as pdf_export.snapshot_itinerary, so the benchmark exercises the day planner too."""
+    start = datetime(2026, 6, 1)
+    end = start + timedelta(days=6)
+    categories = ["culture", "food", "adventure", "relaxation"]
+    return SimpleNamespace(
+        id=1, destination="paris", start_date=start, end_date=end, total_budget=5200.0,
+        flights=[
+            SimpleNamespace(airline="Delta Airlines", flight_number="DL123", departure_airport="JFK",
+                            arrival_airport="CDG", price=640.0, departure_time=start.replace(hour=8),
+                            arrival_time=start.replace(hour=21)),
+            SimpleNamespace(airline="Delta Airlines", flight_number="DL124", departure_airport="CDG",
+                            arrival_airport="JFK", price=640.0, departure_time=end.replace(hour=11),
+                            arrival_time=end.replace(hour=14)),
+        ],
+        hotels=[SimpleNamespace(hotel_name="Hilton Paris City Center", room_type="King Room", total_price=1100.0)],
+        activities=[SimpleNamespace(id=i + 1, activity_name=f"Museum Tour {i}", duration_hours=3, price=45.0,
+                                    description="Experience an amazing museum tour during your visit to Paris. " * 2,
+                                    scheduled_date=start + timedelta(days=1 + i % 4, hours=10) if i % 2 else None,
+                                    category=categories[i % len(categories)], is_booked=i % 3 == 0)
+                    for i in range(8)],
+    )
+
+
+def run(quick: bool = False) -> dict:
+    random.seed(2024)
+    iterations = 50 if quick else 300
+    engine = RecommendationEngine()
+    request = _request()
+    flights, hotels, activities = _candidate_pool(request, copies=20)
+
+    results = {}
+    results["engine.score_flights"] = measure(lambda: engine._score_flights(flights, request), iterations)
+    results["engine.score_hotels"] = measure(lambda: engine._score_hotels(hotels, request), iterations)
+    results["engine.score_activities"] = measure(lambda: engine._score_activities(activities, request), iterations)
+
+    scored_hotels = engine._score_hotels(hotels, request)
+    scored_activities = engine._score_activities(activities, request)
+    results["engine.select_top_k"] = measure(
+        lambda: (_top_k(scored_hotels, 3), _top_k(scored_activities, 5)), iterations
+    )
+    results["engine.match_score"] = measure(
+        lambda: engine._calculate_match_score(flights[:3], hotels[:3], activities[:5], request), iterations
+    )
+    results["engine.build_recommendation"] = measure(
+        lambda: engine._build_recommendation("paris", request), iterations
+    )
+
+    open_request = request.model_copy(update={"destination": None})
+    result = engine.search(open_request)
+    adapter = TypeAdapter(RecommendationResponse)
+    results["serialize.search_legacy"] = measure(lambda: _legacy_encode(result, adapter), iterations)
+    results["serialize.search_orjson"] = measure(lambda: _fast_encode(result), iterations)
+
+    itinerary = _sample_itinerary()
+    user = SimpleNamespace(name="Bench User")
+    results["pdf.render_itinerary"] = measure(
+        lambda: PDFService.render_itinerary_pdf(itinerary, user), 10 if quick else 50, warmup=2
+    )
+    return results
@@ -0,0 +1,130 @@
+"""
+Benchmark runner
+Seeds a throwaway SQLite database, runs the micro-benchmarks and the in-process load
+driver, writes the results as JSON and compares them against a stored baseline.
+
+Run from backend/:
+    python -m benchmarks.run                  # run and compare against the baseline
+    python -m benchmarks.run --save-baseline  # run and record a new baseline
+    python -m benchmarks.run --quick          # fewer iterations (CI smoke run)
+
+Exits with status 1 when any metric regresses beyond --tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, "baselines", "baseline.json")
+RESULTS_PATH = os.path.join(BENCH_DIR, "results", "latest.json")
+
+# Latency metrics regress when they go up, throughput when it goes down
+COMPARED_METRICS = {"p50_us": 1, "p95_us": 1, "ops_per_sec": -1}
+
+
+def _prepare_database(volume: str) -> dict:
+    # Must run before models (and anything importing it) is imported
+    db_path = os.path.join(tempfile.mkdtemp(prefix="smart_travel_bench_"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    # Same search -> same offers, so runs are comparable
+    os.environ.setdefault("MOCK_PROVIDER_MODE", "seeded")
+    # The load driver is a single client; rate limits would turn the run into a 429 benchmark
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+    from models import init_db, SessionLocal
+    from benchmarks.datagen import seed
+
+    init_db()
+    db = SessionLocal()
+    try:
+        return seed(db, volume=volume)
+    finally:
+        db.close()
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Return human-readable regressions of current results against the baseline."""
+    regressions = []
+    for name, stats in current["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if not base:
+            continue
+        for metric, direction in COMPARED_METRICS.items():
+            old, new = base.get(metric), stats.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * direction
+            if change > tolerance:
+                regressions.append(f"{name}.{metric}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Smart Travel benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations")
+    parser.add_argument("--volume", default="small", choices=["small", "medium"])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--tolerance", type=float, default=0.20, help="allowed relative regression (0.20 = 20%%)")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--skip-load", action="store_true", help="micro-benchmarks only")
+    args = parser.parse_args(argv)
+
+    counts = _prepare_database(args.volume)
+
+    from benchmarks import micro, load
+
+    benchmarks = micro.run(quick=args.quick)
+    if not args.skip_load:
+        from main import app
+        from models import SessionLocal, User
+
+        db = SessionLocal()
+        user_ids = [uid for (uid,) in db.query(User.id).order_by(User.id)]
+        db.close()
+        benchmarks.update(load.run(app, user_ids, quick=args.quick, concurrency=args.concurrency))
+
+    report = {
+        "generated_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "volume": args.volume,
+        "dataset": counts,
+        "benchmarks": benchmarks,
+    }
+
+    for name, stats in benchmarks.items():
+        print(f"{name:32s} p50 {stats['p50_us']:>12,.1f} us   p95 {stats['p95_us']:>12,.1f} us   {stats['ops_per_sec']:>10,.1f} ops/s")
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "w") as fh:
+        json.dump(report, fh, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Baseline saved to {BASELINE_PATH}")
+        return 0
+
+    if not os.path.exists(BASELINE_PATH):
+        print("No baseline found; run with --save-baseline to record one.")
+        return 0
+
+    with open(BASELINE_PATH) as fh:
+        baseline = json.load(fh)
+    regressions = compare(report, baseline, args.tolerance)
+    if regressions:
+        print("\nRegressions against baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+"""Timing helpers shared by the micro and load benchmarks."""
+
+import statistics
+import time
+from typing import Callable, List
+
+
+def summarize(samples: List[float], wall_seconds: float = None) -> dict:
+    """Latency summary in microseconds for a list of per-call durations (seconds)."""
+    ordered = sorted(samples)
+    n = len(ordered)
+
+    def pct(p):
+        return ordered[min(n - 1, int(p * n))] * 1e6
+
+    total = wall_seconds if wall_seconds is not None else sum(ordered)
+    return {
+        "count": n,
+        "mean_us": round(statistics.fmean(ordered) * 1e6, 2),
+        "p50_us": round(pct(0.50), 2),
+        "p95_us": round(pct(0.95), 2),
+        "p99_us": round(pct(0.99), 2),
+        "ops_per_sec": round(n / total, 2) if total > 0 else 0.0,
+    }
+
+
+def measure(fn: Callable, iterations: int, warmup: int = 5) -> dict:
+    """Call fn repeatedly and summarize the per-call latency."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
@@ -0,0 +1,344 @@
+"""
+Bulk Import / Export
+Loads users (with preferences) and itineraries from CSV or NDJSON streams for account
+onboarding. Input is read incrementally and handled in chunks: each chunk is validated
+with the import schemas, passwords are bcrypt-hashed in a process pool (rows that carry an
+exported password_hash keep it as is), and rows are
+written with one bulk insert per table and one commit per chunk. Rows that fail are
+reported by number; the rest of the file still loads. Exports stream the same
+records back out of the database in either format; user exports include password_hash so
+they can be imported again.
+
+    python bulk_import.py users accounts.csv
+    python bulk_import.py itineraries trips.ndjson
+"""
+
+import codecs
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Tuple
+
+import anyio
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from auth import get_password_hash
+from metrics import Counter, REGISTRY
+from models import SessionLocal, User, UserPreference, Itinerary
+from schemas import UserImportRecord, ItineraryImportRecord, UserPreferenceCreate, ImportRowError, BulkImportResponse
+from streaming import dumps, STREAM_BATCH_SIZE
+
+logger = logging.getLogger("bulk_import")
+logger.setLevel(logging.INFO)
+ch = logging.StreamHandler()
+ch.setFormatter(logging.Formatter('BULK-IMPORT: %(message)s'))
+logger.addHandler(ch)
+
+IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", "1000"))
+# bcrypt dominates user imports; it parallelises across processes, not threads
+IMPORT_HASH_PROCESSES = int(os.environ.get("IMPORT_HASH_PROCESSES") or os.cpu_count() or 1)
+IMPORT_MAX_REPORTED_ERRORS = int(os.environ.get("IMPORT_MAX_REPORTED_ERRORS", "500"))
+
+IMPORT_KINDS = ("users", "itineraries")
+FORMATS = ("csv", "ndjson")
+PREFERENCE_FIELDS = tuple(UserPreferenceCreate.model_fields)
+EXPORT_FIELDS = {
+    "users": ("email", "name", "password_hash") + PREFERENCE_FIELDS + ("created_at",),
+    "itineraries": ("user_email", "name", "destination", "start_date", "end_date", "total_budget",
+                    "status", "booked_total", "created_at"),
+}
+
+IMPORT_ROWS_TOTAL = Counter("smarttravel_import_rows_total", "Bulk import rows by kind and outcome", ["kind", "outcome"])
+REGISTRY.append(IMPORT_ROWS_TOTAL)
+
+_pool = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Spawned, not forked: the server and scheduler are multithreaded, and a forked child can
+        # inherit a lock some other thread held at fork time and deadlock on it
+        _pool = ProcessPoolExecutor(max_workers=IMPORT_HASH_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _reset_pool():
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+@dataclass(slots=True)
+class ImportReport:
+    kind: str
+    processed: int = 0
+    inserted: int = 0
+    failed: int = 0
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+
+    def fail(self, row: int, message: str):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append((row, message))
+
+    def to_schema(self) -> BulkImportResponse:
+        return BulkImportResponse.model_construct(
+            kind=self.kind, processed=self.processed, inserted=self.inserted, failed=self.failed,
+            errors=[ImportRowError.model_construct(row=row, error=error) for row, error in sorted(self.errors)]
+        )
+
+
+# ---------- Input parsing ----------
+
+def _lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Decode a byte stream incrementally into lines (newlines kept, a leading BOM dropped)."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def parse_records(chunks: Iterable[bytes], fmt: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """(row number, raw record, parse error) for every data row of a CSV or NDJSON stream."""
+    lines = _lines(chunks)
+    if fmt == "csv":
+        for row, record in enumerate(csv.DictReader(lines), start=1):
+            # Blank cells mean "not given" so schema defaults apply; None keys are surplus columns
+            yield row, {k.strip(): v for k, v in record.items() if k is not None and v not in (None, "")}, None
+        return
+    row = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield row, None, "expected a JSON object"
+            continue
+        yield row, record, None
+
+
+def _validate(schema, record: dict):
+    try:
+        return schema.model_validate(record), None
+    except ValidationError as e:
+        error = e.errors()[0]
+        location = '.'.join(str(p) for p in error['loc'])
+        return None, f"{location}: {error['msg']}" if location else error['msg']
+
+
+def _chunks(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+# ---------- Loaders (one chunk each) ----------
+# accept(db, rows, report) rejects rows that conflict with the database and returns the rest;
+# insert(db, accepted) writes them and commits.
+
+def _accept_users(db: Session, rows: List[Tuple[int, UserImportRecord]], report: ImportReport) -> list:
+    emails = [record.email for _, record in rows]
+    taken = {email for (email,) in db.query(User.email).filter(User.email.in_(emails))}
+    accepted = []
+    for row, record in rows:
+        if record.email in taken:
+            report.fail(row, "email: Email already registered")
+            continue
+        taken.add(record.email)  # a repeat later in the file is a duplicate too
+        accepted.append((row, record))
+    return accepted
+
+
+def _insert_users(db: Session, accepted: List[Tuple[int, UserImportRecord]]):
+    # Exported rows already carry a bcrypt hash; only plain passwords go through the pool
+    passwords = [record.password for _, record in accepted if not record.password_hash]
+    chunksize = max(1, len(passwords) // (IMPORT_HASH_PROCESSES * 4))
+    new_hashes = iter(_get_pool().map(get_password_hash, passwords, chunksize=chunksize) if passwords else ())
+    hashes = [record.password_hash or next(new_hashes) for _, record in accepted]
+
+    now = datetime.utcnow()
+    db.bulk_insert_mappings(User, [
+        {"email": record.email, "name": record.name, "password_hash": password_hash, "created_at": now}
+        for (_, record), password_hash in zip(accepted, hashes)
+    ])
+    ids = dict(db.query(User.email, User.id).filter(User.email.in_([record.email for _, record in accepted])))
+    db.bulk_insert_mappings(UserPreference, [
+        {"user_id": ids[record.email], **record.model_dump(include=set(PREFERENCE_FIELDS))}
+        for _, record in accepted
+    ])
+    db.commit()
+
+
+def _accept_itineraries(db: Session, rows: List[Tuple[int, ItineraryImportRecord]], report: ImportReport) -> list:
+    owners = dict(db.query(User.email, User.id).filter(User.email.in_({record.user_email for _, record in rows})))
+    accepted = []
+    for row, record in rows:
+        user_id = owners.get(record.user_email)
+        if user_id is None:
+            report.fail(row, f"user_email: no account for {record.user_email}")
+        elif record.end_date < record.start_date:
+            report.fail(row, "end_date: before start_date")
+        else:
+            accepted.append((row, {"user_id": user_id, **record.model_dump(exclude={"user_email"})}))
+    return accepted
+
+
+def _insert_itineraries(db: Session, accepted: List[Tuple[int, dict]]):
+    now = datetime.utcnow()
+    db.bulk_insert_mappings(Itinerary, [{**mapping, "created_at": now, "updated_at": now} for _, mapping in accepted])
+    db.commit()
+
+
+LOADERS = {
+    "users": (UserImportRecord, _accept_users, _insert_users),
+    "itineraries": (ItineraryImportRecord, _accept_itineraries, _insert_itineraries),
+}
+
+
+def import_records(chunks: Iterable[bytes], kind: str, fmt: str) -> ImportReport:
+    """Validate and insert every record of the stream, chunk by chunk; blocking."""
+    schema, accept, insert = LOADERS[kind]
+    report = ImportReport(kind=kind)
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        for chunk in _chunks(parse_records(chunks, fmt), IMPORT_CHUNK_SIZE):
+            report.processed += len(chunk)
+            valid = []
+            for row, record, error in chunk:
+                if error is None:
+                    record, error = _validate(schema, record)
+                if error is not None:
+                    report.fail(row, error)
+                else:
+                    valid.append((row, record))
+            accepted = accept(db, valid, report) if valid else []
+            if not accepted:
+                continue
+            try:
+                insert(db, accepted)
+                report.inserted += len(accepted)
+            except SQLAlchemyError as e:
+                db.rollback()
+                for row, _ in accepted:
+                    report.fail(row, f"database rejected chunk: {e.__class__.__name__}")
+                logger.error(f"{kind} chunk ending at row {chunk[-1][0]} failed: {e}")
+            except BrokenProcessPool as e:
+                # A hash worker died; drop the pool so the next chunk (or import) starts a fresh one
+                _reset_pool()
+                db.rollback()
+                for row, _ in accepted:
+                    report.fail(row, "password hashing failed, chunk not imported")
+                logger.error(f"{kind} chunk ending at row {chunk[-1][0]} lost its hash workers: {e}")
+    finally:
+        db.close()
+    IMPORT_ROWS_TOTAL.inc(report.inserted, kind, "inserted")
+    IMPORT_ROWS_TOTAL.inc(report.failed, kind, "failed")
+    logger.info(f"Imported {report.inserted}/{report.processed} {kind} in {time.perf_counter() - started:.1f}s "
+                f"({report.failed} failed)")
+    return report
+
+
+def blocking_chunks(stream: AsyncIterator[bytes]) -> Iterator[bytes]:
+    """
+    Read an async byte stream (a request body) from a worker thread, one chunk per call
+    into the event loop, so a blocking importer can consume it without buffering it whole.
+    """
+    iterator = stream.__aiter__()
+    while True:
+        try:
+            yield anyio.from_thread.run(iterator.__anext__)
+        except StopAsyncIteration:
+            return
+
+
+# ---------- Export ----------
+
+def _export_rows(db: Session, kind: str) -> Iterator[dict]:
+    if kind == "users":
+        query = db.query(User, UserPreference).outerjoin(UserPreference, UserPreference.user_id == User.id)
+        for user, prefs in query.order_by(User.id).yield_per(STREAM_BATCH_SIZE):
+            row = {"email": user.email, "name": user.name, "password_hash": user.password_hash,
+                   "created_at": user.created_at}
+            row.update({name: getattr(prefs, name, None) for name in PREFERENCE_FIELDS})
+            yield row
+    else:
+        query = db.query(Itinerary, User.email).join(User, Itinerary.user_id == User.id)
+        for itinerary, email in query.order_by(Itinerary.id).yield_per(STREAM_BATCH_SIZE):
+            row = {name: getattr(itinerary, name) for name in EXPORT_FIELDS["itineraries"][1:]}
+            row["user_email"] = email
+            yield row
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return ";".join(str(v) for v in value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return "" if value is None else value
+
+
+def export_records(kind: str, fmt: str) -> Iterator[bytes]:
+    """Stream every record of `kind` in batches; uses its own session since it outlives the request."""
+    fields = EXPORT_FIELDS[kind]
+    db = SessionLocal()
+    try:
+        if fmt == "csv":
+            out = io.StringIO()
+            writer = csv.writer(out)
+            writer.writerow(fields)
+            for batch in _chunks(_export_rows(db, kind), STREAM_BATCH_SIZE):
+                writer.writerows([_csv_value(row[name]) for name in fields] for row in batch)
+                yield out.getvalue().encode()
+                out.seek(0)
+                out.truncate()
+            if out.tell():
+                yield out.getvalue().encode()
+        else:
+            for batch in _chunks(_export_rows(db, kind), STREAM_BATCH_SIZE):
+                yield b"".join(dumps({name: row[name] for name in fields}) + b"\n" for row in batch)
+    finally:
+        db.close()
+
+
+def main():
+    if len(sys.argv) != 3 or sys.argv[1] not in IMPORT_KINDS:
+        sys.exit(f"usage: python bulk_import.py {{{'|'.join(IMPORT_KINDS)}}} FILE.csv|FILE.ndjson")
+    kind, path = sys.argv[1], sys.argv[2]
+    fmt = "csv" if path.lower().endswith(".csv") else "ndjson"
+    with open(path, "rb") as f:
+        report = import_records(iter(lambda: f.read(1 << 16), b""), kind, fmt)
+    for row, error in report.errors:
+        print(f"row {row}: {error}")
+    if report.failed > len(report.errors):
+        print(f"... and {report.failed - len(report.errors)} more")
+    print(f"{report.inserted} of {report.processed} {kind} imported")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Search Request Coalescing
+Single-flight layer in front of the recommendation engine: concurrent searches with the
+same normalized TravelSearchRequest share one pipeline run, and each caller's
+preferences are applied afterwards as a cheap re-rank of the shared result.
+"""
+
+import json
+import threading
+from concurrent.futures import Future
+
+from schemas import TravelSearchRequest
+from offers import SearchResult
+from metrics import Counter, REGISTRY
+
+SEARCH_COALESCED_TOTAL = Counter(
+    "smarttravel_search_coalesced_total", "Searches by single-flight role", ["role"])
+REGISTRY.append(SEARCH_COALESCED_TOTAL)
+
+
+def search_key(search_request: TravelSearchRequest) -> str:
+    """
+    Identity of a search. TravelSearchRequest already normalizes case and whitespace, so
+    this only has to make interest order irrelevant.
+    """
+    return json.dumps({
+        "destination": search_request.destination,
+        "origin": search_request.origin,
+        "start_date": search_request.start_date.isoformat(),
+        "end_date": search_request.end_date.isoformat(),
+        "budget_min": search_request.budget_min,
+        "budget_max": search_request.budget_max,
+        "travelers": search_request.travelers,
+        "interests": sorted(search_request.interests),
+        "travel_style": search_request.travel_style,
+    }, sort_keys=True)
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers wait on the leader's future."""
+
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if not leader:
+            SEARCH_COALESCED_TOTAL.inc(1, "follower")
+            return future.result()
+
+        SEARCH_COALESCED_TOTAL.inc(1, "leader")
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+search_flight = SingleFlight()
+
+
+def coalesced_search(engine, search_request: TravelSearchRequest, user_preferences=None) -> SearchResult:
+    """
+    Shared, preference-free pipeline run followed by a per-caller personalization pass (UserFeatures).
+    Collaborative-filtering candidates widen the destination set, so they are part of the key.
+    """
+    extra = engine.collaborative_destinations(search_request, user_preferences)
+    key = search_key(search_request) + ("|" + ",".join(extra) if extra else "")
+    shared = search_flight.do(key, lambda: engine.search(search_request, extra_destinations=extra))
+    return engine.personalize(shared, search_request, user_preferences)
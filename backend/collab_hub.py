@@ -0,0 +1,202 @@
+"""
+Collaborative Editing Hub
+One broadcast channel per itinerary: committed changes (booking adds/removes, updates,
+status changes) are pushed to every collaborator connected over /ws/itineraries/{id}.
+Delivery within a worker is in-process; set COLLAB_HUB_BACKEND=redis (with REDIS_URL)
+to fan changes out across workers through Redis pub/sub.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+
+from metrics import Counter, REGISTRY
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger("collab_hub")
+logger.setLevel(logging.INFO)
+ch = logging.StreamHandler()
+ch.setFormatter(logging.Formatter('COLLAB-HUB: %(message)s'))
+logger.addHandler(ch)
+
+COLLAB_HUB_BACKEND = os.environ.get("COLLAB_HUB_BACKEND", "memory").strip().lower()
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+# Messages buffered per connection; a client that falls further behind is told to resync
+SUBSCRIBER_QUEUE_SIZE = int(os.environ.get("COLLAB_SUBSCRIBER_QUEUE_SIZE", "100"))
+CHANNEL_PREFIX = "smarttravel:itinerary:"
+# Listener reconnect backoff after a Redis error: doubles from the first value up to the cap
+RECONNECT_BACKOFF_SECONDS = (0.5, 30.0)
+
+COLLAB_MESSAGES_TOTAL = Counter(
+    "smarttravel_collab_messages_total", "Collaboration messages by outcome", ["outcome"])
+REGISTRY.append(COLLAB_MESSAGES_TOTAL)
+
+RESYNC = json.dumps({"type": "resync"})
+
+
+class Subscription:
+    """One connected client: a bounded queue drained by its WebSocket task."""
+
+    __slots__ = ("itinerary_id", "queue", "loop")
+
+    def __init__(self, itinerary_id: int, loop: asyncio.AbstractEventLoop):
+        self.itinerary_id = itinerary_id
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.loop = loop
+
+    def push(self, message: str):
+        """Runs on the subscription's event loop."""
+        if self.queue.full():
+            # Too far behind to catch up message by message; the client refetches /changes
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            COLLAB_MESSAGES_TOTAL.inc(1, "resync")
+            return
+        self.queue.put_nowait(message)
+        COLLAB_MESSAGES_TOTAL.inc(1, "delivered")
+
+
+class LocalFanout:
+    """Subscriptions in this worker, keyed by itinerary."""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def add(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions[subscription.itinerary_id].add(subscription)
+
+    def remove(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.itinerary_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.itinerary_id]
+
+    def deliver(self, itinerary_id: int, message: str):
+        """Thread-safe: publishers run in the request thread pool, subscribers on the event loop."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(itinerary_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, message)
+            except RuntimeError:
+                # Loop already closed; the connection's own cleanup removes it
+                self.remove(subscription)
+
+
+class MemoryBackend:
+    def __init__(self, fanout: LocalFanout):
+        self.fanout = fanout
+
+    def publish(self, itinerary_id: int, message: str):
+        self.fanout.deliver(itinerary_id, message)
+
+    def start(self):
+        pass
+
+
+class RedisBackend:
+    """Publishes to Redis; a listener thread delivers every worker's messages locally."""
+
+    def __init__(self, fanout: LocalFanout, url: str):
+        self.fanout = fanout
+        self._client = redis.Redis.from_url(url)
+        self._listener: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def publish(self, itinerary_id: int, message: str):
+        self._client.publish(f"{CHANNEL_PREFIX}{itinerary_id}", message)
+
+    def start(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="collab-hub-redis", daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        """Runs for the life of the process; a dropped connection is retried with backoff."""
+        delay, max_delay = RECONNECT_BACKOFF_SECONDS
+        while True:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                for item in pubsub.listen():
+                    # Traffic is flowing again, so the next failure starts from the short delay
+                    delay = RECONNECT_BACKOFF_SECONDS[0]
+                    self._deliver(item)
+            except Exception as e:
+                # Messages published while disconnected are lost; clients notice the version gap and resync
+                COLLAB_MESSAGES_TOTAL.inc(1, "listener_error")
+                logger.error(f"Redis listener disconnected ({e}); reconnecting in {delay:.1f}s")
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            time.sleep(delay)
+            delay = min(max_delay, delay * 2)
+
+    def _deliver(self, item: dict):
+        try:
+            channel = item["channel"].decode() if isinstance(item["channel"], bytes) else item["channel"]
+            data = item["data"].decode() if isinstance(item["data"], bytes) else item["data"]
+            self.fanout.deliver(int(channel[len(CHANNEL_PREFIX):]), data)
+        except Exception as e:
+            logger.error(f"Dropping malformed hub message: {e}")
+
+
+def _make_backend(fanout: LocalFanout):
+    if COLLAB_HUB_BACKEND == "redis":
+        if redis is None:
+            raise RuntimeError("COLLAB_HUB_BACKEND=redis requires the 'redis' package")
+        return RedisBackend(fanout, REDIS_URL)
+    return MemoryBackend(fanout)
+
+
+class CollaborationHub:
+    def __init__(self):
+        self.fanout = LocalFanout()
+        self.backend = _make_backend(self.fanout)
+
+    def subscribe(self, itinerary_id: int) -> Subscription:
+        """Call from the WebSocket's event loop."""
+        self.backend.start()
+        subscription = Subscription(itinerary_id, asyncio.get_running_loop())
+        self.fanout.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.fanout.remove(subscription)
+
+    def publish(self, itinerary_id: int, version: int, changes: list):
+        """Broadcast committed changes; never raises into the request that made them."""
+        self._send(itinerary_id, json.dumps(
+            {"type": "changes", "itinerary_id": itinerary_id, "version": version, "changes": changes}
+        ))
+
+    def publish_deleted(self, itinerary_id: int):
+        """Tell collaborators the itinerary is gone; there is no change log left to catch up from."""
+        self._send(itinerary_id, json.dumps({"type": "deleted", "itinerary_id": itinerary_id}))
+
+    def _send(self, itinerary_id: int, message: str):
+        try:
+            self.backend.publish(itinerary_id, message)
+        except Exception as e:
+            COLLAB_MESSAGES_TOTAL.inc(1, "publish_error")
+            logger.error(f"Broadcast for itinerary #{itinerary_id} failed: {e}")
+
+
+hub = CollaborationHub()
@@ -0,0 +1,174 @@
+"""
+Collaborative-Filtering Destination Suggestions
+Batch job that builds a sparse user x destination interaction matrix (CSR) from favorites,
+travel history and itineraries, computes item-item cosine similarity from co-occurrence,
+and stores each destination's top neighbours in destination_neighbours. Searches then mix
+in "people like you went to" candidates from that table without touching the
+interaction tables.
+"""
+
+import logging
+import math
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import SessionLocal, FavoriteDestination, TravelHistory, Itinerary, DestinationNeighbours
+
+logger = logging.getLogger("collaborative")
+logger.setLevel(logging.INFO)
+ch = logging.StreamHandler()
+ch.setFormatter(logging.Formatter('COLLABORATIVE: %(message)s'))
+logger.addHandler(ch)
+
+# Interaction strength per signal; a user's weight for a destination is the strongest one
+FAVORITE_WEIGHT = 3.0
+TRIP_WEIGHT = 2.0  # scaled by rating/5 when the trip was rated
+ITINERARY_WEIGHT = 1.0
+NEIGHBOURS_PER_DESTINATION = 20
+# Co-occurrence is quadratic in a user's row length; only their strongest items count
+MAX_ITEMS_PER_USER = 50
+
+
+class CSRMatrix:
+    """Compressed sparse rows: row i's columns are indices[indptr[i]:indptr[i+1]]."""
+
+    __slots__ = ("shape", "indptr", "indices", "data")
+
+    def __init__(self, shape: Tuple[int, int], indptr: List[int], indices: List[int], data: List[float]):
+        self.shape = shape
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @classmethod
+    def from_entries(cls, shape: Tuple[int, int], entries: Dict[Tuple[int, int], float]) -> "CSRMatrix":
+        rows = defaultdict(list)
+        for (row, col), value in entries.items():
+            rows[row].append((col, value))
+        indptr, indices, data = [0], [], []
+        for row in range(shape[0]):
+            for col, value in sorted(rows.get(row, ())):
+                indices.append(col)
+                data.append(value)
+            indptr.append(len(indices))
+        return cls(shape, indptr, indices, data)
+
+    def row(self, i: int) -> Tuple[List[int], List[float]]:
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end], self.data[start:end]
+
+    @property
+    def nnz(self) -> int:
+        return len(self.data)
+
+
+def build_interactions(db: Session) -> Tuple[CSRMatrix, List[str]]:
+    """User x destination matrix; columns are lower-cased destination names."""
+    weights = {}
+
+    def add(user_id: int, destination: str, weight: float):
+        key = (user_id, destination.strip().lower())
+        if weight > weights.get(key, 0):
+            weights[key] = weight
+
+    for user_id, name in db.query(FavoriteDestination.user_id, FavoriteDestination.destination_name):
+        add(user_id, name, FAVORITE_WEIGHT)
+    for user_id, name, rating in db.query(TravelHistory.user_id, TravelHistory.destination, TravelHistory.rating):
+        add(user_id, name, TRIP_WEIGHT * (rating / 5 if rating else 1.0))
+    for user_id, name in db.query(Itinerary.user_id, Itinerary.destination):
+        add(user_id, name, ITINERARY_WEIGHT)
+
+    users = {u: i for i, u in enumerate(sorted({u for u, _ in weights}))}
+    items = sorted({d for _, d in weights})
+    columns = {d: i for i, d in enumerate(items)}
+    entries = {(users[u], columns[d]): w for (u, d), w in weights.items()}
+    return CSRMatrix.from_entries((len(users), len(items)), entries), items
+
+
+def item_similarities(matrix: CSRMatrix, k: int = NEIGHBOURS_PER_DESTINATION) -> Dict[int, List[Tuple[int, float]]]:
+    """Top-k cosine neighbours per column, from co-occurrence accumulated row by row (X^T X)."""
+    norms = defaultdict(float)
+    cooccurrence = defaultdict(float)
+    for i in range(matrix.shape[0]):
+        cols, vals = matrix.row(i)
+        if len(cols) > MAX_ITEMS_PER_USER:
+            strongest = sorted(zip(vals, cols), reverse=True)[:MAX_ITEMS_PER_USER]
+            vals, cols = [v for v, _ in strongest], [c for _, c in strongest]
+        for a in range(len(cols)):
+            norms[cols[a]] += vals[a] * vals[a]
+            for b in range(a + 1, len(cols)):
+                cooccurrence[(cols[a], cols[b])] += vals[a] * vals[b]
+
+    neighbours = defaultdict(list)
+    for (a, b), dot in cooccurrence.items():
+        sim = dot / math.sqrt(norms[a] * norms[b])
+        neighbours[a].append((b, sim))
+        neighbours[b].append((a, sim))
+    return {item: sorted(row, key=lambda x: -x[1])[:k] for item, row in neighbours.items()}
+
+
+def rebuild_neighbours(db: Session) -> int:
+    """Batch job body: recompute and replace the destination_neighbours table."""
+    matrix, items = build_interactions(db)
+    table = item_similarities(matrix)
+    db.query(DestinationNeighbours).delete()
+    now = datetime.utcnow()
+    db.bulk_insert_mappings(DestinationNeighbours, [
+        {
+            "destination": items[item],
+            "neighbours": [[items[other], round(sim, 4)] for other, sim in row],
+            "updated_at": now,
+        }
+        for item, row in table.items()
+    ])
+    db.commit()
+    logger.info(f"Rebuilt neighbours for {len(table)} destinations from {matrix.nnz} interactions of {matrix.shape[0]} users")
+    return len(table)
+
+
+class NeighbourTable:
+    """In-memory copy of destination_neighbours, reloaded after each batch run."""
+
+    def __init__(self):
+        self._table: Optional[Dict[str, List[Tuple[str, float]]]] = None
+        self._lock = threading.Lock()
+
+    def load(self, db: Session = None):
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            table = {row.destination: [tuple(n) for n in row.neighbours] for row in db.query(DestinationNeighbours)}
+        finally:
+            if own_session:
+                db.close()
+        self._table = table
+
+    def suggest(self, seeds: Dict[str, float], exclude: Iterable[str] = (), limit: int = 5) -> List[str]:
+        """Destinations most similar to the weighted seed set, seeds and exclusions removed."""
+        if self._table is None:
+            with self._lock:
+                if self._table is None:
+                    self.load()
+        skip = {d.lower() for d in exclude} | set(seeds)
+        scores = defaultdict(float)
+        for seed, weight in seeds.items():
+            for other, sim in self._table.get(seed, ()):
+                if other not in skip:
+                    scores[other] += weight * sim
+        return [d for d, _ in sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:limit]]
+
+
+neighbour_table = NeighbourTable()
+
+
+def run_batch():
+    db = SessionLocal()
+    try:
+        rebuild_neighbours(db)
+        neighbour_table.load(db)
+    finally:
+        db.close()
@@ -0,0 +1,166 @@
+"""
+Similar-Destination Index
+Feature vectors over the destination catalogue (price tier, country, booked activity
+category mix, users who favorited it) and a precomputed nearest-neighbour table, so
+"destinations like X" is a dict lookup. The full table is rebuilt periodically; a
+favorite change recomputes only that destination's similarity row.
+"""
+
+import logging
+import math
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import SessionLocal, FavoriteDestination, Itinerary, ActivityBooking
+from services import DESTINATIONS
+from feature_store import INTEREST_CATEGORIES, INTEREST_ALIASES
+
+logger = logging.getLogger("destination_index")
+logger.setLevel(logging.INFO)
+ch = logging.StreamHandler()
+ch.setFormatter(logging.Formatter('DESTINATION-INDEX: %(message)s'))
+logger.addHandler(ch)
+
+# base_price upper bounds of each tier: budget, mid, upper, long-haul
+PRICE_TIER_BOUNDS = (350, 600, 900)
+SIMILARITY_WEIGHTS = {"price": 0.3, "country": 0.2, "categories": 0.25, "cofavorites": 0.25}
+NEIGHBOURS_PER_DESTINATION = 10
+
+
+def price_tier(base_price: float) -> int:
+    return sum(base_price > bound for bound in PRICE_TIER_BOUNDS)
+
+
+def _cosine(a: Tuple[float, ...], b: Tuple[float, ...]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a) * sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class DestinationIndex:
+    """Pairwise similarity rows plus the top neighbours of every catalogue destination."""
+
+    def __init__(self, neighbours: int = NEIGHBOURS_PER_DESTINATION):
+        self.neighbours = neighbours
+        self._categories: Dict[str, Tuple[float, ...]] = {}
+        self._fans: Dict[str, FrozenSet[int]] = {}
+        self._sims: Dict[str, Dict[str, float]] = {}
+        self._table: Dict[str, List[Tuple[str, float]]] = {}
+        self._built = False
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="destination-index")
+
+    def similar(self, destination: str, limit: int = 5) -> Optional[List[Tuple[str, float]]]:
+        """Most similar catalogue destinations as (name, similarity), or None if unknown."""
+        if not self._built:
+            self.rebuild()
+        neighbours = self._table.get(destination.strip().lower())
+        return None if neighbours is None else neighbours[:limit]
+
+    def rebuild(self, db: Session = None):
+        """Recompute every vector and similarity row from the interaction tables."""
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            categories = self._load_categories(db)
+            fans = self._load_fans(db)
+        finally:
+            if own_session:
+                db.close()
+        with self._lock:
+            self._categories = {d: categories.get(d, ()) for d in DESTINATIONS}
+            self._fans = {d: fans.get(d, frozenset()) for d in DESTINATIONS}
+            self._sims = {d: {} for d in DESTINATIONS}
+            names = list(DESTINATIONS)
+            for i, a in enumerate(names):
+                for b in names[i + 1:]:
+                    self._sims[a][b] = self._sims[b][a] = self._similarity(a, b)
+            self._select_all()
+            self._built = True
+        logger.info(f"Rebuilt similarity index over {len(DESTINATIONS)} destinations")
+
+    def schedule_update(self, destination: str):
+        """Queue an incremental update after a destination's favorites changed."""
+        key = destination.strip().lower()
+        if key not in DESTINATIONS:
+            return
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._executor.submit(self._update_job, key)
+
+    def _update_job(self, destination: str):
+        with self._lock:
+            self._pending.discard(destination)
+        if not self._built:
+            return  # the first lookup builds everything
+        db = SessionLocal()
+        try:
+            fans = self._load_fans(db, destination).get(destination, frozenset())
+            with self._lock:
+                self._fans[destination] = fans
+                for other in DESTINATIONS:
+                    if other != destination:
+                        self._sims[destination][other] = self._sims[other][destination] = self._similarity(destination, other)
+                self._select_all()
+        except Exception as e:
+            logger.error(f"Index update failed for {destination}: {e}")
+        finally:
+            db.close()
+
+    def _similarity(self, a: str, b: str) -> float:
+        info_a, info_b = DESTINATIONS[a], DESTINATIONS[b]
+        fans_a, fans_b = self._fans[a], self._fans[b]
+        cofavorites = len(fans_a & fans_b) / math.sqrt(len(fans_a) * len(fans_b)) if fans_a and fans_b else 0.0
+        parts = {
+            "price": 1 - abs(price_tier(info_a["base_price"]) - price_tier(info_b["base_price"])) / len(PRICE_TIER_BOUNDS),
+            "country": 1.0 if info_a["country"] == info_b["country"] else 0.0,
+            "categories": _cosine(self._categories[a], self._categories[b]),
+            "cofavorites": cofavorites,
+        }
+        return round(sum(SIMILARITY_WEIGHTS[k] * v for k, v in parts.items()), 4)
+
+    def _select_all(self):
+        # Rows are tiny (one entry per catalogue destination), so a full re-sort stays cheap
+        self._table = {
+            d: sorted(row.items(), key=lambda x: (-x[1], x[0]))[:self.neighbours]
+            for d, row in self._sims.items()
+        }
+
+    @staticmethod
+    def _load_categories(db: Session) -> Dict[str, Tuple[float, ...]]:
+        """Share of booked activities per interest category, by destination."""
+        counts = defaultdict(lambda: [0.0] * len(INTEREST_CATEGORIES))
+        index = {c: i for i, c in enumerate(INTEREST_CATEGORIES)}
+        rows = (
+            db.query(func.lower(Itinerary.destination), func.lower(ActivityBooking.category), func.count(ActivityBooking.id))
+            .join(Itinerary, ActivityBooking.itinerary_id == Itinerary.id)
+            .filter(ActivityBooking.category.isnot(None))
+            .group_by(func.lower(Itinerary.destination), func.lower(ActivityBooking.category))
+            .all()
+        )
+        for destination, category, count in rows:
+            i = index.get(INTEREST_ALIASES.get(category, category))
+            if i is not None:
+                counts[destination][i] += count
+        return {d: tuple(c / (sum(v) or 1) for c in v) for d, v in counts.items()}
+
+    @staticmethod
+    def _load_fans(db: Session, destination: str = None) -> Dict[str, FrozenSet[int]]:
+        query = db.query(func.lower(FavoriteDestination.destination_name), FavoriteDestination.user_id)
+        if destination is not None:
+            query = query.filter(func.lower(FavoriteDestination.destination_name) == destination)
+        fans = defaultdict(set)
+        for name, user_id in query.all():
+            fans[name].add(user_id)
+        return {d: frozenset(users) for d, users in fans.items()}
+
+
+destination_index = DestinationIndex()
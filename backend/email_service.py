@@ -1,8 +1,10 @@
 import logging
 import os
 import smtplib
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from metrics import SMTP_SEND_SECONDS
 
 logger = logging.getLogger("email_service")
 logger.setLevel(logging.INFO)
@@ -23,6 +25,7 @@ class EmailService:
         """Send real email via SMTP. Returns True on success."""
         if not SMTP_HOST or not SMTP_USER or not SMTP_PASSWORD:
             return False
+        start = time.perf_counter()
         try:
             msg = MIMEMultipart("alternative")
             msg["Subject"] = subject
@@ -35,8 +38,10 @@ class EmailService:
                 server.starttls()
                 server.login(SMTP_USER, SMTP_PASSWORD)
                 server.sendmail(SMTP_USER, to_email, msg.as_string())
+            SMTP_SEND_SECONDS.observe(time.perf_counter() - start, "sent")
             return True
         except Exception as e:
+            SMTP_SEND_SECONDS.observe(time.perf_counter() - start, "failed")
             logger.error(f"SMTP send failed: {e}")
             return False
 
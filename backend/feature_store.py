@@ -0,0 +1,268 @@
+"""
+Personalization Feature Store
+Per-user feature vectors (interest weights, price sensitivity, preferred hotel rating band,
+budget range) plus destination affinities from favorites, trips and itineraries. Vectors
+are recomputed when a user's preferences, favorites or itineraries change and persisted
+in user_feature_vectors, so the read path is a dict lookup instead of several queries.
+"""
+
+import logging
+import threading
+from collections import OrderedDict, Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import (
+    SessionLocal, User, UserPreference, FavoriteDestination, TravelHistory, Itinerary,
+    HotelBooking, ActivityBooking, UserFeatureVector
+)
+
+logger = logging.getLogger("feature_store")
+logger.setLevel(logging.INFO)
+ch = logging.StreamHandler()
+ch.setFormatter(logging.Formatter('FEATURE-STORE: %(message)s'))
+logger.addHandler(ch)
+
+INTEREST_CATEGORIES = ("adventure", "culture", "relaxation", "food", "nightlife")
+FEATURE_NAMES = tuple(f"interest_{c}" for c in INTEREST_CATEGORIES) + (
+    "price_sensitivity", "star_low", "star_high", "budget_min", "budget_max",
+)
+INTEREST_INDEX = {c: i for i, c in enumerate(INTEREST_CATEGORIES)}
+PRICE_SENSITIVITY, STAR_LOW, STAR_HIGH, BUDGET_MIN, BUDGET_MAX = range(len(INTEREST_CATEGORIES), len(FEATURE_NAMES))
+
+# Synonyms users pick that map onto the activity categories the providers return
+INTEREST_ALIASES = {"culinary": "food", "spa": "relaxation", "history": "culture", "entertainment": "nightlife"}
+
+STYLE_PRICE_SENSITIVITY = {"budget": 0.8, "mid-range": 0.5, "luxury": 0.2}
+STYLE_STAR_BAND = {"budget": (3.0, 4.0), "mid-range": (3.8, 4.6), "luxury": (4.5, 5.0)}
+DEFAULT_STAR_BAND = (3.5, 5.0)
+FEATURE_CACHE_SIZE = 10000
+
+
+@dataclass(slots=True)
+class UserFeatures:
+    user_id: int
+    vector: Tuple[float, ...]
+    destination_affinity: Dict[str, float] = field(default_factory=dict)
+    preferred_activities: List[str] = field(default_factory=list)
+    travel_style: Optional[str] = None
+
+    def interest_weight(self, category: str) -> float:
+        category = category.lower()
+        index = INTEREST_INDEX.get(INTEREST_ALIASES.get(category, category))
+        return self.vector[index] if index is not None else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "user_id": self.user_id,
+            "features": dict(zip(FEATURE_NAMES, self.vector)),
+            "destination_affinity": self.destination_affinity,
+            "preferred_activities": self.preferred_activities,
+            "travel_style": self.travel_style,
+        }
+
+
+def compute_features(db: Session, user_id: int) -> UserFeatures:
+    """Build a user's features from preferences, bookings, trips and favorites."""
+    prefs = db.query(UserPreference).filter(UserPreference.user_id == user_id).first()
+    preferred_activities = list(prefs.preferred_activities or []) if prefs else []
+    travel_style = prefs.preferred_travel_style if prefs else None
+
+    # Interest weights: stated preferences count fully, booked activity categories add evidence
+    interests = Counter()
+    for activity in preferred_activities:
+        interests[INTEREST_ALIASES.get(activity.lower(), activity.lower())] += 1.0
+    booked_categories = (
+        db.query(ActivityBooking.category)
+        .join(Itinerary, ActivityBooking.itinerary_id == Itinerary.id)
+        .filter(Itinerary.user_id == user_id, ActivityBooking.category.isnot(None))
+        .all()
+    )
+    for (category,) in booked_categories:
+        interests[INTEREST_ALIASES.get(category.lower(), category.lower())] += 0.5
+    top = max(interests.values(), default=0) or 1.0
+    interest_weights = [min(1.0, interests.get(c, 0) / top) for c in INTEREST_CATEGORIES]
+
+    # Price sensitivity and star band: stated travel style wins, else inferred from booked hotels
+    hotel_rows = (
+        db.query(HotelBooking.price_per_night, HotelBooking.rating)
+        .join(Itinerary, HotelBooking.itinerary_id == Itinerary.id)
+        .filter(Itinerary.user_id == user_id)
+        .all()
+    )
+    if travel_style in STYLE_PRICE_SENSITIVITY:
+        price_sensitivity = STYLE_PRICE_SENSITIVITY[travel_style]
+        star_low, star_high = STYLE_STAR_BAND[travel_style]
+    elif hotel_rows:
+        avg_nightly = sum(r.price_per_night for r in hotel_rows) / len(hotel_rows)
+        price_sensitivity = 0.7 if avg_nightly < 120 else 0.2 if avg_nightly > 300 else 0.5
+        ratings = [r.rating for r in hotel_rows if r.rating]
+        if ratings:
+            mean = sum(ratings) / len(ratings)
+            star_low, star_high = max(0.0, mean - 0.3), min(5.0, mean + 0.3)
+        else:
+            star_low, star_high = DEFAULT_STAR_BAND
+    else:
+        price_sensitivity = 0.5
+        star_low, star_high = DEFAULT_STAR_BAND
+
+    # Destination affinity: favorites > rated past trips > planned itineraries
+    affinity = {}
+    for (name,) in db.query(Itinerary.destination).filter(Itinerary.user_id == user_id).all():
+        affinity[name.lower()] = max(affinity.get(name.lower(), 0), 0.4)
+    for destination, rating in db.query(TravelHistory.destination, TravelHistory.rating).filter(TravelHistory.user_id == user_id).all():
+        score = rating / 5 if rating else 0.6
+        affinity[destination.lower()] = max(affinity.get(destination.lower(), 0), score)
+    for (name,) in db.query(FavoriteDestination.destination_name).filter(FavoriteDestination.user_id == user_id).all():
+        affinity[name.lower()] = 1.0
+
+    vector = tuple(interest_weights) + (
+        price_sensitivity, star_low, star_high,
+        float(prefs.preferred_budget_min or 0) if prefs else 0.0,
+        float(prefs.preferred_budget_max or 0) if prefs else 0.0,
+    )
+    return UserFeatures(
+        user_id=user_id,
+        vector=vector,
+        destination_affinity=affinity,
+        preferred_activities=preferred_activities,
+        travel_style=travel_style,
+    )
+
+
+class FeatureStore:
+    """LRU of UserFeatures backed by the user_feature_vectors table."""
+
+    def __init__(self, size: int = FEATURE_CACHE_SIZE):
+        self.size = size
+        self._cache = OrderedDict()
+        self._pending = set()
+        # Bumped by every recompute and invalidation; a read-path fill that started under an
+        # older generation lost the race and must not overwrite the cached vector
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="feature-store")
+
+    def get(self, user_id: int, db: Session = None) -> UserFeatures:
+        with self._lock:
+            features = self._cache.get(user_id)
+            if features is not None:
+                self._cache.move_to_end(user_id)
+                return features
+            generation = self._generations.get(user_id, 0)
+
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            row = db.query(UserFeatureVector).filter(UserFeatureVector.user_id == user_id).first()
+            if row is not None and len(row.vector) == len(FEATURE_NAMES):
+                features = self._from_row(row)
+            else:
+                # First use (or FEATURE_NAMES changed): compute once and persist
+                computed = compute_features(db, user_id)
+                features = self._persist(db, computed)
+                if features is None:
+                    # Unknown user: serve the defaults but keep them out of the table and the LRU
+                    return computed
+        finally:
+            if own_session:
+                db.close()
+        self._put(features, generation)
+        return features
+
+    def schedule_update(self, user_id: int = None, itinerary_id: int = None):
+        """Queue a background recompute after a user's preferences, favorites or itineraries changed."""
+        key = ("user", user_id) if user_id is not None else ("itinerary", itinerary_id)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._executor.submit(self._update_job, key)
+
+    def _update_job(self, key: tuple):
+        with self._lock:
+            self._pending.discard(key)
+        db = SessionLocal()
+        try:
+            kind, ident = key
+            user_id = ident
+            if kind == "itinerary":
+                row = db.query(Itinerary.user_id).filter(Itinerary.id == ident).first()
+                if row is None:
+                    return
+                user_id = row.user_id
+            features = self._persist(db, compute_features(db, user_id), overwrite=True)
+            if features is not None:
+                self._put(features)
+        except Exception as e:
+            # Keep serving the previous vector; the next change retries
+            logger.error(f"Feature update failed for {key[0]} #{key[1]}: {e}")
+        finally:
+            db.close()
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._cache.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def _persist(self, db: Session, features: UserFeatures, overwrite: bool = False) -> Optional[UserFeatures]:
+        """Write the user's row and return the features now stored, or None for an unknown user.
+
+        If a concurrent first use inserted the row first, a read-path fill (overwrite=False)
+        keeps that row and returns it; a recompute updates it.
+        """
+        if db.query(User.id).filter(User.id == features.user_id).first() is None:
+            return None
+        row = db.query(UserFeatureVector).filter(UserFeatureVector.user_id == features.user_id).first()
+        if row is None:
+            row = UserFeatureVector(user_id=features.user_id)
+            db.add(row)
+        self._fill_row(row, features)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            row = db.query(UserFeatureVector).filter(UserFeatureVector.user_id == features.user_id).one()
+            if not overwrite and len(row.vector) == len(FEATURE_NAMES):
+                return self._from_row(row)
+            self._fill_row(row, features)
+            db.commit()
+        return features
+
+    @staticmethod
+    def _fill_row(row: UserFeatureVector, features: UserFeatures):
+        row.vector = list(features.vector)
+        row.destination_affinity = features.destination_affinity
+        row.preferred_activities = list(features.preferred_activities)
+        row.travel_style = features.travel_style
+
+    @staticmethod
+    def _from_row(row: UserFeatureVector) -> UserFeatures:
+        return UserFeatures(
+            user_id=row.user_id,
+            vector=tuple(row.vector),
+            destination_affinity=dict(row.destination_affinity or {}),
+            preferred_activities=list(row.preferred_activities or []),
+            travel_style=row.travel_style,
+        )
+
+    def _put(self, features: UserFeatures, generation: int = None):
+        """Cache a vector. Recomputes (no generation) always win and start a new generation;
+        read-path fills pass the generation they started under and are dropped if it moved on."""
+        with self._lock:
+            current = self._generations.get(features.user_id, 0)
+            if generation is None:
+                self._generations[features.user_id] = current + 1
+            elif generation != current:
+                return
+            self._cache[features.user_id] = features
+            self._cache.move_to_end(features.user_id)
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+
+
+feature_store = FeatureStore()
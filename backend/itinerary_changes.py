@@ -0,0 +1,191 @@
+"""
+Itinerary Versioning & Change Log
+Every mutation of an itinerary or its bookings bumps Itinerary.version and appends
+ItineraryChange rows carrying that version, so clients holding version N can fetch
+just the changes since N instead of the whole itinerary. Batches of add/remove/update
+operations are applied in one transaction and produce a single version. Writers may
+pass the version they edited (expected_version); a stale one is rejected with 409.
+"""
+
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from itinerary_totals import adjust_totals, booking_cost
+from models import Itinerary, ItineraryChange, ItineraryCollaborator, FlightBooking, HotelBooking, ActivityBooking
+from schemas import (
+    ItineraryOperation, ItineraryUpdate,
+    FlightBookingCreate, FlightBookingResponse, HotelBookingCreate, HotelBookingResponse,
+    ActivityBookingCreate, ActivityBookingResponse, ItineraryChangeResponse
+)
+
+# entity -> (model, create schema, response schema)
+BOOKING_ENTITIES = {
+    "flight": (FlightBooking, FlightBookingCreate, FlightBookingResponse),
+    "hotel": (HotelBooking, HotelBookingCreate, HotelBookingResponse),
+    "activity": (ActivityBooking, ActivityBookingCreate, ActivityBookingResponse),
+}
+EDITOR_ROLES = ("owner", "editor")
+
+
+def _role(db: Session, itinerary: Itinerary, user_id: int) -> Optional[str]:
+    if itinerary.user_id == user_id:
+        return "owner"
+    return db.query(ItineraryCollaborator.role).filter(
+        ItineraryCollaborator.itinerary_id == itinerary.id,
+        ItineraryCollaborator.user_id == user_id
+    ).scalar()
+
+
+def can_edit(db: Session, itinerary: Itinerary, user_id: int) -> bool:
+    """Owner, or a collaborator with an editing role."""
+    return _role(db, itinerary, user_id) in EDITOR_ROLES
+
+
+def can_view(db: Session, itinerary: Itinerary, user_id: int) -> bool:
+    """Owner or any collaborator, viewers included."""
+    return _role(db, itinerary, user_id) is not None
+
+
+def booking_data(entity: str, row) -> dict:
+    """JSON form of a booking row, as the single-booking endpoints return it."""
+    return BOOKING_ENTITIES[entity][2].model_validate(row).model_dump(mode="json")
+
+
+def bump_version(db: Session, itinerary_id: int, expected_version: Optional[int] = None) -> int:
+    """
+    Increment the version in the current transaction and return it. The UPDATE takes the
+    row's write lock first, so concurrent writers get consecutive versions; with
+    expected_version it is a compare-and-set and a concurrent edit raises 409.
+    """
+    query = db.query(Itinerary).filter(Itinerary.id == itinerary_id)
+    if expected_version is not None:
+        query = query.filter(Itinerary.version == expected_version)
+    updated = query.update(
+        {Itinerary.version: Itinerary.version + 1, Itinerary.updated_at: datetime.utcnow()}, synchronize_session=False
+    )
+    if not updated:
+        current = db.query(Itinerary.version).filter(Itinerary.id == itinerary_id).scalar()
+        if current is None:
+            raise HTTPException(status_code=404, detail="Itinerary not found")
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Itinerary was changed by someone else; fetch /changes and retry", "version": current}
+        )
+    version = db.query(Itinerary.version).filter(Itinerary.id == itinerary_id).scalar()
+    # Keep an already-loaded instance in step without marking it dirty
+    itinerary = db.identity_map.get(identity_key(Itinerary, itinerary_id))
+    if itinerary is not None:
+        set_committed_value(itinerary, "version", version)
+    return version
+
+
+def log_changes(db: Session, itinerary_id: int, version: int, changes: List[tuple], user_id: int = None) -> List[dict]:
+    """
+    Append (op, entity, entity_id, data) changes under one version and return their JSON
+    form, built before the caller commits so broadcasting them needs no reload.
+    """
+    rows = [
+        ItineraryChange(itinerary_id=itinerary_id, version=version, op=op, entity=entity,
+                        entity_id=entity_id, data=data, user_id=user_id)
+        for op, entity, entity_id, data in changes
+    ]
+    db.add_all(rows)
+    db.flush()
+    return [ItineraryChangeResponse.model_validate(row).model_dump(mode="json") for row in rows]
+
+
+def record_change(db: Session, itinerary_id: int, op: str, entity: str, entity_id: Optional[int],
+                  data: Optional[dict] = None, user_id: int = None,
+                  expected_version: Optional[int] = None) -> Tuple[int, List[dict]]:
+    """Version and log a single change made by one of the per-booking endpoints."""
+    version = bump_version(db, itinerary_id, expected_version)
+    return version, log_changes(db, itinerary_id, version, [(op, entity, entity_id, data)], user_id)
+
+
+def apply_operations(db: Session, itinerary: Itinerary, operations: List[ItineraryOperation],
+                     user_id: int = None, expected_version: Optional[int] = None) -> Tuple[int, List[dict]]:
+    """
+    Apply a batch of operations and commit once. Any invalid operation, or a stale
+    expected_version, raises before the commit and rolls back the whole batch.
+    """
+    try:
+        version = bump_version(db, itinerary.id, expected_version)
+        changes = [_apply(db, itinerary, i, operation) for i, operation in enumerate(operations)]
+        payloads = log_changes(db, itinerary.id, version, changes, user_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return version, payloads
+
+
+def changes_since(db: Session, itinerary_id: int, since: int) -> List[ItineraryChange]:
+    return db.query(ItineraryChange).filter(
+        ItineraryChange.itinerary_id == itinerary_id,
+        ItineraryChange.version > since
+    ).order_by(ItineraryChange.version, ItineraryChange.id).all()
+
+
+def _invalid(index: int, message: str, status_code: int = 400):
+    raise HTTPException(status_code=status_code, detail=f"operations[{index}]: {message}")
+
+
+def _validate(index: int, schema, data: dict):
+    try:
+        return schema.model_validate(data)
+    except ValidationError as e:
+        error = e.errors()[0]
+        _invalid(index, f"{'.'.join(str(p) for p in error['loc'])}: {error['msg']}", 422)
+
+
+def _apply(db: Session, itinerary: Itinerary, index: int, operation: ItineraryOperation) -> tuple:
+    if operation.entity == "itinerary":
+        if operation.op != "update":
+            _invalid(index, "itineraries only support update")
+        unknown = set(operation.data) - set(ItineraryUpdate.model_fields)
+        if unknown:
+            _invalid(index, f"unknown fields {sorted(unknown)}")
+        fields = _validate(index, ItineraryUpdate, operation.data).model_dump(exclude_none=True)
+        for key, value in fields.items():
+            setattr(itinerary, key, value)
+        return "update", "itinerary", itinerary.id, ItineraryUpdate(**fields).model_dump(mode="json", exclude_none=True)
+
+    model, create_schema, _ = BOOKING_ENTITIES[operation.entity]
+    if operation.op == "add":
+        booking = _validate(index, create_schema, {**operation.data, "itinerary_id": itinerary.id})
+        row = model(**booking.model_dump())
+        db.add(row)
+        db.flush()
+        adjust_totals(db, itinerary.id, operation.entity, booking_cost(operation.entity, row))
+        return "add", operation.entity, row.id, booking_data(operation.entity, row)
+
+    if operation.id is None:
+        _invalid(index, f"{operation.op} needs the {operation.entity} id")
+    row = db.query(model).filter(model.id == operation.id, model.itinerary_id == itinerary.id).first()
+    if row is None:
+        _invalid(index, f"{operation.entity} {operation.id} not found", 404)
+
+    if operation.op == "remove":
+        db.delete(row)
+        # The session doesn't autoflush; flush so later operations in the batch no longer find the row
+        db.flush()
+        adjust_totals(db, itinerary.id, operation.entity, -booking_cost(operation.entity, row))
+        return "remove", operation.entity, operation.id, None
+
+    unknown = set(operation.data) - (set(create_schema.model_fields) - {"itinerary_id"})
+    if unknown:
+        _invalid(index, f"unknown fields {sorted(unknown)}")
+    current = {name: getattr(row, name) for name in create_schema.model_fields}
+    merged = _validate(index, create_schema, {**current, **operation.data})
+    cost_before = booking_cost(operation.entity, row)
+    for key in operation.data:
+        setattr(row, key, getattr(merged, key))
+    db.flush()
+    adjust_totals(db, itinerary.id, operation.entity, booking_cost(operation.entity, row) - cost_before)
+    return "update", operation.entity, row.id, booking_data(operation.entity, row)
@@ -0,0 +1,88 @@
+"""
+Denormalized Itinerary Cost Summary
+Itinerary.booked_total and the flight/hotel/activity subtotals are adjusted in the same
+transaction as each booking add, remove or price change, so list views and budget checks
+read them straight off the itinerary row. A periodic reconciliation recomputes them from
+the booking tables and repairs any drift (rows written outside the API, rounding).
+"""
+
+import logging
+from typing import Dict
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from models import Itinerary, FlightBooking, HotelBooking, ActivityBooking
+
+logger = logging.getLogger("itinerary_totals")
+logger.setLevel(logging.INFO)
+ch = logging.StreamHandler()
+ch.setFormatter(logging.Formatter('ITINERARY-TOTALS: %(message)s'))
+logger.addHandler(ch)
+
+# entity -> (booking model, its price column name, Itinerary subtotal column name)
+PRICED_ENTITIES = {
+    "flight": (FlightBooking, "price", "flight_total"),
+    "hotel": (HotelBooking, "total_price", "hotel_total"),
+    "activity": (ActivityBooking, "price", "activity_total"),
+}
+TOTAL_COLUMNS = ("flight_total", "hotel_total", "activity_total", "booked_total")
+TOLERANCE = 0.005  # below a cent counts as consistent
+
+
+def booking_cost(entity: str, row) -> float:
+    """Amount a booking row contributes to its itinerary's totals."""
+    if entity not in PRICED_ENTITIES:
+        return 0.0
+    return getattr(row, PRICED_ENTITIES[entity][1]) or 0.0
+
+
+def adjust_totals(db: Session, itinerary_id: int, entity: str, delta: float):
+    """
+    Add `delta` to the entity's subtotal and the booked total in the current transaction.
+    The UPDATE is relative (col = col + delta), so concurrent bookings never lose each other's amounts.
+    """
+    if entity not in PRICED_ENTITIES or not delta:
+        return
+    subtotal = getattr(Itinerary, PRICED_ENTITIES[entity][2])
+    db.query(Itinerary).filter(Itinerary.id == itinerary_id).update(
+        {subtotal: subtotal + delta, Itinerary.booked_total: Itinerary.booked_total + delta},
+        synchronize_session=False
+    )
+    itinerary = db.identity_map.get(identity_key(Itinerary, itinerary_id))
+    if itinerary is not None:
+        row = db.query(*(getattr(Itinerary, c) for c in TOTAL_COLUMNS)).filter(Itinerary.id == itinerary_id).one()
+        for column, value in zip(TOTAL_COLUMNS, row):
+            set_committed_value(itinerary, column, value)
+
+
+def _booking_sums() -> Dict[str, object]:
+    """Correlated subqueries summing each itinerary's booking prices, for use inside an UPDATE."""
+    sums = {}
+    for entity, (model, price, column) in PRICED_ENTITIES.items():
+        sums[column] = (
+            select(func.coalesce(func.sum(getattr(model, price)), 0.0))
+            .where(model.itinerary_id == Itinerary.id)
+            .scalar_subquery()
+        )
+    sums["booked_total"] = sums["flight_total"] + sums["hotel_total"] + sums["activity_total"]
+    return sums
+
+
+def reconcile(db: Session) -> int:
+    """
+    Recompute every itinerary's totals and fix the ones that drifted; returns how many were fixed.
+    One UPDATE computes the sums per row while it holds that row, so a booking committed
+    meanwhile is either in the sum or applies its relative adjustment on top, never lost.
+    """
+    sums = _booking_sums()
+    drifted = or_(*(func.abs(func.coalesce(getattr(Itinerary, c), 0.0) - sums[c]) > TOLERANCE for c in TOTAL_COLUMNS))
+    fixed = db.query(Itinerary).filter(drifted).update(
+        {getattr(Itinerary, c): func.round(sums[c], 2) for c in TOTAL_COLUMNS}, synchronize_session=False
+    )
+    db.commit()
+    if fixed:
+        logger.info(f"Repaired cost totals on {fixed} itineraries")
+    return fixed
@@ -7,15 +7,18 @@ import os
 from dotenv import load_dotenv
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Header, Query, Request, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Dict, Any, Literal
 from datetime import datetime
 import hashlib
+import asyncio
+import json
+from starlette.concurrency import run_in_threadpool
 
 from models import (
-    init_db, get_db, User, UserPreference, Itinerary,
+    init_db, get_db, SessionLocal, User, UserPreference, Itinerary,
     FlightBooking, HotelBooking, ActivityBooking, FavoriteDestination, ItineraryCollaborator,
     PriceAlert, Notification
 )
@@ -24,16 +27,31 @@ from schemas import (
     TravelSearchRequest, RecommendationResponse, ItineraryCreate, ItineraryUpdate, ItineraryResponse,
     FlightBookingCreate, FlightBookingResponse, HotelBookingCreate, HotelBookingResponse,
     ActivityBookingCreate, ActivityBookingResponse, FavoriteDestinationCreate, FavoriteDestinationResponse,
-    PriceAlertCreate, PriceAlertResponse, NotificationResponse
+    PriceAlertCreate, PriceAlertResponse, NotificationResponse, BulkExportRequest,
+    FlexibleSearchRequest, FlexibleSearchResponse, BatchSearchRequest, ItineraryPlanResponse,
+    ItineraryBatchRequest, ItineraryDiffResponse, BulkImportResponse
 )
 from recommendation_engine import recommendation_engine
+from coalescing import coalesced_search, search_key
 from services import DestinationService
 from typing import Optional
-from auth import verify_password, get_password_hash, create_access_token, decode_token, oauth2_scheme
+from auth import verify_password, get_password_hash, create_access_token, decode_token, oauth2_scheme, require_admin
 from email_service import EmailService
-from pdf_service import PDFService
-from fastapi.responses import StreamingResponse
+from pdf_cache import pdf_cache, cache_key
+from pdf_export import stream_itineraries_zip
+from streaming import streaming_response, ndjson_response, ORJSONResponse
+from fastapi.responses import StreamingResponse, Response, PlainTextResponse
 from scheduler import start_scheduler
+import metrics
+from profiling import ProfiledRoute, ProfilingMiddleware, profile_store
+from ratelimit import rate_limit, charge
+from feature_store import feature_store
+from destination_index import destination_index
+from planner import plan_itinerary
+from itinerary_changes import apply_operations, changes_since, record_change, booking_data, can_edit, can_view
+from collab_hub import hub
+from itinerary_totals import adjust_totals, booking_cost
+from bulk_import import import_records, export_records, blocking_chunks
 import time
 
 # Initialize FastAPI app
@@ -42,6 +60,8 @@ app = FastAPI(
     description="Intelligent Travel Agent System - Automated Vacation Planner",
     version="1.0.0"
 )
+# Lets ProfilingMiddleware sample the thread running each endpoint
+app.router.route_class = ProfiledRoute
 
 # CORS middleware for frontend
 ALLOWED_ORIGINS = os.environ.get("ALLOWED_ORIGINS", "*").split(",")
@@ -53,6 +73,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)
 
 # Initialize database on startup
 @app.on_event("startup")
@@ -71,6 +93,14 @@ def root():
 def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus text exposition; 404 unless METRICS_ENABLED is set."""
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Dependency for protecting routes
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     payload = decode_token(token)
@@ -112,7 +142,7 @@ def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
     return user
 
 
-@app.post("/api/users/login")
+@app.post("/api/users/login", dependencies=[Depends(rate_limit("login", per_user=False))])
 def login_user(login_data: UserLogin, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == login_data.email).first()
     if not user:
@@ -203,24 +233,25 @@ def update_user_preferences(
     
     db.commit()
     db.refresh(prefs)
+    feature_store.schedule_update(user_id=user_id)
     return prefs
 
 
 # ============== Travel Search & Recommendations ==============
-@app.post("/api/search", response_model=RecommendationResponse)
+@app.post("/api/search", response_model=RecommendationResponse, dependencies=[Depends(rate_limit("search"))])
 def search_travel(search_request: TravelSearchRequest, db: Session = Depends(get_db)):
     """
     Main search endpoint - generates personalized travel recommendations
     based on budget, dates, interests, and preferences.
     """
-    recommendations = recommendation_engine.generate_recommendations(
-        search_request=search_request,
-        user_preferences=None  # Can be enhanced to include user prefs
-    )
-    return recommendations
+    # Identical concurrent searches share one pipeline run
+    result = coalesced_search(recommendation_engine, search_request)
+    # Returning a Response skips response_model re-validation; the model still documents the shape
+    with metrics.timer(metrics.ENGINE_STAGE_SECONDS, "serialization"):
+        return ORJSONResponse(result.to_payload())
 
 
-@app.post("/api/search/user/{user_id}", response_model=RecommendationResponse)
+@app.post("/api/search/user/{user_id}", response_model=RecommendationResponse, dependencies=[Depends(rate_limit("search"))])
 def search_travel_personalized(
     user_id: int,
     search_request: TravelSearchRequest, 
@@ -229,28 +260,52 @@ def search_travel_personalized(
     """
     Personalized search - includes user preferences in recommendations
     """
-    prefs = db.query(UserPreference).filter(UserPreference.user_id == user_id).first()
-    user_prefs = None
+    # Precomputed feature vector (cached); no preference/history queries on the search path
+    features = feature_store.get(user_id, db)
     
-    if prefs:
-        user_prefs = {
-            "budget_min": prefs.preferred_budget_min,
-            "budget_max": prefs.preferred_budget_max,
-            "activities": prefs.preferred_activities,
-            "travel_style": prefs.preferred_travel_style
-        }
-        
-        # Merge user preferences with search request
-        if not search_request.interests and prefs.preferred_activities:
-            search_request.interests = prefs.preferred_activities
-        if not search_request.travel_style and prefs.preferred_travel_style:
-            search_request.travel_style = prefs.preferred_travel_style
+    # Merge user preferences with search request
+    if not search_request.interests and features.preferred_activities:
+        # Assignment skips the field validators; normalize into a fresh list so the cached vector is never shared
+        search_request.interests = TravelSearchRequest.normalize_interests(features.preferred_activities)
+    if not search_request.travel_style and features.travel_style:
+        search_request.travel_style = features.travel_style
     
-    recommendations = recommendation_engine.generate_recommendations(
-        search_request=search_request,
-        user_preferences=user_prefs
-    )
-    return recommendations
+    result = coalesced_search(recommendation_engine, search_request, user_preferences=features)
+    with metrics.timer(metrics.ENGINE_STAGE_SECONDS, "serialization"):
+        return ORJSONResponse(result.to_payload())
+
+
+@app.post("/api/search/flexible", response_model=FlexibleSearchResponse, dependencies=[Depends(rate_limit("search"))])
+def search_travel_flexible(search_request: FlexibleSearchRequest):
+    """
+    Flexible-dates search - evaluates every trip window within ±flex_days in one request
+    and returns a price calendar alongside the best packages across all dates.
+    """
+    result = recommendation_engine.search_flexible(search_request)
+    with metrics.timer(metrics.ENGINE_STAGE_SECONDS, "serialization"):
+        return ORJSONResponse(result.to_payload())
+
+
+@app.post("/api/search/batch")
+def search_travel_batch(batch_request: BatchSearchRequest, request: Request):
+    """
+    Batch search - many origin/destination specs in one request. Streams NDJSON, one line
+    per spec ({"index", "status", ...result}) as soon as that search completes.
+    """
+    # Each distinct search costs one token from the caller's search budget
+    charge(request, "search", cost=len({search_key(s) for s in batch_request.searches}))
+
+    def lines():
+        for indexes, outcome in recommendation_engine.search_batch(batch_request.searches):
+            for index in indexes:
+                if isinstance(outcome, Exception):
+                    yield {"index": index, "status": "error", "detail": str(outcome)}
+                    continue
+                payload = outcome.to_payload()
+                payload["search_params"] = batch_request.searches[index].model_dump()
+                yield {"index": index, "status": "ok", **payload}
+
+    return ndjson_response(lines())
 
 
 @app.get("/api/destinations")
@@ -309,11 +364,24 @@ def create_itinerary(
     db.add(itinerary)
     db.commit()
     db.refresh(itinerary)
+    pdf_cache.schedule_render(itinerary.id)
+    feature_store.schedule_update(user_id=itinerary.user_id)
     return itinerary
 
 
 @app.get("/api/itineraries/user/{user_id}", response_model=List[ItineraryResponse])
-def get_user_itineraries(user_id: int, db: Session = Depends(get_db)):
+def get_user_itineraries(
+    user_id: int,
+    stream: Optional[str] = Query(None, pattern="^(ndjson|json)$"),
+    db: Session = Depends(get_db)
+):
+    if stream:
+        return streaming_response(
+            lambda s: s.query(Itinerary).filter(Itinerary.user_id == user_id).options(
+                selectinload(Itinerary.flights), selectinload(Itinerary.hotels), selectinload(Itinerary.activities)
+            ).order_by(Itinerary.id),
+            ItineraryResponse, stream
+        )
     itineraries = db.query(Itinerary).filter(Itinerary.user_id == user_id).all()
     return itineraries
 
@@ -326,10 +394,22 @@ def get_itinerary(itinerary_id: int, db: Session = Depends(get_db)):
     return itinerary
 
 
+@app.get("/api/itineraries/{itinerary_id}/plan", response_model=ItineraryPlanResponse)
+def get_itinerary_plan(itinerary_id: int, db: Session = Depends(get_db)):
+    """Activities arranged into daily time slots between the outbound arrival and return departure"""
+    itinerary = db.query(Itinerary).options(
+        selectinload(Itinerary.flights), selectinload(Itinerary.activities)
+    ).filter(Itinerary.id == itinerary_id).first()
+    if not itinerary:
+        raise HTTPException(status_code=404, detail="Itinerary not found")
+    return plan_itinerary(itinerary).to_schema()
+
+
 @app.put("/api/itineraries/{itinerary_id}", response_model=ItineraryResponse)
 def update_itinerary(
     itinerary_id: int,
     itinerary_data: ItineraryUpdate,
+    expected_version: Optional[int] = Query(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -339,16 +419,122 @@ def update_itinerary(
     if itinerary.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    for key, value in itinerary_data.model_dump(exclude_none=True).items():
+    fields = itinerary_data.model_dump(exclude_none=True)
+    for key, value in fields.items():
         setattr(itinerary, key, value)
 
+    version, changes = record_change(
+        db, itinerary.id, "update", "itinerary", itinerary.id,
+        ItineraryUpdate(**fields).model_dump(mode="json", exclude_none=True), current_user.id, expected_version
+    )
     db.commit()
+    hub.publish(itinerary.id, version, changes)
     db.refresh(itinerary)
+    pdf_cache.schedule_render(itinerary.id)
+    # Destination feeds the owner's destination affinity
+    if "destination" in fields:
+        feature_store.schedule_update(user_id=itinerary.user_id)
     return itinerary
 
 
+@app.post("/api/itineraries/{itinerary_id}/batch", response_model=ItineraryDiffResponse)
+def apply_itinerary_batch(
+    itinerary_id: int,
+    batch: ItineraryBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Apply add/remove/update operations in one transaction; returns the new version and its diff"""
+    itinerary = db.query(Itinerary).filter(Itinerary.id == itinerary_id).first()
+    if not itinerary:
+        raise HTTPException(status_code=404, detail="Itinerary not found")
+    if not can_edit(db, itinerary, current_user.id):
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    version, changes = apply_operations(db, itinerary, batch.operations, current_user.id, batch.expected_version)
+    hub.publish(itinerary_id, version, changes)
+    pdf_cache.schedule_render(itinerary_id)
+    # Booked hotels/activities and the destination are feature inputs; other edits are not
+    if any(c["entity"] in ("hotel", "activity")
+           or (c["entity"] == "itinerary" and "destination" in (c["data"] or {})) for c in changes):
+        feature_store.schedule_update(itinerary_id=itinerary_id)
+    return {"itinerary_id": itinerary_id, "version": version, "changes": changes}
+
+
+@app.get("/api/itineraries/{itinerary_id}/changes", response_model=ItineraryDiffResponse)
+def get_itinerary_changes(
+    itinerary_id: int,
+    since: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Changes after version `since`, oldest first; clients apply them to their copy"""
+    itinerary = db.query(Itinerary).filter(Itinerary.id == itinerary_id).first()
+    if not itinerary:
+        raise HTTPException(status_code=404, detail="Itinerary not found")
+    if not can_view(db, itinerary, current_user.id):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return {"itinerary_id": itinerary_id, "version": itinerary.version, "changes": changes_since(db, itinerary_id, since)}
+
+
+@app.websocket("/ws/itineraries/{itinerary_id}")
+async def itinerary_channel(websocket: WebSocket, itinerary_id: int, token: str = Query(...)):
+    """
+    Live change feed for collaborators: a hello with the current version, then every committed
+    change. Edits go through the REST endpoints with expected_version; on a "resync" message
+    (or a version gap) clients catch up via /changes. A "deleted" message means the itinerary is gone.
+    """
+    # Subscribe before reading the version so nothing committed in between is missed
+    subscription = hub.subscribe(itinerary_id)
+
+    def authorize():
+        payload = decode_token(token)
+        db = SessionLocal()
+        try:
+            itinerary = db.query(Itinerary).filter(Itinerary.id == itinerary_id).first()
+            if not itinerary or not payload or not payload.get("sub") or not can_view(db, itinerary, int(payload["sub"])):
+                return None
+            return itinerary.version
+        finally:
+            db.close()
+
+    try:
+        version = await run_in_threadpool(authorize)
+        if version is None:
+            await websocket.close(code=1008)
+            return
+        await websocket.accept()
+        await websocket.send_text(json.dumps({"type": "hello", "itinerary_id": itinerary_id, "version": version}))
+
+        async def forward():
+            while True:
+                await websocket.send_text(await subscription.queue.get())
+
+        async def receive():
+            while True:
+                if await websocket.receive_text() == "ping":
+                    await websocket.send_text(json.dumps({"type": "pong"}))
+
+        tasks = [asyncio.create_task(forward()), asyncio.create_task(receive())]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            if not isinstance(task.exception(), WebSocketDisconnect):
+                task.result()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.unsubscribe(subscription)
+
+
 @app.put("/api/itineraries/{itinerary_id}/status")
-def update_itinerary_status(itinerary_id: int, status: str, db: Session = Depends(get_db)):
+def update_itinerary_status(
+    itinerary_id: int,
+    status: str,
+    expected_version: Optional[int] = Query(None),
+    db: Session = Depends(get_db)
+):
     itinerary = db.query(Itinerary).filter(Itinerary.id == itinerary_id).first()
     if not itinerary:
         raise HTTPException(status_code=404, detail="Itinerary not found")
@@ -358,7 +544,12 @@ def update_itinerary_status(itinerary_id: int, status: str, db: Session = Depend
         raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {valid_statuses}")
     
     itinerary.status = status
+    version, changes = record_change(
+        db, itinerary.id, "update", "itinerary", itinerary.id, {"status": status}, expected_version=expected_version
+    )
     db.commit()
+    hub.publish(itinerary.id, version, changes)
+    pdf_cache.schedule_render(itinerary.id)
 
     if status == "confirmed":
         notif = Notification(
@@ -431,11 +622,19 @@ def delete_itinerary(itinerary_id: int, current_user: User = Depends(get_current
         
     db.delete(itinerary)
     db.commit()
+    hub.publish_deleted(itinerary_id)
+    pdf_cache.invalidate(itinerary_id)
+    feature_store.schedule_update(user_id=current_user.id)
     return {"message": "Itinerary deleted successfully"}
 
 
-@app.get("/api/itineraries/{itinerary_id}/export/pdf")
-def get_itinerary_pdf(itinerary_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@app.get("/api/itineraries/{itinerary_id}/export/pdf", dependencies=[Depends(rate_limit("pdf_export"))])
+def get_itinerary_pdf(
+    itinerary_id: int,
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
     itinerary = db.query(Itinerary).filter(Itinerary.id == itinerary_id).first()
     if not itinerary:
         raise HTTPException(status_code=404, detail="Itinerary not found")
@@ -443,14 +642,49 @@ def get_itinerary_pdf(itinerary_id: int, current_user: User = Depends(get_curren
     # Check authorization
     if itinerary.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
-        
-    pdf_bytes_io = PDFService.generate_itinerary_pdf(itinerary, current_user)
-    
+
+    key = cache_key(itinerary, current_user)
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    # Served from the disk cache; only renders inline if the background worker hasn't yet.
+    # Opened here, not by the response, so a re-render pruning the file can't break the download
+    pdf_file = pdf_cache.open_pdf(itinerary, current_user, key)
+
+    def chunks():
+        with pdf_file:
+            while chunk := pdf_file.read(1 << 16):
+                yield chunk
+
+    headers["Content-Length"] = str(os.fstat(pdf_file.fileno()).st_size)
+    headers["Content-Disposition"] = f'attachment; filename="SmartTravel_Itinerary_{itinerary_id}.pdf"'
+    return StreamingResponse(chunks(), media_type="application/pdf", headers=headers)
+
+
+@app.post("/api/itineraries/export/bulk", dependencies=[Depends(rate_limit("pdf_export"))])
+def export_itineraries_bulk(
+    export_request: BulkExportRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Stream a ZIP of itinerary PDFs, rendered in a process pool as the archive is written."""
+    query = db.query(Itinerary.id).filter(Itinerary.user_id == current_user.id)
+    if not export_request.all_for_user:
+        if not export_request.itinerary_ids:
+            raise HTTPException(status_code=400, detail="Provide itinerary_ids or set all_for_user")
+        query = query.filter(Itinerary.id.in_(export_request.itinerary_ids))
+    itinerary_ids = [row.id for row in query.order_by(Itinerary.id).all()]
+
+    if not export_request.all_for_user and len(itinerary_ids) != len(set(export_request.itinerary_ids)):
+        raise HTTPException(status_code=403, detail="Not authorized")
+
     headers = {
-        'Content-Disposition': f'attachment; filename="SmartTravel_Itinerary_{itinerary_id}.pdf"'
+        'Content-Disposition': f'attachment; filename="SmartTravel_Itineraries_{datetime.utcnow():%Y%m%d}.zip"'
     }
-    
-    return StreamingResponse(pdf_bytes_io, headers=headers, media_type="application/pdf")
+    return StreamingResponse(stream_itineraries_zip(itinerary_ids), headers=headers, media_type="application/zip")
 
 
 # ============== Booking Routes ==============
@@ -458,6 +692,7 @@ def get_itinerary_pdf(itinerary_id: int, current_user: User = Depends(get_curren
 def remove_flight(
     itinerary_id: int,
     flight_id: int,
+    expected_version: Optional[int] = Query(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -470,7 +705,13 @@ def remove_flight(
     if not flight:
         raise HTTPException(status_code=404, detail="Flight not found")
     db.delete(flight)
+    adjust_totals(db, itinerary_id, "flight", -booking_cost("flight", flight))
+    version, changes = record_change(
+        db, itinerary_id, "remove", "flight", flight_id, user_id=current_user.id, expected_version=expected_version
+    )
     db.commit()
+    hub.publish(itinerary_id, version, changes)
+    pdf_cache.schedule_render(itinerary_id)
     return {"message": "Flight removed"}
 
 
@@ -478,6 +719,7 @@ def remove_flight(
 def remove_hotel(
     itinerary_id: int,
     hotel_id: int,
+    expected_version: Optional[int] = Query(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -490,7 +732,14 @@ def remove_hotel(
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
     db.delete(hotel)
+    adjust_totals(db, itinerary_id, "hotel", -booking_cost("hotel", hotel))
+    version, changes = record_change(
+        db, itinerary_id, "remove", "hotel", hotel_id, user_id=current_user.id, expected_version=expected_version
+    )
     db.commit()
+    hub.publish(itinerary_id, version, changes)
+    pdf_cache.schedule_render(itinerary_id)
+    feature_store.schedule_update(itinerary_id=itinerary_id)
     return {"message": "Hotel removed"}
 
 
@@ -498,6 +747,7 @@ def remove_hotel(
 def remove_activity(
     itinerary_id: int,
     activity_id: int,
+    expected_version: Optional[int] = Query(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -510,7 +760,14 @@ def remove_activity(
     if not activity:
         raise HTTPException(status_code=404, detail="Activity not found")
     db.delete(activity)
+    adjust_totals(db, itinerary_id, "activity", -booking_cost("activity", activity))
+    version, changes = record_change(
+        db, itinerary_id, "remove", "activity", activity_id, user_id=current_user.id, expected_version=expected_version
+    )
     db.commit()
+    hub.publish(itinerary_id, version, changes)
+    pdf_cache.schedule_render(itinerary_id)
+    feature_store.schedule_update(itinerary_id=itinerary_id)
     return {"message": "Activity removed"}
 
 
@@ -518,12 +775,20 @@ def remove_activity(
 def add_flight_to_itinerary(
     itinerary_id: int,
     flight_data: FlightBookingCreate,
+    expected_version: Optional[int] = Query(None),
     db: Session = Depends(get_db)
 ):
     flight = FlightBooking(itinerary_id=itinerary_id, **flight_data.model_dump(exclude={'itinerary_id'}))
     db.add(flight)
+    db.flush()
+    adjust_totals(db, itinerary_id, "flight", booking_cost("flight", flight))
+    version, changes = record_change(
+        db, itinerary_id, "add", "flight", flight.id, booking_data("flight", flight), expected_version=expected_version
+    )
     db.commit()
+    hub.publish(itinerary_id, version, changes)
     db.refresh(flight)
+    pdf_cache.schedule_render(itinerary_id)
     return flight
 
 
@@ -531,12 +796,21 @@ def add_flight_to_itinerary(
 def add_hotel_to_itinerary(
     itinerary_id: int,
     hotel_data: HotelBookingCreate,
+    expected_version: Optional[int] = Query(None),
     db: Session = Depends(get_db)
 ):
     hotel = HotelBooking(itinerary_id=itinerary_id, **hotel_data.model_dump(exclude={'itinerary_id'}))
     db.add(hotel)
+    db.flush()
+    adjust_totals(db, itinerary_id, "hotel", booking_cost("hotel", hotel))
+    version, changes = record_change(
+        db, itinerary_id, "add", "hotel", hotel.id, booking_data("hotel", hotel), expected_version=expected_version
+    )
     db.commit()
+    hub.publish(itinerary_id, version, changes)
     db.refresh(hotel)
+    pdf_cache.schedule_render(itinerary_id)
+    feature_store.schedule_update(itinerary_id=itinerary_id)
     return hotel
 
 
@@ -544,12 +818,21 @@ def add_hotel_to_itinerary(
 def add_activity_to_itinerary(
     itinerary_id: int,
     activity_data: ActivityBookingCreate,
+    expected_version: Optional[int] = Query(None),
     db: Session = Depends(get_db)
 ):
     activity = ActivityBooking(itinerary_id=itinerary_id, **activity_data.model_dump(exclude={'itinerary_id'}))
     db.add(activity)
+    db.flush()
+    adjust_totals(db, itinerary_id, "activity", booking_cost("activity", activity))
+    version, changes = record_change(
+        db, itinerary_id, "add", "activity", activity.id, booking_data("activity", activity), expected_version=expected_version
+    )
     db.commit()
+    hub.publish(itinerary_id, version, changes)
     db.refresh(activity)
+    pdf_cache.schedule_render(itinerary_id)
+    feature_store.schedule_update(itinerary_id=itinerary_id)
     return activity
 
 
@@ -564,11 +847,22 @@ def add_favorite_destination(
     db.add(favorite)
     db.commit()
     db.refresh(favorite)
+    feature_store.schedule_update(user_id=user_id)
+    destination_index.schedule_update(favorite.destination_name)
     return favorite
 
 
 @app.get("/api/users/{user_id}/favorites", response_model=List[FavoriteDestinationResponse])
-def get_favorite_destinations(user_id: int, db: Session = Depends(get_db)):
+def get_favorite_destinations(
+    user_id: int,
+    stream: Optional[str] = Query(None, pattern="^(ndjson|json)$"),
+    db: Session = Depends(get_db)
+):
+    if stream:
+        return streaming_response(
+            lambda s: s.query(FavoriteDestination).filter(FavoriteDestination.user_id == user_id).order_by(FavoriteDestination.id),
+            FavoriteDestinationResponse, stream
+        )
     favorites = db.query(FavoriteDestination).filter(FavoriteDestination.user_id == user_id).all()
     return favorites
 
@@ -589,6 +883,8 @@ def remove_favorite_destination(
     
     db.delete(favorite)
     db.commit()
+    feature_store.schedule_update(user_id=user_id)
+    destination_index.schedule_update(favorite.destination_name)
     return {"message": "Favorite removed"}
 
 
@@ -607,7 +903,16 @@ def create_price_alert(
 
 
 @app.get("/api/users/{user_id}/alerts", response_model=List[PriceAlertResponse])
-def get_price_alerts(user_id: int, db: Session = Depends(get_db)):
+def get_price_alerts(
+    user_id: int,
+    stream: Optional[str] = Query(None, pattern="^(ndjson|json)$"),
+    db: Session = Depends(get_db)
+):
+    if stream:
+        return streaming_response(
+            lambda s: s.query(PriceAlert).filter(PriceAlert.user_id == user_id).order_by(PriceAlert.id),
+            PriceAlertResponse, stream
+        )
     return db.query(PriceAlert).filter(PriceAlert.user_id == user_id).all()
 
 
@@ -669,6 +974,70 @@ def get_destination_details(destination: str):
     }
 
 
+@app.get("/api/destinations/{destination}/similar")
+def get_similar_destinations(destination: str, limit: int = Query(5, ge=1, le=10)):
+    """Destinations like this one, from the precomputed similarity index"""
+    from services import DESTINATIONS
+    neighbours = destination_index.similar(destination, limit)
+    if neighbours is None:
+        raise HTTPException(status_code=404, detail="Destination not found")
+    return [
+        {
+            "name": name.title(),
+            "airport": DESTINATIONS[name]["airport"],
+            "country": DESTINATIONS[name]["country"],
+            "image": DESTINATIONS[name].get("image", ""),
+            "similarity": similarity
+        }
+        for name, similarity in neighbours
+    ]
+
+
+# ============== Admin: Request Profiles ==============
+@app.get("/api/admin/profiles", dependencies=[Depends(require_admin)])
+def list_profiles():
+    return profile_store.list()
+
+
+@app.get("/api/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def get_profile(profile_id: str):
+    profile = profile_store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.detail()
+
+
+@app.get("/api/admin/profiles/{profile_id}/flamegraph", dependencies=[Depends(require_admin)])
+def get_profile_flamegraph(profile_id: str):
+    """Folded stacks, ready for flamegraph.pl or speedscope."""
+    profile = profile_store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile.folded())
+
+
+# ============== Admin: Bulk Import / Export ==============
+@app.post("/api/admin/import/{kind}", response_model=BulkImportResponse, dependencies=[Depends(require_admin)])
+async def bulk_import(
+    kind: Literal["users", "itineraries"],
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$")
+):
+    """Load a CSV or NDJSON body in chunks as it arrives; invalid rows are reported, the rest still load"""
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+    report = await run_in_threadpool(import_records, blocking_chunks(request.stream()), kind, fmt)
+    return report.to_schema()
+
+
+@app.get("/api/admin/export/{kind}", dependencies=[Depends(require_admin)])
+def bulk_export(kind: Literal["users", "itineraries"], format: str = Query("ndjson", pattern="^(csv|ndjson)$")):
+    headers = {
+        'Content-Disposition': f'attachment; filename="SmartTravel_{kind}_{datetime.utcnow():%Y%m%d}.{format}"'
+    }
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(export_records(kind, format), headers=headers, media_type=media_type)
+
+
 # ============== Run the application ==============
 if __name__ == "__main__":
     import uvicorn
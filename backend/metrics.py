@@ -0,0 +1,192 @@
+"""
+Metrics & Instrumentation
+Minimal Prometheus-style histograms and counters for search stages, provider calls,
+per-request DB query counts, scheduler runs and SMTP sends. Exposed as Prometheus text
+at /metrics. Disabled unless METRICS_ENABLED is set; while it is unset every timer and
+counter is a no-op.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from models import engine
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "").strip().lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for labels, (bucket_counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, bucket_counts):
+                cumulative += n
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {count}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {total}")
+            lines.append(f"{self.name}_count{label_str} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._series)
+        for labels, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+REGISTRY = []
+
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+HTTP_REQUEST_SECONDS = _register(Histogram(
+    "smarttravel_http_request_seconds", "HTTP request latency", ["method", "route", "status"]))
+DB_QUERIES_PER_REQUEST = _register(Histogram(
+    "smarttravel_db_queries_per_request", "SQL statements executed per HTTP request", ["route"], COUNT_BUCKETS))
+ENGINE_STAGE_SECONDS = _register(Histogram(
+    "smarttravel_engine_stage_seconds", "Recommendation pipeline stage latency", ["stage"]))
+PROVIDER_CALL_SECONDS = _register(Histogram(
+    "smarttravel_provider_call_seconds", "Provider call latency", ["service", "source"]))
+SCHEDULER_RUN_SECONDS = _register(Histogram(
+    "smarttravel_scheduler_run_seconds", "Background job run duration", ["job"]))
+SCHEDULER_ROWS_TOTAL = _register(Counter(
+    "smarttravel_scheduler_rows_processed_total", "Rows processed by background jobs", ["job", "kind"]))
+SMTP_SEND_SECONDS = _register(Histogram(
+    "smarttravel_smtp_send_seconds", "SMTP send latency", ["outcome"]))
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+@contextmanager
+def _timed(histogram: Histogram, labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, *labels)
+
+
+def timer(histogram: Histogram, *labels):
+    """Context manager observing elapsed seconds; a shared no-op when metrics are disabled."""
+    if not METRICS_ENABLED:
+        return _NOOP_TIMER
+    return _timed(histogram, labels)
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ============== Per-request DB query counting ==============
+_query_counter = contextvars.ContextVar("smarttravel_query_counter", default=None)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request latency and DB query counts per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not METRICS_ENABLED or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        counter = [0]
+        token = _query_counter.set(counter)
+        status_holder = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _query_counter.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], route, status_holder[0])
+            DB_QUERIES_PER_REQUEST.observe(counter[0], route)
@@ -1,11 +1,13 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, JSON, Boolean, Text
+from sqlalchemy import create_engine, inspect, text, Column, Integer, String, Float, DateTime, ForeignKey, JSON, Boolean, Text, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, validates
 from datetime import datetime
+import os
 
-DATABASE_URL = "sqlite:///./smart_travel.db"
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./smart_travel.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+engine = create_engine(DATABASE_URL, connect_args=connect_args)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -64,6 +66,12 @@ class Itinerary(Base):
     end_date = Column(DateTime, nullable=False)
     total_budget = Column(Float, nullable=False)
     status = Column(String(50), default="draft")  # draft, confirmed, completed
+    version = Column(Integer, nullable=False, default=0, server_default="0")  # bumped by every change (see itinerary_changes.py)
+    # Denormalized sums of the bookings' prices, kept current by itinerary_totals.py
+    flight_total = Column(Float, nullable=False, default=0.0, server_default="0")
+    hotel_total = Column(Float, nullable=False, default=0.0, server_default="0")
+    activity_total = Column(Float, nullable=False, default=0.0, server_default="0")
+    booked_total = Column(Float, nullable=False, default=0.0, server_default="0")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -151,10 +159,19 @@ class PriceAlert(Base):
     target_price = Column(Float, nullable=False)
     current_price = Column(Float, nullable=True)
     is_active = Column(Boolean, default=True)
+    deactivated_at = Column(DateTime, nullable=True)  # when is_active last went False; retention ages from here
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User")
 
+    @validates("is_active")
+    def _stamp_deactivation(self, key, value):
+        if not value and self.is_active is not False:
+            self.deactivated_at = datetime.utcnow()
+        elif value:
+            self.deactivated_at = None
+        return value
+
 
 class Notification(Base):
     __tablename__ = "notifications"
@@ -169,6 +186,55 @@ class Notification(Base):
     user = relationship("User")
 
 
+class UserFeatureVector(Base):
+    """Precomputed personalization features (see feature_store.py); rebuilt on preference/favorite/trip changes"""
+    __tablename__ = "user_feature_vectors"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    vector = Column(JSON, nullable=False)  # dense floats, ordered as feature_store.FEATURE_NAMES
+    destination_affinity = Column(JSON, default=dict)  # {"paris": 1.0, ...}
+    preferred_activities = Column(JSON, default=list)
+    travel_style = Column(String(50), nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class DestinationNeighbours(Base):
+    """Item-item collaborative-filtering table (see collaborative.py); rebuilt by a scheduler batch job"""
+    __tablename__ = "destination_neighbours"
+
+    destination = Column(String(255), primary_key=True)  # lower-cased destination name
+    neighbours = Column(JSON, nullable=False)  # [["rome", 0.42], ...], best first
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ItineraryChange(Base):
+    """Change log entry; all operations applied in one request share the itinerary version they produced"""
+    __tablename__ = "itinerary_changes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    itinerary_id = Column(Integer, ForeignKey("itineraries.id", ondelete="CASCADE"), index=True, nullable=False)
+    version = Column(Integer, nullable=False, index=True)
+    op = Column(String(20), nullable=False)  # add, remove, update
+    entity = Column(String(20), nullable=False)  # itinerary, flight, hotel, activity
+    entity_id = Column(Integer, nullable=True)
+    data = Column(JSON, nullable=True)  # row after add/update (changed fields for itinerary updates)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ArchivedBatch(Base):
+    """Rows moved out of a hot table by retention.py; one batch per row, stored as zlib-compressed JSON"""
+    __tablename__ = "archived_batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False, index=True)  # notification, price_alert, itinerary
+    first_id = Column(Integer, nullable=False)  # source ids covered, for finding a record again
+    last_id = Column(Integer, nullable=False)
+    record_count = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)  # zlib(JSON list of rows; itineraries carry their bookings)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
 class ItineraryCollaborator(Base):
     __tablename__ = "itinerary_collaborators"
     
@@ -183,6 +249,27 @@ class ItineraryCollaborator(Base):
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+
+
+def _add_missing_columns():
+    """Additive migration: create_all() skips existing tables, so add columns they are missing."""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                conn.execute(text(ddl))
 
 
 def get_db():
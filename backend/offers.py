@@ -0,0 +1,200 @@
+"""
+Internal Offer Types
+Lightweight slotted dataclasses used by the services and the recommendation engine.
+They are only converted to the Pydantic schemas at the API boundary (to_schema), and
+orjson can serialize them directly without going through Pydantic at all.
+"""
+
+import itertools
+import os
+import secrets
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from schemas import (
+    FlightOption, HotelOption, ActivityOption,
+    TravelRecommendation, RecommendationResponse, TravelSearchRequest,
+    FlexibleSearchRequest, PriceCalendarEntry, FlexibleRecommendation, FlexibleSearchResponse
+)
+
+
+AMENITIES = (
+    "Free WiFi", "Pool", "Gym", "Spa", "Restaurant",
+    "Room Service", "Airport Shuttle", "Parking", "Bar",
+    "Business Center", "Concierge", "Pet Friendly"
+)
+AMENITY_BITS = {name: 1 << i for i, name in enumerate(AMENITIES)}
+
+_offer_ids = itertools.count(1)
+_offer_id_prefix = (None, "")  # (pid, random token), regenerated in forked workers
+
+
+def next_offer_id() -> str:
+    """
+    Cheap unique id for generated offers (replaces a uuid4 per raw offer): a random
+    per-process token plus a counter, so ids never repeat across restarts or workers.
+    """
+    global _offer_id_prefix
+    pid = os.getpid()
+    if _offer_id_prefix[0] != pid:
+        _offer_id_prefix = (pid, secrets.token_hex(6))
+    return f"{_offer_id_prefix[1]}-{next(_offer_ids):08x}"
+
+
+def amenity_mask(names) -> int:
+    mask = 0
+    for name in names:
+        mask |= AMENITY_BITS.get(name, 0)
+    return mask
+
+
+def _fields(obj) -> dict:
+    # Underscore slots are internal-only (orjson skips them too)
+    return {name: getattr(obj, name) for name in obj.__slots__ if not name.startswith("_")}
+
+
+@dataclass(slots=True)
+class FlightOffer:
+    id: str
+    airline: str
+    flight_number: str
+    departure_airport: str
+    arrival_airport: str
+    departure_time: datetime
+    arrival_time: datetime
+    price: float
+    duration_minutes: int
+    stops: int = 0
+
+    def to_schema(self) -> FlightOption:
+        return FlightOption.model_construct(**_fields(self))
+
+
+@dataclass(slots=True)
+class HotelOffer:
+    id: str
+    hotel_name: str
+    address: str
+    rating: float
+    price_per_night: float
+    total_price: float
+    room_type: str
+    amenities: Optional[List[str]] = None
+    image_url: Optional[str] = None
+    # Amenities as a bitmask over AMENITIES; the name list is only built for offers that are kept
+    _amenity_mask: int = 0
+
+    def materialize(self) -> "HotelOffer":
+        if self.amenities is None:
+            self.amenities = [name for name in AMENITIES if self._amenity_mask & AMENITY_BITS[name]]
+        return self
+
+    def to_schema(self) -> HotelOption:
+        return HotelOption.model_construct(**_fields(self.materialize()))
+
+
+@dataclass(slots=True)
+class ActivityOffer:
+    id: str
+    activity_name: str
+    description: str
+    location: str
+    price: float
+    duration_hours: float
+    category: str
+    rating: float
+    image_url: Optional[str] = None
+
+    def to_schema(self) -> ActivityOption:
+        return ActivityOption.model_construct(**_fields(self))
+
+
+@dataclass(slots=True)
+class TravelPackage:
+    destination: str
+    flights: List[FlightOffer]
+    hotels: List[HotelOffer]
+    activities: List[ActivityOffer]
+    estimated_total: float
+    budget_remaining: float
+    match_score: float
+
+    def to_schema(self) -> TravelRecommendation:
+        return TravelRecommendation.model_construct(
+            destination=self.destination,
+            flights=[f.to_schema() for f in self.flights],
+            hotels=[h.to_schema() for h in self.hotels],
+            activities=[a.to_schema() for a in self.activities],
+            estimated_total=self.estimated_total,
+            budget_remaining=self.budget_remaining,
+            match_score=self.match_score
+        )
+
+
+@dataclass(slots=True)
+class SearchResult:
+    search_params: TravelSearchRequest
+    recommendations: List[TravelPackage]
+    generated_at: datetime
+
+    def to_schema(self) -> RecommendationResponse:
+        return RecommendationResponse.model_construct(
+            search_params=self.search_params,
+            recommendations=[r.to_schema() for r in self.recommendations],
+            generated_at=self.generated_at
+        )
+
+    def to_payload(self) -> dict:
+        """JSON-ready payload; the nested dataclasses are left for orjson to encode natively."""
+        return {
+            "search_params": self.search_params.model_dump(),
+            "recommendations": self.recommendations,
+            "generated_at": self.generated_at
+        }
+
+
+@dataclass(slots=True)
+class DatedPackage(TravelPackage):
+    start_date: datetime
+    end_date: datetime
+
+    def to_schema(self) -> FlexibleRecommendation:
+        base = TravelPackage.to_schema(self)
+        return FlexibleRecommendation.model_construct(**dict(base), start_date=self.start_date, end_date=self.end_date)
+
+
+@dataclass(slots=True)
+class PriceCalendarDay:
+    start_date: datetime
+    end_date: datetime
+    cheapest_total: Optional[float] = None
+    best_destination: Optional[str] = None
+    best_match_score: Optional[float] = None
+
+    def to_schema(self) -> PriceCalendarEntry:
+        return PriceCalendarEntry.model_construct(**_fields(self))
+
+
+@dataclass(slots=True)
+class FlexibleSearchResult:
+    search_params: FlexibleSearchRequest
+    calendar: List[PriceCalendarDay]
+    recommendations: List[DatedPackage]
+    generated_at: datetime
+
+    def to_schema(self) -> FlexibleSearchResponse:
+        return FlexibleSearchResponse.model_construct(
+            search_params=self.search_params,
+            calendar=[d.to_schema() for d in self.calendar],
+            recommendations=[r.to_schema() for r in self.recommendations],
+            generated_at=self.generated_at
+        )
+
+    def to_payload(self) -> dict:
+        return {
+            "search_params": self.search_params.model_dump(),
+            "calendar": self.calendar,
+            "recommendations": self.recommendations,
+            "generated_at": self.generated_at
+        }
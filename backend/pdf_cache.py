@@ -0,0 +1,142 @@
+"""
+Itinerary PDF Cache
+Rendered itinerary PDFs are kept on disk and keyed by itinerary id, updated_at and a
+checksum of everything that ends up on the page, so downloads can be served straight
+from a file instead of rebuilding the fpdf2 document on every request.
+"""
+
+import glob
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO
+
+from models import SessionLocal, Itinerary, User
+from pdf_service import PDFService
+
+logger = logging.getLogger("pdf_cache")
+logger.setLevel(logging.INFO)
+ch = logging.StreamHandler()
+ch.setFormatter(logging.Formatter('PDF-CACHE: %(message)s'))
+logger.addHandler(ch)
+
+PDF_CACHE_DIR = os.environ.get("PDF_CACHE_DIR") or os.path.join(os.path.dirname(__file__), "pdf_cache")
+PDF_RENDER_WORKERS = int(os.environ.get("PDF_RENDER_WORKERS", "2"))
+
+
+def booking_checksum(itinerary, user) -> str:
+    """Checksum of every booking field (and the owner name) rendered into the PDF, or feeding its day plan."""
+    h = hashlib.sha256()
+    h.update(str(user.name).encode())
+    for f in sorted(itinerary.flights, key=lambda x: x.id):
+        h.update(f"F|{f.id}|{f.airline}|{f.flight_number}|{f.departure_airport}|{f.arrival_airport}|{f.price}"
+                 f"|{f.departure_time}|{f.arrival_time}".encode())
+    for hb in sorted(itinerary.hotels, key=lambda x: x.id):
+        h.update(f"H|{hb.id}|{hb.hotel_name}|{hb.room_type}|{hb.total_price}".encode())
+    for a in sorted(itinerary.activities, key=lambda x: x.id):
+        h.update(f"A|{a.id}|{a.activity_name}|{a.duration_hours}|{a.price}|{a.description}"
+                 f"|{a.scheduled_date}|{a.category}|{a.is_booked}".encode())
+    return h.hexdigest()
+
+
+def cache_key(itinerary, user) -> str:
+    updated = itinerary.updated_at.isoformat() if itinerary.updated_at else ""
+    raw = f"{itinerary.id}:{updated}:{booking_checksum(itinerary, user)}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+class PDFCache:
+    """Disk cache of rendered itinerary PDFs with a background render pool."""
+
+    def __init__(self, cache_dir: str = PDF_CACHE_DIR, workers: int = PDF_RENDER_WORKERS):
+        self.cache_dir = cache_dir
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-render")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def path_for(self, itinerary_id: int, key: str) -> str:
+        return os.path.join(self.cache_dir, f"itinerary_{itinerary_id}_{key}.pdf")
+
+    def lookup(self, itinerary_id: int, key: str):
+        """Return the cached file path for this key, or None on a miss."""
+        path = self.path_for(itinerary_id, key)
+        return path if os.path.exists(path) else None
+
+    def render(self, itinerary, user, key: str = None) -> str:
+        """Render synchronously into the cache and return the file path."""
+        key = key or cache_key(itinerary, user)
+        path = self.path_for(itinerary.id, key)
+        if os.path.exists(path):
+            return path
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        data = PDFService.render_itinerary_pdf(itinerary, user)
+        # Write to a temp file then rename so readers never see a partial PDF
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+        self._prune(itinerary.id, keep=path)
+        return path
+
+    def get_or_render(self, itinerary, user, key: str = None) -> str:
+        key = key or cache_key(itinerary, user)
+        return self.lookup(itinerary.id, key) or self.render(itinerary, user, key)
+
+    def open_pdf(self, itinerary, user, key: str = None) -> BinaryIO:
+        """
+        Open the cached render (rendering it on a miss) and return the handle. An open handle
+        stays readable after a newer background render prunes the file, so a download that
+        races an edit still completes; only the lookup-to-open gap is retried.
+        """
+        key = key or cache_key(itinerary, user)
+        for attempt in range(3):
+            try:
+                return open(self.get_or_render(itinerary, user, key), "rb")
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+
+    def schedule_render(self, itinerary_id: int):
+        """Queue a background re-render after an itinerary (or one of its bookings) changed."""
+        with self._lock:
+            if itinerary_id in self._pending:
+                return
+            self._pending.add(itinerary_id)
+        self._executor.submit(self._render_job, itinerary_id)
+
+    def invalidate(self, itinerary_id: int):
+        self._prune(itinerary_id, keep=None)
+
+    def _render_job(self, itinerary_id: int):
+        with self._lock:
+            self._pending.discard(itinerary_id)
+        db = SessionLocal()
+        try:
+            itinerary = db.query(Itinerary).filter(Itinerary.id == itinerary_id).first()
+            if not itinerary:
+                self.invalidate(itinerary_id)
+                return
+            user = db.query(User).filter(User.id == itinerary.user_id).first()
+            if not user:
+                return
+            self.render(itinerary, user)
+        except Exception as e:
+            logger.error(f"Background render failed for itinerary #{itinerary_id}: {e}")
+        finally:
+            db.close()
+
+    def _prune(self, itinerary_id: int, keep=None):
+        """Remove stale renders for an itinerary, optionally keeping the current one."""
+        for stale in glob.glob(os.path.join(self.cache_dir, f"itinerary_{itinerary_id}_*.pdf")):
+            if stale != keep:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+
+# Singleton instance
+pdf_cache = PDFCache()
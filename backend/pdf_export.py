@@ -0,0 +1,123 @@
+"""
+Bulk Itinerary Export
+Renders many itineraries in a process pool built on PDFService and streams them back
+as a ZIP archive, writing each PDF into the archive as soon as it finishes.
+"""
+
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from types import SimpleNamespace
+from typing import Iterator, List
+
+from models import SessionLocal, Itinerary, User
+from pdf_service import PDFService
+from pdf_cache import pdf_cache, cache_key
+
+PDF_EXPORT_PROCESSES = int(os.environ.get("PDF_EXPORT_PROCESSES", str(min(4, os.cpu_count() or 1))))
+# Max itineraries loaded/rendering at once — bounds memory regardless of export size
+BULK_EXPORT_WINDOW = int(os.environ.get("BULK_EXPORT_WINDOW", "8"))
+
+_pool = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Spawned rather than forked from the multithreaded server, like bulk_import's hashing pool
+        _pool = ProcessPoolExecutor(max_workers=PDF_EXPORT_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def snapshot_itinerary(itinerary, user) -> SimpleNamespace:
+    """Copy the fields PDFService reads into plain picklable objects."""
+    def rows(items, fields):
+        return [SimpleNamespace(**{f: getattr(i, f) for f in fields}) for i in items]
+
+    return SimpleNamespace(
+        id=itinerary.id,
+        destination=itinerary.destination,
+        start_date=itinerary.start_date,
+        end_date=itinerary.end_date,
+        total_budget=itinerary.total_budget,
+        flights=rows(itinerary.flights, ["airline", "flight_number", "departure_airport", "arrival_airport", "price",
+                                         "departure_time", "arrival_time"]),
+        hotels=rows(itinerary.hotels, ["hotel_name", "room_type", "total_price"]),
+        activities=rows(itinerary.activities, ["id", "activity_name", "duration_hours", "price", "description",
+                                               "scheduled_date", "category", "is_booked"]),
+        user=SimpleNamespace(name=user.name),
+    )
+
+
+def render_snapshot(snapshot) -> bytes:
+    """Process-pool entry point."""
+    return bytes(PDFService.render_itinerary_pdf(snapshot, snapshot.user))
+
+
+class _ZipSink:
+    """Write-only sink for ZipFile; buffered bytes are drained after every entry."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _load_window(db, ids: List[int]):
+    itineraries = db.query(Itinerary).filter(Itinerary.id.in_(ids)).all()
+    users = {u.id: u for u in db.query(User).filter(User.id.in_({i.user_id for i in itineraries})).all()}
+    return [(i, users.get(i.user_id)) for i in itineraries if users.get(i.user_id)]
+
+
+def stream_itineraries_zip(itinerary_ids: List[int]) -> Iterator[bytes]:
+    """Yield a ZIP archive of itinerary PDFs incrementally, in completion order."""
+    sink = _ZipSink()
+    archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED)
+    errors = []
+    db = SessionLocal()
+    try:
+        pending = {}
+        queue = list(itinerary_ids)
+        while queue or pending:
+            # Top up the in-flight window, reusing cached renders where we have them
+            if queue and len(pending) < BULK_EXPORT_WINDOW:
+                batch, queue = queue[:BULK_EXPORT_WINDOW - len(pending)], queue[BULK_EXPORT_WINDOW - len(pending):]
+                for itinerary, user in _load_window(db, batch):
+                    name = f"SmartTravel_Itinerary_{itinerary.id}.pdf"
+                    cached = pdf_cache.lookup(itinerary.id, cache_key(itinerary, user))
+                    if cached:
+                        archive.write(cached, arcname=name)
+                        yield sink.drain()
+                        continue
+                    future = _get_pool().submit(render_snapshot, snapshot_itinerary(itinerary, user))
+                    pending[future] = (itinerary.id, name)
+                db.expunge_all()
+                continue
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                itinerary_id, name = pending.pop(future)
+                try:
+                    archive.writestr(name, future.result())
+                except Exception as e:
+                    errors.append(f"Itinerary #{itinerary_id}: {e}")
+                    continue
+                yield sink.drain()
+
+        if errors:
+            archive.writestr("errors.txt", "\n".join(errors))
+        archive.close()
+        yield sink.drain()
+    finally:
+        db.close()
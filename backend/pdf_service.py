@@ -2,6 +2,8 @@ import os
 from fpdf import FPDF, XPos, YPos
 from io import BytesIO
 
+from planner import plan_itinerary
+
 
 class PDFService(FPDF):
     def header(self):
@@ -18,6 +20,13 @@ class PDFService(FPDF):
 
     @staticmethod
     def generate_itinerary_pdf(itinerary, user):
+        output = BytesIO(PDFService.render_itinerary_pdf(itinerary, user))
+        output.seek(0)
+        return output
+
+    @staticmethod
+    def render_itinerary_pdf(itinerary, user) -> bytearray:
+        """Render the itinerary PDF and return the raw document bytes."""
         pdf = PDFService()
         pdf.alias_nb_pages()
         pdf.add_page()
@@ -75,8 +84,24 @@ class PDFService(FPDF):
         else:
             pdf.cell(0, 8, "No activities booked.", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
 
-        # Return as BytesIO — output() returns bytes in fpdf2 v2.x
-        output = BytesIO()
-        output.write(pdf.output())
-        output.seek(0)
-        return output
+        # Day-by-day plan
+        if itinerary.activities:
+            plan = plan_itinerary(itinerary)
+            pdf.ln(5)
+            pdf.set_font("helvetica", "B", 14)
+            pdf.cell(0, 10, " Day-by-Day Plan", border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT, fill=True)
+            for day in plan.days:
+                pdf.set_font("helvetica", "B", 11)
+                pdf.cell(0, 8, day.date.strftime('%A, %b %d'), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+                pdf.set_font("helvetica", "", 10)
+                if not day.slots:
+                    pdf.cell(0, 6, "  Travel day" if day.available_from is None else "  Free time", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+                for slot in day.slots:
+                    safe_name = str(slot.activity_name).encode('latin-1', 'replace').decode('latin-1')
+                    pdf.cell(0, 6, f"  {slot.start:%H:%M}-{slot.end:%H:%M}  {safe_name}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            if plan.unscheduled:
+                pdf.set_font("helvetica", "I", 9)
+                pdf.cell(0, 6, f"{len(plan.unscheduled)} activities did not fit the schedule.", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+        # output() returns a bytearray in fpdf2 v2.x — hand it back without copying
+        return pdf.output()
@@ -0,0 +1,253 @@
+"""
+Day-by-Day Itinerary Planner
+Arranges an itinerary's activities into non-overlapping daily time slots between the
+outbound flight's arrival and the return flight's departure. Activities booked at a
+specific time keep it: each day's fixed activities are chosen by weighted interval
+scheduling (DP over end-sorted intervals, with the daily hour budget as a second
+dimension). Activities with only a date are then packed into the remaining hours with
+a 0/1 knapsack per day and placed into the free gaps.
+"""
+
+import bisect
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, time
+from typing import List, Optional, Tuple
+
+from schemas import PlannedActivity, DayPlan as DayPlanSchema, ItineraryPlanResponse
+
+DAY_START_HOUR = int(os.environ.get("PLANNER_DAY_START_HOUR", "9"))
+DAY_END_HOUR = int(os.environ.get("PLANNER_DAY_END_HOUR", "21"))
+DAILY_ACTIVITY_HOURS = float(os.environ.get("PLANNER_DAILY_ACTIVITY_HOURS", "8"))
+ARRIVAL_BUFFER = timedelta(hours=2)     # transfer and check-in after landing
+DEPARTURE_BUFFER = timedelta(hours=3)   # transfer and security before the return flight
+SLOT_MINUTES = 30
+DEFAULT_DURATION_HOURS = 2.0
+
+# Activity weights: everything is worth doing, paid-for activities much more so
+BASE_SCORE = 1.0
+BOOKED_BONUS = 2.0
+PREFERRED_DAY_BONUS = 0.5  # date-only activity placed on the date it was added for
+
+
+@dataclass(slots=True)
+class PlannedSlot:
+    activity_id: int
+    activity_name: str
+    category: Optional[str]
+    start: datetime
+    end: datetime
+    fixed: bool
+
+    def to_schema(self) -> PlannedActivity:
+        return PlannedActivity.model_construct(
+            activity_id=self.activity_id, activity_name=self.activity_name, category=self.category,
+            start=self.start, end=self.end, fixed=self.fixed
+        )
+
+
+@dataclass(slots=True)
+class DayPlan:
+    date: datetime
+    available_from: Optional[datetime]
+    available_until: Optional[datetime]
+    slots: List[PlannedSlot] = field(default_factory=list)
+
+    @property
+    def hours_planned(self) -> float:
+        return sum((s.end - s.start).total_seconds() for s in self.slots) / 3600
+
+    def to_schema(self) -> DayPlanSchema:
+        return DayPlanSchema.model_construct(
+            date=self.date, available_from=self.available_from, available_until=self.available_until,
+            hours_planned=round(self.hours_planned, 2), activities=[s.to_schema() for s in self.slots]
+        )
+
+
+@dataclass(slots=True)
+class ItineraryPlan:
+    itinerary_id: int
+    days: List[DayPlan]
+    unscheduled: List[int]
+    total_score: float
+
+    def to_schema(self) -> ItineraryPlanResponse:
+        return ItineraryPlanResponse.model_construct(
+            itinerary_id=self.itinerary_id, days=[d.to_schema() for d in self.days],
+            unscheduled=self.unscheduled, total_score=round(self.total_score, 2)
+        )
+
+
+def _slots(hours: Optional[float]) -> int:
+    """Duration in whole planning slots, rounded up."""
+    minutes = (hours if hours and hours > 0 else DEFAULT_DURATION_HOURS) * 60
+    return max(1, -(-int(round(minutes)) // SLOT_MINUTES))
+
+
+def _score(activity) -> float:
+    return BASE_SCORE + (BOOKED_BONUS if getattr(activity, "is_booked", False) else 0.0)
+
+
+def _day_windows(itinerary) -> List[Tuple[datetime, Optional[datetime], Optional[datetime]]]:
+    """(day, available_from, available_until) for every trip day; None bounds mean no free time."""
+    first, last = itinerary.start_date.date(), itinerary.end_date.date()
+    flights = sorted(itinerary.flights, key=lambda f: f.departure_time)
+    arrival = flights[0].arrival_time + ARRIVAL_BUFFER if flights else None
+    departure = flights[-1].departure_time - DEPARTURE_BUFFER if len(flights) > 1 else None
+
+    windows = []
+    for offset in range((last - first).days + 1):
+        day = datetime.combine(first + timedelta(days=offset), time())
+        start = day + timedelta(hours=DAY_START_HOUR)
+        end = day + timedelta(hours=DAY_END_HOUR)
+        if arrival is not None:
+            start = max(start, arrival)
+        if departure is not None:
+            end = min(end, departure)
+        windows.append((day, start, end) if start < end else (day, None, None))
+    return windows
+
+
+def weighted_interval_schedule(intervals: List[tuple], capacity: int) -> List[tuple]:
+    """
+    Max-weight non-overlapping subset of (start, end, slots, weight, payload) intervals
+    using at most `capacity` budget slots in total. O(n * capacity).
+    """
+    if not intervals or capacity <= 0:
+        return []
+    intervals = sorted(intervals, key=lambda x: x[1])
+    ends = [iv[1] for iv in intervals]
+    # p[j]: number of intervals that end at or before interval j starts
+    p = [bisect.bisect_right(ends, iv[0], 0, j) for j, iv in enumerate(intervals)]
+
+    best = [[0.0] * (capacity + 1)]
+    for j, (_, _, slots, weight, _) in enumerate(intervals):
+        prev, base = best[j], best[p[j]]
+        row = prev[:]
+        for c in range(slots, capacity + 1):
+            take = base[c - slots] + weight
+            if take > row[c]:
+                row[c] = take
+        best.append(row)
+
+    chosen, j, c = [], len(intervals), capacity
+    while j > 0:
+        if best[j][c] == best[j - 1][c]:
+            j -= 1
+            continue
+        start, end, slots, weight, payload = intervals[j - 1]
+        chosen.append(intervals[j - 1])
+        c -= slots
+        j = p[j - 1]
+    chosen.reverse()
+    return chosen
+
+
+def knapsack(items: List[tuple], capacity: int) -> List[tuple]:
+    """Max-weight subset of (slots, weight, payload) items within `capacity` slots. O(n * capacity)."""
+    if not items or capacity <= 0:
+        return []
+    best = [0.0] * (capacity + 1)
+    took = []
+    for slots, weight, _ in items:
+        row = bytearray(capacity + 1)
+        for c in range(capacity, slots - 1, -1):
+            if best[c - slots] + weight > best[c]:
+                best[c] = best[c - slots] + weight
+                row[c] = 1
+        took.append(row)
+    chosen, c = [], capacity
+    for i in range(len(items) - 1, -1, -1):
+        if took[i][c]:
+            chosen.append(items[i])
+            c -= items[i][0]
+    chosen.reverse()
+    return chosen
+
+
+def _free_gaps(start: int, end: int, busy: List[Tuple[int, int]]) -> List[List[int]]:
+    gaps, cursor = [], start
+    for b_start, b_end in sorted(busy):
+        if b_start > cursor:
+            gaps.append([cursor, b_start])
+        cursor = max(cursor, b_end)
+    if cursor < end:
+        gaps.append([cursor, end])
+    return gaps
+
+
+def plan_itinerary(itinerary) -> ItineraryPlan:
+    """Build the day-by-day plan for an itinerary (ORM object or snapshot with the same fields)."""
+    budget = int(DAILY_ACTIVITY_HOURS * 60) // SLOT_MINUTES
+    windows = _day_windows(itinerary)
+    day_index = {day.date(): i for i, (day, _, _) in enumerate(windows)}
+
+    fixed_by_day = [[] for _ in windows]
+    flexible, unscheduled = [], []
+    for a in itinerary.activities:
+        when = a.scheduled_date
+        i = day_index.get(when.date()) if when else None
+        if when is not None and when.time() != time() and i is not None:
+            fixed_by_day[i].append(a)
+        elif when is not None and when.time() != time():
+            unscheduled.append(a.id)  # booked for a time outside the trip
+        else:
+            flexible.append((a, i))
+
+    days, total = [], 0.0
+    remaining = flexible
+    for i, (day, open_at, close_at) in enumerate(windows):
+        plan = DayPlan(date=day, available_from=open_at, available_until=close_at)
+        days.append(plan)
+        if open_at is None:
+            unscheduled.extend(a.id for a in fixed_by_day[i])
+            continue
+
+        # Minute offsets from the window start; fixed activities keep their booked times
+        def offset(moment: datetime) -> int:
+            return int((moment - open_at).total_seconds() // 60)
+
+        window_minutes = offset(close_at)
+        capacity = min(budget, window_minutes // SLOT_MINUTES)
+        candidates = []
+        for a in fixed_by_day[i]:
+            slots = _slots(a.duration_hours)
+            start = offset(a.scheduled_date)
+            end = start + int(round((a.duration_hours or DEFAULT_DURATION_HOURS) * 60))
+            if start < 0 or end > window_minutes:
+                unscheduled.append(a.id)
+                continue
+            candidates.append((start, end, slots, _score(a), a))
+        chosen = weighted_interval_schedule(candidates, capacity)
+        picked = {id(c[4]) for c in chosen}
+        unscheduled.extend(c[4].id for c in candidates if id(c[4]) not in picked)
+        for start, end, slots, weight, a in chosen:
+            plan.slots.append(PlannedSlot(a.id, a.activity_name, a.category,
+                                          open_at + timedelta(minutes=start), open_at + timedelta(minutes=end), True))
+            total += weight
+
+        # Date-only activities: knapsack on the hours left, then first-fit into the gaps
+        gaps = _free_gaps(0, window_minutes, [(c[0], c[1]) for c in chosen])
+        longest_gap = max((g[1] - g[0] for g in gaps), default=0)
+        items = [
+            (_slots(a.duration_hours), _score(a) + (PREFERRED_DAY_BONUS if preferred == i else 0.0), (a, preferred))
+            for a, preferred in remaining if _slots(a.duration_hours) * SLOT_MINUTES <= longest_gap
+        ]
+        packed = knapsack(items, capacity - sum(c[2] for c in chosen))
+        placed = set()
+        for slots, weight, entry in sorted(packed, key=lambda x: -x[0]):
+            minutes = slots * SLOT_MINUTES
+            gap = next((g for g in gaps if g[1] - g[0] >= minutes), None)
+            if gap is None:
+                continue
+            a = entry[0]
+            plan.slots.append(PlannedSlot(a.id, a.activity_name, a.category,
+                                          open_at + timedelta(minutes=gap[0]), open_at + timedelta(minutes=gap[0] + minutes), False))
+            gap[0] += minutes
+            placed.add(id(a))
+            total += weight
+        remaining = [(a, preferred) for a, preferred in remaining if id(a) not in placed]
+        plan.slots.sort(key=lambda s: s.start)
+
+    unscheduled.extend(a.id for a, _ in remaining)
+    return ItineraryPlan(itinerary_id=itinerary.id, days=days, unscheduled=sorted(unscheduled), total_score=total)
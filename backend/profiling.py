@@ -0,0 +1,237 @@
+"""
+Request Profiling
+Opt-in per-request sampling profiler. A request is profiled when it carries the admin
+token in X-Profile, or when it is picked by PROFILE_SAMPLE_RATE. The handler thread is
+sampled on a background thread into folded stacks (flamegraph.pl / speedscope format),
+alongside a log of the SQL executed. Results are kept in memory for the admin endpoints.
+"""
+
+import asyncio
+import contextvars
+import functools
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict, Counter
+from datetime import datetime
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+from auth import ADMIN_API_TOKEN
+from models import engine
+
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "2"))
+PROFILE_STORE_SIZE = int(os.environ.get("PROFILE_STORE_SIZE", "50"))
+PROFILE_MAX_QUERIES = 500
+MAX_STACK_DEPTH = 128
+
+_active_profile = contextvars.ContextVar("smarttravel_active_profile", default=None)
+_profile_ids = itertools.count(1)
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.id = f"{int(time.time())}-{next(_profile_ids)}"
+        self.method = method
+        self.path = path
+        self.started_at = datetime.utcnow()
+        self.duration_ms = None
+        self.status = None
+        self.stacks = Counter()
+        self.samples = 0
+        self.queries = []
+        self.thread_ids = set()
+        self._lock = threading.Lock()
+
+    def add_sample(self, frame):
+        parts = []
+        while frame is not None and len(parts) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        with self._lock:
+            self.stacks[";".join(reversed(parts))] += 1
+            self.samples += 1
+
+    def add_query(self, statement: str, parameters, duration_ms: float):
+        if len(self.queries) < PROFILE_MAX_QUERIES:
+            self.queries.append({
+                "statement": statement,
+                "parameters": repr(parameters)[:300],
+                "duration_ms": round(duration_ms, 3),
+            })
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": self.duration_ms,
+            "samples": self.samples,
+            "query_count": len(self.queries),
+        }
+
+    def detail(self, top: int = 25) -> dict:
+        # Self time per leaf frame is the most useful quick view without rendering a flamegraph
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return {
+            **self.summary(),
+            "interval_ms": PROFILE_INTERVAL_MS,
+            "top_frames": [{"frame": f, "samples": n} for f, n in leaves.most_common(top)],
+            "queries": self.queries,
+        }
+
+
+class _Sampler(threading.Thread):
+    """Samples the stacks of the threads currently running the profiled handler."""
+
+    def __init__(self, profile: RequestProfile):
+        super().__init__(name=f"profiler-{profile.id}", daemon=True)
+        self.profile = profile
+        self._stop_event = threading.Event()
+
+    def run(self):
+        interval = PROFILE_INTERVAL_MS / 1000
+        while not self._stop_event.wait(interval):
+            if not self.profile.thread_ids:
+                continue
+            frames = sys._current_frames()
+            for tid in list(self.profile.thread_ids):
+                frame = frames.get(tid)
+                if frame is not None:
+                    self.profile.add_sample(frame)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=1)
+
+
+class ProfileStore:
+    """Most recent profiles, bounded to PROFILE_STORE_SIZE."""
+
+    def __init__(self, size: int = PROFILE_STORE_SIZE):
+        self.size = size
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.size:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str):
+        return self._profiles.get(profile_id)
+
+    def list(self) -> list:
+        with self._lock:
+            return [p.summary() for p in reversed(self._profiles.values())]
+
+
+profile_store = ProfileStore()
+
+
+def _wants_profile(scope) -> bool:
+    if ADMIN_API_TOKEN:
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile":
+                return hmac.compare_digest(value.decode("latin-1"), ADMIN_API_TOKEN)
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware that profiles selected requests and tags them with X-Profile-Id."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        token = _active_profile.set(profile)
+        sampler = _Sampler(profile)
+        sampler.start()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.duration_ms = round((time.perf_counter() - start) * 1000, 2)
+            _active_profile.reset(token)
+            sampler.stop()
+            profile_store.add(profile)
+
+
+def _profiled(endpoint):
+    """Register the thread running the endpoint with the active profile, if any."""
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            profile = _active_profile.get()
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            tid = threading.get_ident()
+            profile.thread_ids.add(tid)
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profile.thread_ids.discard(tid)
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = _active_profile.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        tid = threading.get_ident()
+        profile.thread_ids.add(tid)
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.thread_ids.discard(tid)
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """Route class whose endpoints can be sampled by ProfilingMiddleware."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _profiled(endpoint), **kwargs)
+
+
+# ============== SQL query log ==============
+@event.listens_for(engine, "before_cursor_execute")
+def _query_start(conn, cursor, statement, parameters, context, executemany):
+    if _active_profile.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _query_end(conn, cursor, statement, parameters, context, executemany):
+    profile = _active_profile.get()
+    starts = conn.info.get("profile_query_start")
+    if profile is not None and starts:
+        profile.add_query(statement, parameters, (time.perf_counter() - starts.pop()) * 1000)
@@ -0,0 +1,173 @@
+"""
+Provider Result Cache
+TTL cache in front of the flight, hotel and activity services with stale-while-revalidate:
+an expired entry is still served for a grace period while a background refresh runs.
+Search frequency is tracked per route (origin, destination, departure week), and the
+hottest routes are re-fetched shortly before they expire by the scheduler, so searches
+on popular routes do not wait on a cold provider call.
+"""
+
+import functools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, Counter as Tally
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from metrics import Counter, REGISTRY
+from resilience import call_tracking_fallback
+
+logger = logging.getLogger("provider_cache")
+logger.setLevel(logging.INFO)
+ch = logging.StreamHandler()
+ch.setFormatter(logging.Formatter('PROVIDER-CACHE: %(message)s'))
+logger.addHandler(ch)
+
+# Fresh lifetime per service; 0 disables caching for that service
+PROVIDER_CACHE_TTLS = {
+    "flights": float(os.environ.get("FLIGHT_CACHE_TTL_SECONDS", "600")),
+    "hotels": float(os.environ.get("HOTEL_CACHE_TTL_SECONDS", "1800")),
+    "activities": float(os.environ.get("ACTIVITY_CACHE_TTL_SECONDS", "3600")),
+}
+# Lifetime of results served from fallback offers while a provider is failing, so real
+# results replace them soon after it recovers
+PROVIDER_CACHE_FALLBACK_TTL = float(os.environ.get("PROVIDER_CACHE_FALLBACK_TTL_SECONDS", "30"))
+# How long past expiry an entry may still be served while it is refreshed
+PROVIDER_CACHE_STALE_SECONDS = float(os.environ.get("PROVIDER_CACHE_STALE_SECONDS", "900"))
+PROVIDER_CACHE_MAX_ENTRIES = int(os.environ.get("PROVIDER_CACHE_MAX_ENTRIES", "5000"))
+PROVIDER_REFRESH_WORKERS = int(os.environ.get("PROVIDER_REFRESH_WORKERS", "4"))
+# Proactive refresh: the hottest N routes, when their entries expire within the lead time
+HOT_ROUTE_COUNT = int(os.environ.get("HOT_ROUTE_COUNT", "25"))
+REFRESH_LEAD_SECONDS = float(os.environ.get("REFRESH_LEAD_SECONDS", "120"))
+
+PROVIDER_CACHE_TOTAL = Counter(
+    "smarttravel_provider_cache_total", "Provider cache lookups and refreshes", ["service", "result"])
+REGISTRY.append(PROVIDER_CACHE_TOTAL)
+
+
+def route_key(origin: str, destination: str, departure: datetime) -> tuple:
+    """Route identity for popularity tracking: departures are bucketed by ISO week."""
+    year, week, _ = departure.isocalendar()
+    return (origin.upper(), destination.lower(), f"{year}-W{week:02d}")
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "loader", "service", "route")
+
+    def __init__(self, value, expires_at: float, loader, service: str, route: tuple):
+        self.value = value
+        self.expires_at = expires_at
+        self.loader = loader
+        self.service = service
+        self.route = route
+
+
+class ProviderCache:
+    def __init__(self, max_entries: int = PROVIDER_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._route_hits = Tally()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=PROVIDER_REFRESH_WORKERS, thread_name_prefix="provider-refresh")
+
+    def get_or_fetch(self, service: str, key: tuple, route: tuple, fetch, *args, **kwargs):
+        """Cached provider result for key, calling fetch(*args, **kwargs) on a miss."""
+        ttl = PROVIDER_CACHE_TTLS.get(service, 0)
+        if ttl <= 0:
+            return fetch(*args, **kwargs)
+
+        cache_key = (service,) + key
+        now = time.monotonic()
+        with self._lock:
+            self._route_hits[route] += 1
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                self._entries.move_to_end(cache_key)
+                entry.route = route
+
+        if entry is not None:
+            if now < entry.expires_at:
+                PROVIDER_CACHE_TOTAL.inc(1, service, "hit")
+                return entry.value
+            if now < entry.expires_at + PROVIDER_CACHE_STALE_SECONDS:
+                PROVIDER_CACHE_TOTAL.inc(1, service, "stale")
+                self._schedule_refresh(cache_key)
+                return entry.value
+
+        PROVIDER_CACHE_TOTAL.inc(1, service, "miss")
+        loader = functools.partial(fetch, *args, **kwargs)
+        return self._load(cache_key, loader, service, route)
+
+    def _load(self, cache_key: tuple, loader, service: str, route: tuple):
+        value, fell_back = call_tracking_fallback(loader)
+        ttl = PROVIDER_CACHE_TTLS.get(service, 0)
+        if fell_back:
+            PROVIDER_CACHE_TOTAL.inc(1, service, "fallback")
+            ttl = min(ttl, PROVIDER_CACHE_FALLBACK_TTL)
+        self._store(cache_key, _Entry(value, time.monotonic() + ttl, loader, service, route))
+        return value
+
+    def _store(self, cache_key: tuple, entry: _Entry):
+        with self._lock:
+            self._entries[cache_key] = entry
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _schedule_refresh(self, cache_key: tuple) -> bool:
+        with self._lock:
+            if cache_key in self._refreshing or cache_key not in self._entries:
+                return False
+            self._refreshing.add(cache_key)
+        self._executor.submit(self._refresh, cache_key)
+        return True
+
+    def _refresh(self, cache_key: tuple):
+        try:
+            with self._lock:
+                entry = self._entries.get(cache_key)
+            if entry is None:
+                return
+            self._load(cache_key, entry.loader, entry.service, entry.route)
+            PROVIDER_CACHE_TOTAL.inc(1, entry.service, "refresh")
+        except Exception as e:
+            # Keep serving the stale entry; the next stale read retries
+            logger.error(f"Refresh failed for {cache_key[0]} {cache_key[1:3]}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(cache_key)
+
+    def hot_routes(self, limit: int = HOT_ROUTE_COUNT) -> list:
+        with self._lock:
+            return [route for route, _ in self._route_hits.most_common(limit)]
+
+    def refresh_hot_routes(self, limit: int = HOT_ROUTE_COUNT, lead: float = REFRESH_LEAD_SECONDS) -> int:
+        """Queue refreshes for entries of the hottest routes that expire within `lead` seconds.
+
+        Route counts are halved on every run so popularity follows recent traffic.
+        """
+        hot = set(self.hot_routes(limit))
+        deadline = time.monotonic() + lead
+        with self._lock:
+            due = [k for k, e in self._entries.items()
+                   if e.route in hot and e.expires_at <= deadline
+                   and e.expires_at + PROVIDER_CACHE_STALE_SECONDS > time.monotonic()]
+            for route in list(self._route_hits):
+                self._route_hits[route] //= 2
+                if not self._route_hits[route]:
+                    del self._route_hits[route]
+        return sum(1 for k in due if self._schedule_refresh(k))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "refreshing": len(self._refreshing),
+                "tracked_routes": len(self._route_hits),
+            }
+
+
+provider_cache = ProviderCache()
@@ -0,0 +1,261 @@
+"""
+Learned Package Ranker
+Logistic-regression ranker over package-level features, trained offline (CPU, pure Python)
+from what users actually chose: booked itineraries and TravelHistory ratings. Training
+exports a small JSON artifact; the recommendation engine loads it at startup and blends
+its score into the hand-tuned heuristic match score. Models whose held-out AUC is below
+RANKER_MIN_AUC are neither written nor loaded, so the heuristic alone is used.
+
+Train from backend/:
+    python ranker.py --out artifacts/ranker.json
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+logger = logging.getLogger("ranker")
+logger.setLevel(logging.INFO)
+ch = logging.StreamHandler()
+ch.setFormatter(logging.Formatter('RANKER: %(message)s'))
+logger.addHandler(ch)
+
+RANKER_MODEL_PATH = os.environ.get("RANKER_MODEL_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "artifacts", "ranker.json")
+MODEL_VERSION = 1
+MIN_TRAINING_SAMPLES = 20
+# A model must beat this held-out AUC to be used; its score then gets this share of the match score
+RANKER_MIN_AUC = float(os.environ.get("RANKER_MIN_AUC") or "0.6")
+RANKER_BLEND_WEIGHT = min(1.0, max(0.0, float(os.environ.get("RANKER_BLEND_WEIGHT") or "0.5")))
+
+FEATURE_NAMES = (
+    "budget_ratio",        # estimated total / budget, capped at 2
+    "flight_share",        # share of the total spent on the flight
+    "hotel_rating",        # mean hotel rating / 5
+    "nightly_price",       # log-scaled mean nightly rate
+    "interest_coverage",   # share of the traveller's interests covered by the activities
+    "activity_count",      # activities in the package, capped at 5
+)
+
+
+def package_features(
+    total: float,
+    budget: float,
+    flight_price: float,
+    hotel_ratings: Sequence[float],
+    nightly_prices: Sequence[float],
+    activity_categories: Sequence[str],
+    interests: Sequence[str],
+) -> List[float]:
+    """Feature row shared by training (from bookings) and inference (from offers)."""
+    ratings = [r for r in hotel_ratings if r]
+    wanted = {i.lower() for i in interests}
+    covered = wanted & {c.lower() for c in activity_categories if c}
+    return [
+        min(2.0, total / budget) if budget > 0 else 1.0,
+        flight_price / total if total > 0 else 0.0,
+        (sum(ratings) / len(ratings) / 5) if ratings else 0.8,
+        math.log1p(sum(nightly_prices) / len(nightly_prices)) / math.log1p(1000) if nightly_prices else 0.5,
+        len(covered) / len(wanted) if wanted else 0.5,
+        min(len(activity_categories), 5) / 5,
+    ]
+
+
+class LinearRanker:
+    """Standardized logistic model; score_batch returns 0-100 match scores."""
+
+    def __init__(self, weights: List[float], bias: float, mean: List[float], std: List[float], meta: dict = None):
+        self.weights = weights
+        self.bias = bias
+        self.mean = mean
+        self.std = std
+        self.meta = meta or {}
+
+    def score_batch(self, rows: List[List[float]]) -> List[float]:
+        w, b, mean, std = self.weights, self.bias, self.mean, self.std
+        scores = []
+        for row in rows:
+            z = b
+            for x, wi, m, s in zip(row, w, mean, std):
+                z += wi * (x - m) / s
+            scores.append(100 / (1 + math.exp(-max(-30.0, min(30.0, z)))))
+        return scores
+
+    def to_dict(self) -> dict:
+        return {
+            "version": MODEL_VERSION,
+            "features": list(FEATURE_NAMES),
+            "weights": self.weights,
+            "bias": self.bias,
+            "mean": self.mean,
+            "std": self.std,
+            **self.meta,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LinearRanker":
+        if data.get("version") != MODEL_VERSION or tuple(data.get("features", ())) != FEATURE_NAMES:
+            raise ValueError("ranker artifact does not match this feature set")
+        meta = {k: v for k, v in data.items() if k not in ("version", "features", "weights", "bias", "mean", "std")}
+        return cls(data["weights"], data["bias"], data["mean"], data["std"], meta)
+
+
+def load_ranker(path: str = RANKER_MODEL_PATH) -> Optional[LinearRanker]:
+    """The exported model, or None (heuristic scoring) when absent, incompatible or not validated."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path) as fh:
+            model = LinearRanker.from_dict(json.load(fh))
+    except Exception as e:
+        logger.error(f"Ignoring ranker model at {path}: {e}")
+        return None
+    auc = (model.meta.get("holdout") or {}).get("auc")
+    if auc is None or auc < RANKER_MIN_AUC:
+        logger.error(f"Ignoring ranker model at {path}: held-out AUC {auc} is below {RANKER_MIN_AUC}")
+        return None
+    logger.info(f"Loaded ranker model ({model.meta.get('samples', '?')} samples, trained {model.meta.get('trained_at', '?')})")
+    return model
+
+
+# ============== Offline training ==============
+def _label(status: str, any_booked: bool, rating: Optional[int]) -> Optional[float]:
+    """What the user did with the itinerary: rated trips first, then booking behaviour; None if undecided."""
+    if rating:
+        if rating >= 4:
+            return 1.0
+        if rating <= 2:
+            return 0.0
+        return None
+    if status == "cancelled":
+        return 0.0
+    if status in ("confirmed", "completed") or any_booked:
+        return 1.0
+    # A draft with nothing booked yet is not a rejection
+    return None
+
+
+def build_training_set(db):
+    from models import Itinerary, FlightBooking, HotelBooking, ActivityBooking, TravelHistory, UserPreference
+
+    flights, hotels, activities = defaultdict(list), defaultdict(list), defaultdict(list)
+    for row in db.query(FlightBooking.itinerary_id, FlightBooking.price, FlightBooking.is_booked):
+        flights[row.itinerary_id].append(row)
+    for row in db.query(HotelBooking.itinerary_id, HotelBooking.total_price, HotelBooking.price_per_night,
+                        HotelBooking.rating, HotelBooking.is_booked):
+        hotels[row.itinerary_id].append(row)
+    for row in db.query(ActivityBooking.itinerary_id, ActivityBooking.price, ActivityBooking.category,
+                        ActivityBooking.is_booked):
+        activities[row.itinerary_id].append(row)
+    ratings = {row.itinerary_id: row.rating for row in db.query(TravelHistory.itinerary_id, TravelHistory.rating)}
+    interests = {row.user_id: row.preferred_activities or [] for row in
+                 db.query(UserPreference.user_id, UserPreference.preferred_activities)}
+
+    rows, labels = [], []
+    for it in db.query(Itinerary.id, Itinerary.user_id, Itinerary.total_budget, Itinerary.status):
+        it_flights, it_hotels, it_activities = flights[it.id], hotels[it.id], activities[it.id]
+        if not it_flights or not it_hotels:
+            continue
+        label = _label(it.status, any(r.is_booked for r in it_flights + it_hotels + it_activities), ratings.get(it.id))
+        if label is None:
+            continue
+        flight_price = min(r.price for r in it_flights)
+        total = flight_price + min(r.total_price for r in it_hotels) + sum(r.price for r in it_activities[:3])
+        rows.append(package_features(
+            total=total,
+            # The traveller's own budget, the counterpart of the search's budget_max at inference;
+            # only users write it (the price-drop job reports against it and leaves it alone)
+            budget=it.total_budget,
+            flight_price=flight_price,
+            hotel_ratings=[r.rating for r in it_hotels],
+            nightly_prices=[r.price_per_night for r in it_hotels],
+            activity_categories=[r.category for r in it_activities],
+            interests=interests.get(it.user_id, []),
+        ))
+        labels.append(label)
+    return rows, labels
+
+
+def train(rows: List[List[float]], labels: List[float], epochs: int = 300, lr: float = 0.1,
+          l2: float = 0.01, seed: int = 7) -> LinearRanker:
+    """Full-batch gradient descent on standardized features."""
+    n, d = len(rows), len(FEATURE_NAMES)
+    mean = [sum(r[j] for r in rows) / n for j in range(d)]
+    std = [max(1e-6, math.sqrt(sum((r[j] - mean[j]) ** 2 for r in rows) / n)) for j in range(d)]
+    xs = [[(r[j] - mean[j]) / std[j] for j in range(d)] for r in rows]
+
+    rng = random.Random(seed)
+    weights = [rng.uniform(-0.01, 0.01) for _ in range(d)]
+    bias = 0.0
+    for _ in range(epochs):
+        grad_w, grad_b = [0.0] * d, 0.0
+        for x, y in zip(xs, labels):
+            z = bias + sum(w * v for w, v in zip(weights, x))
+            err = 1 / (1 + math.exp(-max(-30.0, min(30.0, z)))) - y
+            grad_b += err
+            for j in range(d):
+                grad_w[j] += err * x[j]
+        bias -= lr * grad_b / n
+        weights = [w - lr * (g / n + l2 * w) for w, g in zip(weights, grad_w)]
+    return LinearRanker(weights, bias, mean, std)
+
+
+def evaluate(model: LinearRanker, rows: List[List[float]], labels: List[float]) -> dict:
+    """Accuracy at 50 and pairwise AUC on a held-out split."""
+    scores = model.score_batch(rows)
+    accuracy = sum((s >= 50) == (y >= 0.5) for s, y in zip(scores, labels)) / len(labels)
+    pos = [s for s, y in zip(scores, labels) if y >= 0.5]
+    neg = [s for s, y in zip(scores, labels) if y < 0.5]
+    auc = None
+    if pos and neg:
+        auc = sum((p > q) + 0.5 * (p == q) for p in pos for q in neg) / (len(pos) * len(neg))
+    return {"accuracy": round(accuracy, 4), "auc": round(auc, 4) if auc is not None else None}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Train the package ranker from bookings and travel history")
+    parser.add_argument("--out", default=RANKER_MODEL_PATH)
+    parser.add_argument("--epochs", type=int, default=300)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    from models import SessionLocal
+
+    db = SessionLocal()
+    try:
+        rows, labels = build_training_set(db)
+    finally:
+        db.close()
+
+    if len(rows) < MIN_TRAINING_SAMPLES or len(set(labels)) < 2:
+        print(f"Not enough labelled itineraries to train ({len(rows)} samples); keeping the heuristic.")
+        return 1
+
+    order = list(range(len(rows)))
+    random.Random(13).shuffle(order)
+    cut = max(1, int(len(order) * (1 - args.holdout)))
+    train_idx, test_idx = order[:cut], order[cut:] or order[:cut]
+
+    model = train([rows[i] for i in train_idx], [labels[i] for i in train_idx], epochs=args.epochs)
+    metrics = evaluate(model, [rows[i] for i in test_idx], [labels[i] for i in test_idx])
+    model.meta = {"trained_at": datetime.utcnow().isoformat(), "samples": len(rows), "holdout": metrics}
+    if metrics["auc"] is None or metrics["auc"] < RANKER_MIN_AUC:
+        print(f"Held-out {metrics} is below RANKER_MIN_AUC={RANKER_MIN_AUC}; keeping the heuristic.")
+        return 1
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as fh:
+        json.dump(model.to_dict(), fh, indent=2)
+    print(f"Trained on {len(train_idx)} itineraries, held-out {metrics}; model written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+Rate Limiting & Admission Control
+Token buckets per client on the expensive endpoints (search, PDF export, login), and
+per-provider concurrency limits on upstream calls. Buckets live in memory by default;
+set RATE_LIMIT_BACKEND=redis (with REDIS_URL) to share them across workers.
+Over-limit requests get 429 with Retry-After; saturated providers shed to fallback offers.
+"""
+
+import math
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from auth import decode_token
+from metrics import Counter, REGISTRY
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory").strip().lower()
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+# Only trust X-Forwarded-For behind a known proxy, otherwise clients could pick their own key
+TRUST_FORWARDED_FOR = os.environ.get("TRUST_FORWARDED_FOR", "").strip().lower() in ("1", "true", "yes")
+MEMORY_MAX_BUCKETS = 50000
+
+# "<requests>/<s|m|h>"; the bucket holds that many tokens and refills evenly over the period
+RATE_LIMITS = {
+    "search": os.environ.get("SEARCH_RATE_LIMIT", "30/m"),
+    "pdf_export": os.environ.get("PDF_EXPORT_RATE_LIMIT", "10/m"),
+    "login": os.environ.get("LOGIN_RATE_LIMIT", "10/m"),
+}
+
+# Concurrent in-flight calls per upstream provider (per worker process)
+PROVIDER_CONCURRENCY = {
+    "duffel": int(os.environ.get("DUFFEL_MAX_CONCURRENCY", "8")),
+    "viator": int(os.environ.get("VIATOR_MAX_CONCURRENCY", "8")),
+}
+PROVIDER_ADMISSION_WAIT = float(os.environ.get("PROVIDER_ADMISSION_WAIT_SECONDS", "0.05"))
+
+RATE_LIMITED_TOTAL = Counter(
+    "smarttravel_rate_limited_total", "Requests rejected by rate limiting", ["scope"])
+REGISTRY.append(RATE_LIMITED_TOTAL)
+
+_PERIODS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_limit(spec: str) -> Tuple[float, float]:
+    """'30/m' -> (refill rate per second, burst capacity)."""
+    count, _, period = spec.strip().partition("/")
+    burst = float(count)
+    return burst / _PERIODS[period.strip().lower() or "s"], burst
+
+
+_LIMITS = {scope: parse_limit(spec) for scope, spec in RATE_LIMITS.items()}
+
+
+class MemoryBackend:
+    """Per-process token buckets; each remembers its own rate and burst for pruning."""
+
+    def __init__(self):
+        self._buckets = {}  # key -> (tokens, updated, rate, burst)
+        self._prune_at = MEMORY_MAX_BUCKETS
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens, updated = (bucket[0], bucket[1]) if bucket else (burst, now)
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now, rate, burst)
+                allowed, retry_after = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now, rate, burst)
+                allowed, retry_after = False, (cost - tokens) / rate
+            if len(self._buckets) > self._prune_at:
+                self._prune(now)
+        return allowed, retry_after
+
+    def _prune(self, now: float):
+        # Buckets that have refilled completely carry no state worth keeping
+        for key, (tokens, updated, rate, burst) in list(self._buckets.items()):
+            if tokens + (now - updated) * rate >= burst:
+                del self._buckets[key]
+        # Next scan only once the store has doubled again, so the O(n) pass stays amortized
+        self._prune_at = max(MEMORY_MAX_BUCKETS, 2 * len(self._buckets))
+
+
+class RedisBackend:
+    """Token buckets shared across workers; refill and take run atomically in a Lua script."""
+
+    SCRIPT = """
+    local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+    local updated = tonumber(redis.call('HGET', KEYS[1], 'updated'))
+    local rate, burst, now, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+    if tokens == nil then tokens = burst; updated = now end
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    local allowed, retry_after = 0, 0
+    if tokens >= cost then
+        tokens = tokens - cost
+        allowed = 1
+    else
+        retry_after = (cost - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return {allowed, tostring(retry_after)}
+    """
+
+    def __init__(self, url: str):
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1) -> Tuple[bool, float]:
+        allowed, retry_after = self._script(keys=[f"smarttravel:ratelimit:{key}"], args=[rate, burst, time.time(), cost])
+        return bool(allowed), float(retry_after)
+
+
+def _make_backend():
+    if RATE_LIMIT_BACKEND == "redis":
+        if redis is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package")
+        return RedisBackend(REDIS_URL)
+    return MemoryBackend()
+
+
+backend = _make_backend()
+
+
+def client_ip(request: Request) -> str:
+    """Caller's IP: the first X-Forwarded-For hop when behind a trusted proxy, else the socket peer."""
+    if TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def client_identity(request: Request) -> str:
+    """Authenticated user id when a valid bearer token is present, else the client IP."""
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        payload = decode_token(authorization[7:].strip())
+        if payload and payload.get("sub"):
+            return f"user:{payload['sub']}"
+    return f"ip:{client_ip(request)}"
+
+
+def charge(request: Request, scope: str, cost: float = 1, per_user: bool = True):
+    """Take `cost` tokens from the caller's bucket for this scope, raising 429 when it runs dry."""
+    if not RATE_LIMIT_ENABLED:
+        return
+    rate, burst = _LIMITS[scope]
+    identity = client_identity(request) if per_user else f"ip:{client_ip(request)}"
+    # A single request may never cost more than a full bucket, or it could never be admitted
+    allowed, retry_after = backend.take(f"{scope}:{identity}", rate, burst, min(cost, burst))
+    if not allowed:
+        RATE_LIMITED_TOTAL.inc(1, scope)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, please retry later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+def rate_limit(scope: str, per_user: bool = True):
+    """Dependency factory: one token per request from the caller's bucket for this scope."""
+    def dependency(request: Request):
+        charge(request, scope, per_user=per_user)
+
+    return dependency
+
+
+# ============== Provider admission ==============
+provider_slots = {name: threading.BoundedSemaphore(limit) for name, limit in PROVIDER_CONCURRENCY.items()}
+
+
+def acquire_provider_slot(provider: str, wait: Optional[float] = PROVIDER_ADMISSION_WAIT) -> bool:
+    """Take an in-flight slot for the provider; False means shed the call to fallback offers."""
+    slot = provider_slots.get(provider)
+    if slot is None:
+        return True
+    if wait is None or wait <= 0:
+        return slot.acquire(blocking=False)
+    return slot.acquire(timeout=wait)
+
+
+def release_provider_slot(provider: str):
+    slot = provider_slots.get(provider)
+    if slot is not None:
+        slot.release()
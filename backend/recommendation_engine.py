@@ -3,13 +3,38 @@ Smart Travel Recommendation Engine
 Uses heuristic search, filtering, and ranking to match user preferences with optimal travel options.
 """
 
-from typing import List, Optional, Tuple
+import dataclasses
+import heapq
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Optional, Sequence, Tuple
 from datetime import datetime, timedelta
-from schemas import (
-    TravelSearchRequest, TravelRecommendation, RecommendationResponse,
-    FlightOption, HotelOption, ActivityOption
+from schemas import TravelSearchRequest, RecommendationResponse, FlexibleSearchRequest
+from offers import (
+    FlightOffer, HotelOffer, ActivityOffer, TravelPackage, SearchResult, amenity_mask,
+    DatedPackage, PriceCalendarDay, FlexibleSearchResult
 )
-from services import FlightService, HotelService, ActivityService, DestinationService
+from services import FlightService, HotelService, ActivityService, DestinationService, DESTINATIONS
+from metrics import timer, ENGINE_STAGE_SECONDS
+from provider_cache import provider_cache, route_key
+from coalescing import search_key
+from feature_store import UserFeatures, BUDGET_MIN, BUDGET_MAX, PRICE_SENSITIVITY, STAR_LOW, STAR_HIGH
+from ranker import load_ranker, package_features, RANKER_BLEND_WEIGHT
+from collaborative import neighbour_table
+
+
+DESIRED_AMENITIES = amenity_mask(["Free WiFi", "Pool", "Gym"])
+# "People like you went to" destinations added to open searches for users with history
+COLLABORATIVE_CANDIDATES = int(os.environ.get("COLLABORATIVE_CANDIDATES", "2"))
+
+# Bounded parallelism for multi-query searches (flexible dates, batch search)
+SEARCH_BATCH_WORKERS = int(os.environ.get("SEARCH_BATCH_WORKERS", "8"))
+_grid_executor = ThreadPoolExecutor(max_workers=SEARCH_BATCH_WORKERS, thread_name_prefix="search-batch")
+
+
+def _top_k(scored, k: int) -> list:
+    """Best k candidates by score without sorting the whole candidate list."""
+    return [item for item, _ in heapq.nlargest(k, scored, key=lambda x: x[1])]
 
 
 class RecommendationEngine:
@@ -25,21 +50,33 @@ class RecommendationEngine:
         self.hotel_service = HotelService()
         self.activity_service = ActivityService()
         self.destination_service = DestinationService()
+        # Offline-trained package ranker; None keeps the heuristic match score
+        self.ranker = load_ranker()
     
     def generate_recommendations(
         self,
         search_request: TravelSearchRequest,
-        user_preferences: dict = None
+        user_preferences: Optional[UserFeatures] = None
     ) -> RecommendationResponse:
+        """Run the pipeline and return the Pydantic response schema."""
+        return self.search(search_request, user_preferences).to_schema()
+
+    def search(
+        self,
+        search_request: TravelSearchRequest,
+        user_preferences: Optional[UserFeatures] = None,
+        extra_destinations: Sequence[str] = ()
+    ) -> SearchResult:
         """
         Main recommendation pipeline:
-        1. Determine destinations to search
+        1. Determine destinations to search (plus any collaborative-filtering candidates)
         2. For each destination, find best flights, hotels, activities
         3. Score and rank complete packages
         4. Return top recommendations
         """
         
-        destinations = self._get_target_destinations(search_request)
+        with timer(ENGINE_STAGE_SECONDS, "destinations"):
+            destinations = self._get_target_destinations(search_request, extra_destinations)
         recommendations = []
         
         for destination in destinations:
@@ -51,16 +88,81 @@ class RecommendationEngine:
             if recommendation:
                 recommendations.append(recommendation)
         
+        with timer(ENGINE_STAGE_SECONDS, "ranking"):
+            self._apply_ranker(recommendations, search_request)
+
         # Sort by match score
         recommendations.sort(key=lambda x: x.match_score, reverse=True)
         
-        return RecommendationResponse(
+        return SearchResult(
             search_params=search_request,
             recommendations=recommendations[:5],  # Top 5 recommendations
             generated_at=datetime.utcnow()
         )
     
-    def _get_target_destinations(self, search_request: TravelSearchRequest) -> List[str]:
+    def personalize(
+        self,
+        result: SearchResult,
+        search_request: TravelSearchRequest,
+        user_preferences: Optional[UserFeatures] = None
+    ) -> SearchResult:
+        """
+        Re-rank a shared search result for one caller. Packages are copied, never mutated,
+        since the same result may be handed to several coalesced requests.
+        """
+        recommendations = list(result.recommendations)
+        if user_preferences:
+            recommendations = [self._personalize_package(p, search_request, user_preferences) for p in recommendations]
+            recommendations.sort(key=lambda x: x.match_score, reverse=True)
+        return SearchResult(
+            search_params=search_request,
+            recommendations=recommendations,
+            generated_at=result.generated_at
+        )
+
+    def _personalize_package(
+        self,
+        package: TravelPackage,
+        search_request: TravelSearchRequest,
+        features: UserFeatures
+    ) -> TravelPackage:
+        """Re-order a package's options with the personal scoring terms and adjust its match score"""
+        def ranked(scored):
+            return [offer for offer, _ in sorted(scored, key=lambda x: x[1], reverse=True)]
+
+        match_score = package.match_score + self._preference_adjustment(package, features)
+        return dataclasses.replace(
+            package,
+            flights=ranked(self._score_flights(package.flights, search_request, features)),
+            hotels=ranked(self._score_hotels(package.hotels, search_request, features)),
+            activities=ranked(self._score_activities(package.activities, search_request, features)),
+            match_score=round(min(100, max(0, match_score)), 1)
+        )
+
+    def _preference_adjustment(self, package: TravelPackage, features: UserFeatures) -> float:
+        """Score delta from the user's features: preferred budget range, interests, destination affinity"""
+        adjustment = 0.0
+        vector = features.vector
+
+        budget_min, budget_max = vector[BUDGET_MIN], vector[BUDGET_MAX]
+        if budget_max:
+            if budget_min <= package.estimated_total <= budget_max:
+                adjustment += 5
+            elif package.estimated_total > budget_max:
+                adjustment -= 5
+
+        if package.activities:
+            weights = [features.interest_weight(a.category) for a in package.activities]
+            adjustment += sum(weights) / len(weights) * 5
+
+        adjustment += features.destination_affinity.get(package.destination.lower(), 0) * 5
+        return adjustment
+
+    def _get_target_destinations(
+        self,
+        search_request: TravelSearchRequest,
+        extra_destinations: Sequence[str] = ()
+    ) -> List[str]:
         """Determine which destinations to search"""
         
         if search_request.destination:
@@ -74,70 +176,139 @@ class RecommendationEngine:
             travel_style=search_request.travel_style or "mid-range"
         )
         
-        return suggestions[:3]  # Search top 3 suggested destinations
-    
-    def _build_recommendation(
+        # Search top 3 suggested destinations, then the collaborative candidates
+        destinations = suggestions[:3]
+        return destinations + [d for d in extra_destinations if d not in destinations]
+
+    def collaborative_destinations(
         self,
-        destination: str,
         search_request: TravelSearchRequest,
-        user_preferences: dict = None
-    ) -> Optional[TravelRecommendation]:
-        """Build a complete travel recommendation for a destination"""
-        
-        # Calculate budget allocation (rough split)
-        total_budget = search_request.budget_max
-        flight_budget = total_budget * 0.35
-        hotel_budget = total_budget * 0.45
-        activity_budget = total_budget * 0.20
-        
-        num_days = (search_request.end_date - search_request.start_date).days
-        if num_days < 1:
-            num_days = 1
-        
-        # Search flights
-        flights = self.flight_service.search_flights(
+        features: Optional[UserFeatures]
+    ) -> List[str]:
+        """
+        Destinations that users with similar favorites, trips and itineraries went to, seeded by
+        the user's destination affinities and limited to catalogue destinations within budget
+        """
+        if search_request.destination or not features or not features.destination_affinity:
+            return []
+        candidates = neighbour_table.suggest(features.destination_affinity, limit=COLLABORATIVE_CANDIDATES * 3)
+        affordable = [
+            d for d in candidates
+            if d in DESTINATIONS and float(DESTINATIONS[d]["base_price"]) * 2 <= search_request.budget_max
+        ]
+        return affordable[:COLLABORATIVE_CANDIDATES]
+    
+    @staticmethod
+    def _offer_key(kind: str, destination: str, search_request: TravelSearchRequest) -> tuple:
+        """Provider query identity per offer kind; only the parameters the service actually uses"""
+        if kind == "flights":
+            return (search_request.origin.upper(), destination, search_request.start_date.date(),
+                    search_request.end_date.date(), search_request.travelers)
+        if kind == "hotels":
+            return (destination, search_request.start_date.date(), search_request.end_date.date(),
+                    search_request.travel_style or "mid-range", search_request.travelers)
+        return (destination, search_request.start_date.date(), search_request.end_date.date(),
+                tuple(sorted(search_request.interests or [])), round(search_request.budget_max * 0.20, 2))
+
+    def _fetch_flights(self, destination: str, search_request: TravelSearchRequest, route: tuple) -> List[FlightOffer]:
+        return provider_cache.get_or_fetch(
+            "flights",
+            self._offer_key("flights", destination, search_request),
+            route,
+            self.flight_service.search_flights,
             origin=search_request.origin,
             destination=destination,
             departure_date=search_request.start_date,
             return_date=search_request.end_date,
-            budget_max=flight_budget,
+            budget_max=search_request.budget_max * 0.35,
             travelers=search_request.travelers
         )
-        
-        if not flights:
-            return None
-        
-        # Search hotels
-        hotels = self.hotel_service.search_hotels(
+
+    def _fetch_hotels(self, destination: str, search_request: TravelSearchRequest, route: tuple) -> List[HotelOffer]:
+        return provider_cache.get_or_fetch(
+            "hotels",
+            self._offer_key("hotels", destination, search_request),
+            route,
+            self.hotel_service.search_hotels,
             destination=destination,
             check_in=search_request.start_date,
             check_out=search_request.end_date,
-            budget_max=hotel_budget,
+            budget_max=search_request.budget_max * 0.45,
             travel_style=search_request.travel_style or "mid-range",
             guests=search_request.travelers
         )
-        
-        if not hotels:
-            return None
-        
-        # Search activities
-        activities = self.activity_service.search_activities(
+
+    def _fetch_activities(self, destination: str, search_request: TravelSearchRequest, route: tuple) -> List[ActivityOffer]:
+        activity_budget = search_request.budget_max * 0.20
+        return provider_cache.get_or_fetch(
+            "activities",
+            self._offer_key("activities", destination, search_request),
+            route,
+            self.activity_service.search_activities,
             destination=destination,
             start_date=search_request.start_date,
             end_date=search_request.end_date,
             interests=search_request.interests,
             budget_max=activity_budget
         )
+
+    def _build_recommendation(
+        self,
+        destination: str,
+        search_request: TravelSearchRequest,
+        user_preferences: Optional[UserFeatures] = None
+    ) -> Optional[TravelPackage]:
+        """Build a complete travel recommendation for a destination"""
+        
+        # Provider results are cached per search parameters; hits count towards route popularity
+        route = route_key(search_request.origin, destination, search_request.start_date)
+
+        # Search flights
+        with timer(ENGINE_STAGE_SECONDS, "provider_flights"):
+            flights = self._fetch_flights(destination, search_request, route)
+        
+        if not flights:
+            return None
+        
+        # Search hotels
+        with timer(ENGINE_STAGE_SECONDS, "provider_hotels"):
+            hotels = self._fetch_hotels(destination, search_request, route)
+        
+        if not hotels:
+            return None
+        
+        # Search activities
+        with timer(ENGINE_STAGE_SECONDS, "provider_activities"):
+            activities = self._fetch_activities(destination, search_request, route)
         
         # Score and rank options
-        scored_flights = self._score_flights(flights, search_request, user_preferences)
-        scored_hotels = self._score_hotels(hotels, search_request, user_preferences)
-        scored_activities = self._score_activities(activities, search_request, user_preferences)
+        with timer(ENGINE_STAGE_SECONDS, "scoring"):
+            scored_flights = self._score_flights(flights, search_request, user_preferences)
+            scored_hotels = self._score_hotels(hotels, search_request, user_preferences)
+            scored_activities = self._score_activities(activities, search_request, user_preferences)
         
+        return self._assemble_package(
+            destination, search_request, scored_flights, scored_hotels, scored_activities, user_preferences
+        )
+
+    def _assemble_package(
+        self,
+        destination: str,
+        search_request: TravelSearchRequest,
+        scored_flights: List[Tuple[FlightOffer, float]],
+        scored_hotels: List[Tuple[HotelOffer, float]],
+        scored_activities: List[Tuple[ActivityOffer, float]],
+        user_preferences: Optional[UserFeatures] = None
+    ) -> Optional[TravelPackage]:
+        """Select the best scored options and price the resulting package"""
+
+        total_budget = search_request.budget_max
+
         # Select best options
-        best_flights = [f for f, _ in sorted(scored_flights, key=lambda x: x[1], reverse=True)[:3]]
-        best_hotels = [h for h, _ in sorted(scored_hotels, key=lambda x: x[1], reverse=True)[:3]]
-        best_activities = [a for a, _ in sorted(scored_activities, key=lambda x: x[1], reverse=True)[:5]]
+        with timer(ENGINE_STAGE_SECONDS, "selection"):
+            best_flights = _top_k(scored_flights, 3)
+            best_hotels = [h.materialize() for h in _top_k(scored_hotels, 3)]
+            best_activities = _top_k(scored_activities, 5)
         
         if not best_flights or not best_hotels:
             return None
@@ -158,7 +329,7 @@ class RecommendationEngine:
             user_preferences=user_preferences
         )
         
-        return TravelRecommendation(
+        return TravelPackage(
             destination=destination.title(),
             flights=best_flights,
             hotels=best_hotels,
@@ -167,21 +338,194 @@ class RecommendationEngine:
             budget_remaining=round(total_budget - estimated_total, 2),
             match_score=round(match_score, 1)
         )
-    
+
+    # ============== Flexible-date search ==============
+    def search_flexible(
+        self,
+        search_request: FlexibleSearchRequest,
+        user_preferences: Optional[UserFeatures] = None
+    ) -> FlexibleSearchResult:
+        """
+        Search every trip window within ±flex_days of the requested dates:
+        1. Fetch offers for the whole destination × date grid in one concurrent batch
+        2. Score all offers of each kind in a single pass over the grid
+        3. Assemble a package per cell, then build the price calendar and best packages
+        """
+
+        with timer(ENGINE_STAGE_SECONDS, "destinations"):
+            destinations = self._get_target_destinations(search_request)
+
+        cells = [
+            (destination, window)
+            for window in self._date_windows(search_request)
+            for destination in destinations
+        ]
+
+        with timer(ENGINE_STAGE_SECONDS, "provider_batch"):
+            grid = self._fetch_grid(search_request, cells)
+
+        with timer(ENGINE_STAGE_SECONDS, "scoring"):
+            scored_flights = self._score_cells([g[0] for g in grid], self._score_flights, search_request, user_preferences)
+            scored_hotels = self._score_cells([g[1] for g in grid], self._score_hotels, search_request, user_preferences)
+            scored_activities = self._score_cells([g[2] for g in grid], self._score_activities, search_request, user_preferences)
+
+        packages = []
+        calendar = {}
+        for i, (destination, window) in enumerate(cells):
+            calendar.setdefault(window, PriceCalendarDay(start_date=window[0], end_date=window[1]))
+            package = self._assemble_package(
+                destination, search_request, scored_flights[i], scored_hotels[i], scored_activities[i], user_preferences
+            )
+            if package is None:
+                continue
+            dated = DatedPackage(
+                **{name: getattr(package, name) for name in TravelPackage.__slots__},
+                start_date=window[0],
+                end_date=window[1]
+            )
+            packages.append(dated)
+
+        with timer(ENGINE_STAGE_SECONDS, "ranking"):
+            self._apply_ranker(packages, search_request)
+
+        for dated in packages:
+            day = calendar[(dated.start_date, dated.end_date)]
+            if day.cheapest_total is None or dated.estimated_total < day.cheapest_total:
+                day.cheapest_total = dated.estimated_total
+                day.best_destination = dated.destination
+                day.best_match_score = dated.match_score
+
+        packages.sort(key=lambda x: (-x.match_score, x.estimated_total))
+
+        return FlexibleSearchResult(
+            search_params=search_request,
+            calendar=list(calendar.values()),
+            recommendations=packages[:5],
+            generated_at=datetime.utcnow()
+        )
+
+    def _date_windows(self, search_request: FlexibleSearchRequest) -> List[Tuple[datetime, datetime]]:
+        """Trip windows shifted by -flex_days..+flex_days, keeping the trip length; past departures are dropped"""
+        today = datetime.utcnow().date()
+        windows = []
+        for offset in range(-search_request.flex_days, search_request.flex_days + 1):
+            shift = timedelta(days=offset)
+            start = search_request.start_date + shift
+            if start.date() >= today:
+                windows.append((start, search_request.end_date + shift))
+        return windows
+
+    def _fetch_grid(self, search_request: TravelSearchRequest, cells: List[Tuple[str, Tuple[datetime, datetime]]]) -> List[tuple]:
+        """(flights, hotels, activities) per grid cell, with identical provider queries issued once"""
+        memo = {}
+        pending = []
+        for destination, (start, end) in cells:
+            cell_request = search_request.model_copy(update={"start_date": start, "end_date": end})
+            pending.append(self._submit_fetches(memo, destination, cell_request))
+        return [tuple(f.result() for f in row) for row in pending]
+
+    def _submit_fetches(self, memo: dict, destination: str, search_request: TravelSearchRequest) -> tuple:
+        """Queue the three provider queries for one destination, reusing in-flight futures from memo"""
+        route = route_key(search_request.origin, destination, search_request.start_date)
+        futures = []
+        for kind, fetch in (("flights", self._fetch_flights), ("hotels", self._fetch_hotels),
+                            ("activities", self._fetch_activities)):
+            key = (kind,) + self._offer_key(kind, destination, search_request)
+            if key not in memo:
+                memo[key] = _grid_executor.submit(fetch, destination, search_request, route)
+            futures.append(memo[key])
+        return tuple(futures)
+
+    # ============== Batch search ==============
+    def search_batch(self, search_requests: List[TravelSearchRequest]) -> Iterator[Tuple[List[int], object]]:
+        """
+        Run many searches at once, yielding (request indexes, SearchResult or exception) as each
+        distinct search completes. Identical searches run once, and provider queries shared
+        between searches (e.g. the same destination's hotels from different origins) are issued once.
+        """
+        specs = {}
+        for index, search_request in enumerate(search_requests):
+            specs.setdefault(search_key(search_request), (search_request, []))[1].append(index)
+
+        memo = {}
+        outstanding = {}  # fetch future -> specs waiting on it
+        for search_request, indexes in specs.values():
+            try:
+                destinations = self._get_target_destinations(search_request)
+                cells = [(d, self._submit_fetches(memo, d, search_request)) for d in destinations]
+            except Exception as e:
+                yield indexes, e
+                continue
+            plan = {"request": search_request, "indexes": indexes, "cells": cells,
+                    "remaining": {f for _, row in cells for f in row}}
+            if not plan["remaining"]:
+                yield indexes, self._finish_batch_search(plan)
+                continue
+            for future in plan["remaining"]:
+                outstanding.setdefault(future, []).append(plan)
+
+        for future in as_completed(list(outstanding)):
+            for plan in outstanding.pop(future):
+                plan["remaining"].discard(future)
+                if not plan["remaining"]:
+                    try:
+                        outcome = self._finish_batch_search(plan)
+                    except Exception as e:
+                        outcome = e
+                    yield plan["indexes"], outcome
+
+    def _finish_batch_search(self, plan: dict) -> SearchResult:
+        search_request = plan["request"]
+        recommendations = []
+        for destination, (flights, hotels, activities) in plan["cells"]:
+            flights, hotels, activities = flights.result(), hotels.result(), activities.result()
+            if not flights or not hotels:
+                continue
+            package = self._assemble_package(
+                destination, search_request,
+                self._score_flights(flights, search_request),
+                self._score_hotels(hotels, search_request),
+                self._score_activities(activities, search_request),
+            )
+            if package:
+                recommendations.append(package)
+        self._apply_ranker(recommendations, search_request)
+        recommendations.sort(key=lambda x: x.match_score, reverse=True)
+        return SearchResult(
+            search_params=search_request,
+            recommendations=recommendations[:5],
+            generated_at=datetime.utcnow()
+        )
+
+    def _score_cells(self, offers_per_cell: List[list], scorer, search_request, user_preferences) -> List[list]:
+        """
+        Score every cell's offers with one scorer call, so the request-level terms are set up
+        once for the whole grid rather than per cell, then split the scores back per cell.
+        Offers differ per date window, so each offer is still scored individually.
+        """
+        flat = [offer for offers in offers_per_cell for offer in offers]
+        scored = scorer(flat, search_request, user_preferences)
+        result, start = [], 0
+        for offers in offers_per_cell:
+            result.append(scored[start:start + len(offers)])
+            start += len(offers)
+        return result
+
     def _score_flights(
         self,
-        flights: List[FlightOption],
+        flights: List[FlightOffer],
         search_request: TravelSearchRequest,
-        user_preferences: dict = None
-    ) -> List[Tuple[FlightOption, float]]:
+        user_preferences: Optional[UserFeatures] = None
+    ) -> List[Tuple[FlightOffer, float]]:
         """Score flights based on preferences"""
         
+        budget = search_request.budget_max * 0.35
+        price_weight = (user_preferences.vector[PRICE_SENSITIVITY] - 0.5) * 20 if user_preferences else 0.0
         scored = []
         for flight in flights:
             score = 50  # Base score
             
             # Price score (lower is better, up to 30 points)
-            budget = search_request.budget_max * 0.35
             price_ratio = flight.price / budget if budget > 0 else 1
             score += max(0, 30 * (1 - price_ratio))
             
@@ -196,18 +540,24 @@ class RecommendationEngine:
             if 8 <= dep_hour <= 18:
                 score += 10
             
+            # Price-sensitive users weigh cheap fares more, others less
+            score += price_weight * (1 - price_ratio)
+            
             scored.append((flight, score))
         
         return scored
     
     def _score_hotels(
         self,
-        hotels: List[HotelOption],
+        hotels: List[HotelOffer],
         search_request: TravelSearchRequest,
-        user_preferences: dict = None
-    ) -> List[Tuple[HotelOption, float]]:
+        user_preferences: Optional[UserFeatures] = None
+    ) -> List[Tuple[HotelOffer, float]]:
         """Score hotels based on preferences"""
         
+        budget = search_request.budget_max * 0.45
+        travel_style = search_request.travel_style
+        star_band = (user_preferences.vector[STAR_LOW], user_preferences.vector[STAR_HIGH]) if user_preferences else None
         scored = []
         for hotel in hotels:
             score = 50  # Base score
@@ -216,34 +566,39 @@ class RecommendationEngine:
             score += (hotel.rating / 5) * 25
             
             # Price score (value for money, up to 25 points)
-            budget = search_request.budget_max * 0.45
             price_ratio = hotel.total_price / budget if budget > 0 else 1
             score += max(0, 25 * (1 - price_ratio * 0.5))
             
             # Travel style matching
-            if search_request.travel_style:
-                if search_request.travel_style == "luxury" and hotel.price_per_night > 300:
+            if travel_style:
+                if travel_style == "luxury" and hotel.price_per_night > 300:
                     score += 15
-                elif search_request.travel_style == "budget" and hotel.price_per_night < 120:
+                elif travel_style == "budget" and hotel.price_per_night < 120:
                     score += 15
-                elif search_request.travel_style == "mid-range" and 100 <= hotel.price_per_night <= 250:
+                elif travel_style == "mid-range" and 100 <= hotel.price_per_night <= 250:
                     score += 15
             
             # Amenities bonus
-            desired_amenities = {"Free WiFi", "Pool", "Gym"}
-            matching = len(desired_amenities.intersection(set(hotel.amenities)))
+            matching = (hotel._amenity_mask & DESIRED_AMENITIES).bit_count()
             score += matching * 5
             
+            # Preferred rating band
+            if star_band:
+                if star_band[0] <= hotel.rating <= star_band[1]:
+                    score += 10
+                elif hotel.rating < star_band[0]:
+                    score -= 5
+            
             scored.append((hotel, score))
         
         return scored
     
     def _score_activities(
         self,
-        activities: List[ActivityOption],
+        activities: List[ActivityOffer],
         search_request: TravelSearchRequest,
-        user_preferences: dict = None
-    ) -> List[Tuple[ActivityOption, float]]:
+        user_preferences: Optional[UserFeatures] = None
+    ) -> List[Tuple[ActivityOffer, float]]:
         """Score activities based on interests"""
         
         interests = set(i.lower() for i in search_request.interests) if search_request.interests else set()
@@ -259,6 +614,10 @@ class RecommendationEngine:
                     for interest in interests):
                 score += 15
             
+            # Learned interest weight (up to 15 points)
+            if user_preferences:
+                score += user_preferences.interest_weight(activity.category) * 15
+            
             # Rating score (up to 20 points)
             score += (activity.rating / 5) * 20
             
@@ -270,13 +629,32 @@ class RecommendationEngine:
         
         return scored
     
+    def _apply_ranker(self, packages: List[TravelPackage], search_request: TravelSearchRequest):
+        """Blend one batched model pass into the heuristic match scores of freshly assembled packages"""
+        if self.ranker is None or not packages:
+            return
+        rows = [
+            package_features(
+                total=p.estimated_total,
+                budget=search_request.budget_max,
+                flight_price=min(f.price for f in p.flights),
+                hotel_ratings=[h.rating for h in p.hotels],
+                nightly_prices=[h.price_per_night for h in p.hotels],
+                activity_categories=[a.category for a in p.activities],
+                interests=search_request.interests,
+            )
+            for p in packages
+        ]
+        for package, score in zip(packages, self.ranker.score_batch(rows)):
+            package.match_score = round((1 - RANKER_BLEND_WEIGHT) * package.match_score + RANKER_BLEND_WEIGHT * score, 1)
+
     def _calculate_match_score(
         self,
-        flights: List[FlightOption],
-        hotels: List[HotelOption],
-        activities: List[ActivityOption],
+        flights: List[FlightOffer],
+        hotels: List[HotelOffer],
+        activities: List[ActivityOffer],
         search_request: TravelSearchRequest,
-        user_preferences: dict = None
+        user_preferences: Optional[UserFeatures] = None
     ) -> float:
         """Calculate overall match score for a recommendation"""
         
@@ -0,0 +1,239 @@
+"""
+Provider Resilience
+Per-provider circuit breakers, bounded-time and hedged calls, and a last-known-good
+offer store, so searches fall back immediately (to cached or mock offers) instead of
+waiting on a provider that is timing out.
+"""
+
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait, TimeoutError as FutureTimeout
+
+from metrics import Counter, REGISTRY
+from ratelimit import acquire_provider_slot, release_provider_slot
+
+logger = logging.getLogger("resilience")
+logger.setLevel(logging.INFO)
+ch = logging.StreamHandler()
+ch.setFormatter(logging.Formatter('RESILIENCE: %(message)s'))
+logger.addHandler(ch)
+
+PROVIDER_POOL_SIZE = int(os.environ.get("PROVIDER_POOL_SIZE", "16"))
+BREAKER_WINDOW = int(os.environ.get("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.environ.get("BREAKER_MIN_CALLS", "5"))
+BREAKER_FAILURE_RATE = float(os.environ.get("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_RATE = float(os.environ.get("BREAKER_SLOW_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.environ.get("BREAKER_OPEN_SECONDS", "30"))
+# Hard per-call deadlines; the Viator hedge fires if the first attempt has not answered in time
+DUFFEL_TIMEOUT = float(os.environ.get("DUFFEL_TIMEOUT_SECONDS", "8"))
+VIATOR_TIMEOUT = float(os.environ.get("VIATOR_TIMEOUT_SECONDS", "3"))
+VIATOR_HEDGE_AFTER = float(os.environ.get("VIATOR_HEDGE_SECONDS", "0.8"))
+LAST_GOOD_MAX_AGE = float(os.environ.get("LAST_GOOD_MAX_AGE_SECONDS", str(6 * 3600)))
+LAST_GOOD_MAX_ENTRIES = int(os.environ.get("LAST_GOOD_MAX_ENTRIES", "2000"))
+
+PROVIDER_FALLBACK_TOTAL = Counter(
+    "smarttravel_provider_fallback_total", "Searches served from fallback offers", ["provider", "reason", "fallback"])
+REGISTRY.append(PROVIDER_FALLBACK_TOTAL)
+
+
+# Set by call_tracking_fallback: a one-item list flipped when a provider call falls back
+_fallback_flag = contextvars.ContextVar("provider_fallback_flag", default=None)
+
+
+class ProviderUnavailable(Exception):
+    """Raised without calling the provider when its breaker is open or it is at its concurrency limit."""
+
+    def __init__(self, message: str, reason: str = "circuit_open"):
+        super().__init__(message)
+        self.reason = reason
+
+
+class CircuitBreaker:
+    """
+    Rolling-window breaker that opens on failure rate or slow-call rate, then probes half-open.
+    Every state change starts a new generation; allow_request hands out (generation, probe)
+    tokens and record ignores outcomes from an earlier generation, so calls admitted before a
+    trip can neither re-trip the open breaker nor pass for the half-open probe.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, slow_call_seconds: float, window: int = BREAKER_WINDOW,
+                 min_calls: int = BREAKER_MIN_CALLS, failure_rate: float = BREAKER_FAILURE_RATE,
+                 slow_rate: float = BREAKER_SLOW_RATE, open_seconds: float = BREAKER_OPEN_SECONDS,
+                 half_open_probes: int = 1):
+        self.name = name
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window)  # (failed, slow)
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> Optional[Tuple[int, bool]]:
+        """A (generation, probe) token to pass back to record, or None when the call is refused."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    return None
+                self._set_state(self.HALF_OPEN)
+                self._probes_in_flight = 0
+                logger.info(f"{self.name} breaker half-open, probing")
+            if self.state == self.HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_probes:
+                    return None
+                self._probes_in_flight += 1
+                return self._generation, True
+            return self._generation, False
+
+    def record(self, token: Tuple[int, bool], success: bool, duration: float):
+        generation, probe = token
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            if generation != self._generation:
+                # Admitted under an earlier state; its outcome says nothing about this one
+                return
+            if probe:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if success and not slow:
+                    self._set_state(self.CLOSED)
+                    self._outcomes.clear()
+                    logger.info(f"{self.name} breaker closed")
+                else:
+                    self._trip()
+                return
+
+            self._outcomes.append((not success, slow))
+            if len(self._outcomes) < self.min_calls:
+                return
+            failures = sum(1 for failed, _ in self._outcomes if failed) / len(self._outcomes)
+            slow_calls = sum(1 for _, was_slow in self._outcomes if was_slow) / len(self._outcomes)
+            if failures >= self.failure_rate or slow_calls >= self.slow_rate:
+                self._trip()
+
+    def _set_state(self, state: str):
+        self.state = state
+        self._generation += 1
+
+    def _trip(self):
+        self._set_state(self.OPEN)
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        logger.info(f"{self.name} breaker OPEN for {self.open_seconds:.0f}s")
+
+
+class LastGoodStore:
+    """Bounded store of the most recent successful provider results per search key."""
+
+    def __init__(self, max_entries: int = LAST_GOOD_MAX_ENTRIES, max_age: float = LAST_GOOD_MAX_AGE):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key, offers):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(offers))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if not entry or time.monotonic() - entry[0] > self.max_age:
+            return None
+        return list(entry[1])
+
+
+_executor = ThreadPoolExecutor(max_workers=PROVIDER_POOL_SIZE, thread_name_prefix="provider")
+
+BREAKERS = {
+    "duffel": CircuitBreaker("duffel", slow_call_seconds=float(os.environ.get("DUFFEL_SLOW_SECONDS", "4"))),
+    "viator": CircuitBreaker("viator", slow_call_seconds=float(os.environ.get("VIATOR_SLOW_SECONDS", "2"))),
+}
+
+last_good = LastGoodStore()
+
+
+def _submit(provider: str, fn):
+    # The slot is held until the call really finishes, even if the caller stopped waiting
+    future = _executor.submit(fn)
+    future.add_done_callback(lambda _: release_provider_slot(provider))
+    return future
+
+
+def _call(provider: str, fn, timeout: float, hedge_after: float = None):
+    """Run fn on the provider pool with a hard deadline; optionally fire a hedge request."""
+    futures = [_submit(provider, fn)]
+    deadline = time.monotonic() + timeout
+    if hedge_after is not None and hedge_after < timeout:
+        done, _ = wait(futures, timeout=hedge_after)
+        # Hedges are only sent with spare provider capacity
+        if not done and acquire_provider_slot(provider, wait=0):
+            futures.append(_submit(provider, fn))
+
+    last_error = None
+    pending = set(futures)
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            last_error = future.exception()
+    if last_error is not None and not pending:
+        raise last_error
+    raise FutureTimeout(f"provider call exceeded {timeout:.1f}s")
+
+
+def guarded_call(provider: str, fn, timeout: float, hedge_after: float = None):
+    """Call a provider through its breaker and concurrency limit; raises ProviderUnavailable to shed."""
+    breaker = BREAKERS[provider]
+    if not acquire_provider_slot(provider):
+        raise ProviderUnavailable(f"{provider} at concurrency limit", reason="saturated")
+    token = breaker.allow_request()
+    if token is None:
+        release_provider_slot(provider)
+        raise ProviderUnavailable(f"{provider} circuit open")
+    start = time.monotonic()
+    try:
+        result = _call(provider, fn, timeout, hedge_after)
+    except Exception:
+        breaker.record(token, False, time.monotonic() - start)
+        raise
+    breaker.record(token, True, time.monotonic() - start)
+    return result
+
+
+def fallback_offers(provider: str, key, reason: str):
+    """Last known good offers for this key, or None (caller falls through to mock)."""
+    flag = _fallback_flag.get()
+    if flag is not None:
+        flag[0] = True
+    offers = last_good.get(key)
+    PROVIDER_FALLBACK_TOTAL.inc(1, provider, reason, "last_good" if offers else "mock")
+    return offers
+
+
+def call_tracking_fallback(fn):
+    """Run fn(); returns (result, whether a provider it called fell back to last-good or mock offers)."""
+    flag = [False]
+    token = _fallback_flag.set(flag)
+    try:
+        return fn(), flag[0]
+    finally:
+        _fallback_flag.reset(token)
@@ -0,0 +1,204 @@
+"""
+Data Retention & Archival
+Moves rows that are no longer read on hot paths out of their tables and into
+archived_batches as zlib-compressed JSON: read notifications, inactive price alerts, and
+completed or cancelled itineraries (with their bookings, collaborators and change log)
+once they are past their retention window. Work is done in id-ordered batches, one
+transaction per batch with a pause in between, so the job never holds long locks or
+competes with request traffic. A retention period of 0 days disables that policy.
+
+    python retention.py
+"""
+
+import json
+import logging
+import os
+import time
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List
+
+from sqlalchemy.orm import Session
+
+from models import (
+    SessionLocal, Notification, PriceAlert, Itinerary, FlightBooking, HotelBooking, ActivityBooking,
+    ItineraryCollaborator, ItineraryChange, TravelHistory, ArchivedBatch
+)
+from pdf_cache import pdf_cache
+from feature_store import feature_store
+from streaming import dumps
+
+logger = logging.getLogger("retention")
+logger.setLevel(logging.INFO)
+ch = logging.StreamHandler()
+ch.setFormatter(logging.Formatter('RETENTION: %(message)s'))
+logger.addHandler(ch)
+
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get("RETENTION_NOTIFICATION_DAYS", "30"))
+ALERT_RETENTION_DAYS = int(os.environ.get("RETENTION_ALERT_DAYS", "90"))
+ITINERARY_RETENTION_DAYS = int(os.environ.get("RETENTION_ITINERARY_DAYS", "365"))
+RETENTION_BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", "500"))
+# Pause between batches so archival yields to request traffic; max batches bounds one run per policy
+RETENTION_BATCH_PAUSE_SECONDS = float(os.environ.get("RETENTION_BATCH_PAUSE_SECONDS", "0.2"))
+RETENTION_MAX_BATCHES = int(os.environ.get("RETENTION_MAX_BATCHES", "100"))
+
+ITINERARY_CHILDREN = {
+    "flights": FlightBooking,
+    "hotels": HotelBooking,
+    "activities": ActivityBooking,
+    "collaborators": ItineraryCollaborator,
+    "changes": ItineraryChange,
+}
+
+
+def _row_dict(row) -> dict:
+    return {column.name: getattr(row, column.name) for column in row.__table__.columns}
+
+
+def compress(records: List[dict]) -> bytes:
+    return zlib.compress(dumps(records), 6)
+
+
+def decompress(payload: bytes) -> List[dict]:
+    return json.loads(zlib.decompress(payload))
+
+
+@dataclass(slots=True)
+class RetentionPolicy:
+    kind: str
+    model: type
+    days: int
+    criteria: Callable[[datetime], list]  # cutoff -> filter clauses selecting expired rows
+    collect: Callable[[Session, list], List[dict]] = None  # rows -> archive records (default: the columns)
+    purge_children: Callable[[Session, List[int]], None] = None
+    prepare: Callable[[Session, datetime], None] = None  # runs once per run, before the first batch
+
+
+def _collect_itineraries(db: Session, itineraries: list) -> List[dict]:
+    ids = [it.id for it in itineraries]
+    children = {name: defaultdict(list) for name in ITINERARY_CHILDREN}
+    for name, model in ITINERARY_CHILDREN.items():
+        for row in db.query(model).filter(model.itinerary_id.in_(ids)).order_by(model.id):
+            children[name][row.itinerary_id].append(_row_dict(row))
+    return [
+        {**_row_dict(it), **{name: rows.get(it.id, []) for name, rows in children.items()}}
+        for it in itineraries
+    ]
+
+
+def _purge_itinerary_children(db: Session, ids: List[int]):
+    for model in ITINERARY_CHILDREN.values():
+        db.query(model).filter(model.itinerary_id.in_(ids)).delete(synchronize_session=False)
+    # Trip ratings stay with the user's history; only the link to the archived itinerary goes
+    db.query(TravelHistory).filter(TravelHistory.itinerary_id.in_(ids)).update(
+        {TravelHistory.itinerary_id: None}, synchronize_session=False
+    )
+
+
+def _stamp_alert_deactivation(db: Session, now: datetime):
+    # Alerts switched off before deactivated_at existed (or outside the ORM) start aging today
+    db.query(PriceAlert).filter(PriceAlert.is_active == False, PriceAlert.deactivated_at.is_(None)).update(
+        {PriceAlert.deactivated_at: now}, synchronize_session=False
+    )
+    db.commit()
+
+
+POLICIES = [
+    RetentionPolicy(
+        "notification", Notification, NOTIFICATION_RETENTION_DAYS,
+        lambda cutoff: [Notification.is_read == True, Notification.created_at < cutoff]
+    ),
+    RetentionPolicy(
+        "price_alert", PriceAlert, ALERT_RETENTION_DAYS,
+        lambda cutoff: [PriceAlert.is_active == False, PriceAlert.deactivated_at < cutoff],
+        prepare=_stamp_alert_deactivation
+    ),
+    RetentionPolicy(
+        "itinerary", Itinerary, ITINERARY_RETENTION_DAYS,
+        lambda cutoff: [Itinerary.status.in_(["completed", "cancelled"]), Itinerary.end_date < cutoff],
+        collect=_collect_itineraries, purge_children=_purge_itinerary_children
+    ),
+]
+
+
+def archive_batch(db: Session, policy: RetentionPolicy, cutoff: datetime) -> List[dict]:
+    """Archive and delete up to RETENTION_BATCH_SIZE expired rows in one transaction; returns the records."""
+    model = policy.model
+    rows = db.query(model).filter(*policy.criteria(cutoff)).order_by(model.id).limit(RETENTION_BATCH_SIZE).all()
+    if not rows:
+        return []
+    ids = [row.id for row in rows]
+    records = policy.collect(db, rows) if policy.collect else [_row_dict(row) for row in rows]
+    db.add(ArchivedBatch(
+        kind=policy.kind, first_id=ids[0], last_id=ids[-1], record_count=len(records), payload=compress(records)
+    ))
+    if policy.purge_children:
+        policy.purge_children(db, ids)
+    db.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+    db.commit()
+    db.expunge_all()
+    return records
+
+
+def apply_policy(db: Session, policy: RetentionPolicy, now: datetime = None) -> int:
+    if policy.days <= 0:
+        return 0
+    now = now or datetime.utcnow()
+    if policy.prepare:
+        policy.prepare(db, now)
+    cutoff = now - timedelta(days=policy.days)
+    archived = 0
+    for batch in range(RETENTION_MAX_BATCHES):
+        if batch:
+            time.sleep(RETENTION_BATCH_PAUSE_SECONDS)
+        records = archive_batch(db, policy, cutoff)
+        if policy.kind == "itinerary":
+            for record in records:
+                pdf_cache.invalidate(record["id"])
+            for user_id in {record["user_id"] for record in records if record["user_id"] is not None}:
+                feature_store.schedule_update(user_id=user_id)
+        archived += len(records)
+        if len(records) < RETENTION_BATCH_SIZE:
+            break
+    return archived
+
+
+def run_retention(now: datetime = None) -> Dict[str, int]:
+    """Apply every policy; returns rows archived per kind."""
+    db = SessionLocal()
+    archived = {}
+    try:
+        for policy in POLICIES:
+            try:
+                archived[policy.kind] = apply_policy(db, policy, now)
+            except Exception as e:
+                db.rollback()
+                archived[policy.kind] = 0
+                logger.error(f"Retention for {policy.kind} failed: {e}")
+    finally:
+        db.close()
+    if any(archived.values()):
+        logger.info("Archived " + ", ".join(f"{count} {kind}" for kind, count in archived.items()))
+    return archived
+
+
+def archived_records(db: Session, kind: str, source_id: int = None) -> Iterator[dict]:
+    """Read archived rows back (all of a kind, or the one with `source_id`)."""
+    query = db.query(ArchivedBatch).filter(ArchivedBatch.kind == kind)
+    if source_id is not None:
+        query = query.filter(ArchivedBatch.first_id <= source_id, ArchivedBatch.last_id >= source_id)
+    for batch in query.order_by(ArchivedBatch.id):
+        for record in decompress(batch.payload):
+            if source_id is None or record["id"] == source_id:
+                yield record
+
+
+def main():
+    for kind, count in run_retention().items():
+        print(f"{kind}: {count} archived")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,14 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from models import SessionLocal, Itinerary, FlightBooking, User, PriceAlert, Notification
 from email_service import EmailService
+from provider_cache import provider_cache
+from destination_index import destination_index
+import collaborative
+import itinerary_totals
+import retention
+from metrics import SCHEDULER_RUN_SECONDS, SCHEDULER_ROWS_TOTAL
 from datetime import datetime
+import time
 
 logger = logging.getLogger("price_monitor")
 logger.setLevel(logging.INFO)
@@ -12,12 +19,14 @@ ch.setFormatter(logging.Formatter('PRICE-MONITOR: %(message)s'))
 logger.addHandler(ch)
 
 def check_price_drops():
-    """Background job that checks if prices for draft itineraries have dropped"""
+    """Background job that checks if prices for draft itineraries have dropped, against their budgets"""
     logger.info(f"Running price drop analysis at {datetime.now().isoformat()}")
+    run_start = time.perf_counter()
     db = SessionLocal()
     try:
-        # Get all active draft itineraries
-        drafts = db.query(Itinerary).filter(Itinerary.status == "draft").all()
+        # Draft itineraries with something priced on them; their cost is the maintained booked_total
+        drafts = db.query(Itinerary).filter(Itinerary.status == "draft", Itinerary.booked_total > 0).all()
+        SCHEDULER_ROWS_TOTAL.inc(len(drafts), "price_drop_check", "itineraries")
         
         for itinerary in drafts:
             user = db.query(User).filter(User.id == itinerary.user_id).first()
@@ -27,12 +36,15 @@ def check_price_drops():
             # Simulate a 10% chance of a major price drop for demonstration
             import random
             if random.random() < 0.10:
-                drop_amount = itinerary.total_budget * random.uniform(0.05, 0.15)
-                new_price = itinerary.total_budget - drop_amount
-                
-                # Update budget in DB
-                itinerary.total_budget = new_price
-                db.commit()
+                drop_amount = itinerary.booked_total * random.uniform(0.05, 0.15)
+                new_price = itinerary.booked_total - drop_amount
+                # Compare against the traveller's budget; the budget itself is theirs and stays untouched
+                if itinerary.booked_total > itinerary.total_budget >= new_price:
+                    budget_note = f" (now within your ${itinerary.total_budget:,.2f} budget)"
+                elif new_price > itinerary.total_budget:
+                    budget_note = f" (still ${new_price - itinerary.total_budget:,.2f} over budget)"
+                else:
+                    budget_note = f" (${itinerary.total_budget - new_price:,.2f} under budget)"
                 
                 # Trigger an alert email conceptually
                 logger.info(f"🚨 PRICE DROP DETECTED for Itinerary #{itinerary.id} ({itinerary.name}). Dropped by ${drop_amount:,.2f}!")
@@ -41,10 +53,11 @@ def check_price_drops():
                 notif = Notification(
                     user_id=user.id,
                     type="price_drop",
-                    message=f"Price drop on '{itinerary.name}'! Saved ${drop_amount:,.2f} — now ${new_price:,.2f}."
+                    message=f"Price drop on '{itinerary.name}'! Saved ${drop_amount:,.2f} — now ${new_price:,.2f}{budget_note}."
                 )
                 db.add(notif)
                 db.commit()
+                SCHEDULER_ROWS_TOTAL.inc(1, "price_drop_check", "notifications")
 
                 EmailService.send_confirmation_email(
                     user_email=user.email,
@@ -55,6 +68,7 @@ def check_price_drops():
 
         # Check user price alerts
         active_alerts = db.query(PriceAlert).filter(PriceAlert.is_active == True).all()
+        SCHEDULER_ROWS_TOTAL.inc(len(active_alerts), "price_drop_check", "alerts")
         for alert in active_alerts:
             import random
             simulated_price = alert.target_price * random.uniform(0.8, 1.2)
@@ -66,11 +80,76 @@ def check_price_drops():
                     message=f"Price alert: {alert.destination.title()} is now ${simulated_price:,.2f} — at or below your target of ${alert.target_price:,.2f}!"
                 )
                 db.add(notif)
+                SCHEDULER_ROWS_TOTAL.inc(1, "price_drop_check", "notifications")
         db.commit()
     except Exception as e:
         logger.error(f"Error checking prices: {e}")
     finally:
         db.close()
+        SCHEDULER_RUN_SECONDS.observe(time.perf_counter() - run_start, "price_drop_check")
+
+
+def refresh_hot_routes():
+    """Background job that re-fetches provider results for popular routes before they expire"""
+    run_start = time.perf_counter()
+    try:
+        queued = provider_cache.refresh_hot_routes()
+        SCHEDULER_ROWS_TOTAL.inc(queued, "provider_refresh", "cache_entries")
+        if queued:
+            logger.info(f"Queued refresh of {queued} provider cache entries for hot routes")
+    except Exception as e:
+        logger.error(f"Error refreshing hot routes: {e}")
+    finally:
+        SCHEDULER_RUN_SECONDS.observe(time.perf_counter() - run_start, "provider_refresh")
+
+
+def rebuild_destination_index():
+    """Background job that refreshes destination similarities as bookings shift category mixes"""
+    run_start = time.perf_counter()
+    try:
+        destination_index.rebuild()
+    except Exception as e:
+        logger.error(f"Error rebuilding destination index: {e}")
+    finally:
+        SCHEDULER_RUN_SECONDS.observe(time.perf_counter() - run_start, "destination_index")
+
+
+def rebuild_collaborative_neighbours():
+    """Batch job that recomputes item-item destination similarities from user interactions"""
+    run_start = time.perf_counter()
+    try:
+        collaborative.run_batch()
+    except Exception as e:
+        logger.error(f"Error rebuilding collaborative neighbours: {e}")
+    finally:
+        SCHEDULER_RUN_SECONDS.observe(time.perf_counter() - run_start, "collaborative_neighbours")
+
+
+def reconcile_itinerary_totals():
+    """Consistency job that repairs denormalized itinerary cost totals from the booking tables"""
+    run_start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        fixed = itinerary_totals.reconcile(db)
+        SCHEDULER_ROWS_TOTAL.inc(fixed, "itinerary_totals", "itineraries")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error reconciling itinerary totals: {e}")
+    finally:
+        db.close()
+        SCHEDULER_RUN_SECONDS.observe(time.perf_counter() - run_start, "itinerary_totals")
+
+
+def archive_expired_rows():
+    """Retention job that moves old notifications, inactive alerts and finished trips to the archive"""
+    run_start = time.perf_counter()
+    try:
+        for kind, count in retention.run_retention().items():
+            SCHEDULER_ROWS_TOTAL.inc(count, "retention", kind)
+    except Exception as e:
+        logger.error(f"Error running retention: {e}")
+    finally:
+        SCHEDULER_RUN_SECONDS.observe(time.perf_counter() - run_start, "retention")
 
 
 def start_scheduler():
@@ -83,5 +162,42 @@ def start_scheduler():
         name='Check flight prices for drafts',
         replace_existing=True
     )
+    scheduler.add_job(
+        refresh_hot_routes,
+        trigger=IntervalTrigger(minutes=1),
+        id='provider_refresh',
+        name='Refresh provider results for hot routes',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        rebuild_destination_index,
+        trigger=IntervalTrigger(minutes=30),
+        id='destination_index',
+        name='Rebuild similar-destination index',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        rebuild_collaborative_neighbours,
+        trigger=IntervalTrigger(hours=1),
+        id='collaborative_neighbours',
+        name='Rebuild collaborative-filtering destination neighbours',
+        next_run_time=datetime.now(),
+        replace_existing=True
+    )
+    scheduler.add_job(
+        reconcile_itinerary_totals,
+        trigger=IntervalTrigger(minutes=15),
+        id='itinerary_totals',
+        name='Reconcile denormalized itinerary cost totals',
+        next_run_time=datetime.now(),
+        replace_existing=True
+    )
+    scheduler.add_job(
+        archive_expired_rows,
+        trigger=IntervalTrigger(hours=6),
+        id='retention',
+        name='Archive expired notifications, alerts and itineraries',
+        replace_existing=True
+    )
     scheduler.start()
     logger.info("Price monitor scheduler started. Checking every 2 minutes.")
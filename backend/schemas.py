@@ -1,6 +1,7 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import Any, Dict, List, Literal, Optional
 from datetime import datetime
+import re
 
 
 # User Schemas
@@ -60,6 +61,22 @@ class TravelSearchRequest(BaseModel):
     interests: List[str] = []
     travel_style: Optional[str] = None  # luxury, mid-range, budget
 
+    # Normalized here so the engine and the coalescing key (coalescing.search_key) see the same values
+    @field_validator("destination")
+    @classmethod
+    def normalize_destination(cls, value):
+        return (value.strip().lower() or None) if value is not None else None
+
+    @field_validator("origin")
+    @classmethod
+    def normalize_origin(cls, value):
+        return value.strip().upper()
+
+    @field_validator("interests")
+    @classmethod
+    def normalize_interests(cls, value):
+        return list(dict.fromkeys(i.strip().lower() for i in value if i.strip()))
+
 
 # Flight Schemas
 class FlightOption(BaseModel):
@@ -187,6 +204,11 @@ class ItineraryResponse(BaseModel):
     end_date: datetime
     total_budget: float
     status: str
+    version: int = 0  # pass as `since` to /changes to catch up from this copy
+    flight_total: float = 0.0
+    hotel_total: float = 0.0
+    activity_total: float = 0.0
+    booked_total: float = 0.0
     created_at: datetime
     flights: List[FlightBookingResponse] = []
     hotels: List[HotelBookingResponse] = []
@@ -196,6 +218,114 @@ class ItineraryResponse(BaseModel):
         from_attributes = True
 
 
+# Itinerary Change Schemas
+class ItineraryOperation(BaseModel):
+    op: Literal["add", "remove", "update"]
+    entity: Literal["itinerary", "flight", "hotel", "activity"]
+    id: Optional[int] = None  # booking id for remove/update
+    data: Dict[str, Any] = {}  # fields of the booking to add, or the fields to change
+
+
+class ItineraryBatchRequest(BaseModel):
+    operations: List[ItineraryOperation] = Field(..., min_length=1, max_length=200)
+    expected_version: Optional[int] = None  # version the edits were made against; stale -> 409
+
+
+class ItineraryChangeResponse(BaseModel):
+    version: int
+    op: str
+    entity: str
+    entity_id: Optional[int] = None
+    data: Optional[Dict[str, Any]] = None
+    user_id: Optional[int] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ItineraryDiffResponse(BaseModel):
+    itinerary_id: int
+    version: int
+    changes: List[ItineraryChangeResponse]
+
+
+# Day-by-day Plan Schemas
+class PlannedActivity(BaseModel):
+    activity_id: int
+    activity_name: str
+    category: Optional[str] = None
+    start: datetime
+    end: datetime
+    fixed: bool  # kept at its booked time rather than placed by the planner
+
+
+class DayPlan(BaseModel):
+    date: datetime
+    available_from: Optional[datetime] = None  # None when flights leave no time that day
+    available_until: Optional[datetime] = None
+    hours_planned: float
+    activities: List[PlannedActivity] = []
+
+
+class ItineraryPlanResponse(BaseModel):
+    itinerary_id: int
+    days: List[DayPlan]
+    unscheduled: List[int] = []  # activity ids that did not fit
+    total_score: float
+
+
+class BulkExportRequest(BaseModel):
+    itinerary_ids: List[int] = []
+    all_for_user: bool = False
+
+
+# Bulk Import Schemas
+class UserImportRecord(UserCreate, UserPreferenceCreate):
+    """An account plus optional preferences; list fields may be ';'-separated strings (CSV)"""
+    # A plain password (hashed on import) or the bcrypt password_hash from a user export
+    password: Optional[str] = None
+    password_hash: Optional[str] = None
+
+    @field_validator("preferred_activities", "dietary_restrictions", mode="before")
+    @classmethod
+    def split_list(cls, value):
+        if isinstance(value, str):
+            return [item.strip() for item in value.split(";") if item.strip()]
+        return value
+
+    @field_validator("password_hash")
+    @classmethod
+    def check_hash(cls, value):
+        if value is not None and not re.fullmatch(r"\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}", value):
+            raise ValueError("not a bcrypt hash")
+        return value
+
+    @model_validator(mode="after")
+    def require_credentials(self):
+        if not self.password and not self.password_hash:
+            raise ValueError("password or password_hash is required")
+        return self
+
+
+class ItineraryImportRecord(ItineraryCreate):
+    user_email: str  # owner, matched to an existing account
+    status: Literal["draft", "confirmed", "completed", "cancelled"] = "draft"
+
+
+class ImportRowError(BaseModel):
+    row: int  # 1-based data row (CSV header and blank lines not counted)
+    error: str
+
+
+class BulkImportResponse(BaseModel):
+    kind: str
+    processed: int
+    inserted: int
+    failed: int
+    errors: List[ImportRowError] = []  # the first IMPORT_MAX_REPORTED_ERRORS failures
+
+
 # Recommendation Response
 class TravelRecommendation(BaseModel):
     destination: str
@@ -213,6 +343,35 @@ class RecommendationResponse(BaseModel):
     generated_at: datetime
 
 
+# Flexible-date Search Schemas
+class FlexibleSearchRequest(TravelSearchRequest):
+    flex_days: int = Field(3, ge=0, le=7)  # Shift the whole trip up to ±N days
+
+
+class PriceCalendarEntry(BaseModel):
+    start_date: datetime
+    end_date: datetime
+    cheapest_total: Optional[float] = None
+    best_destination: Optional[str] = None
+    best_match_score: Optional[float] = None
+
+
+class FlexibleRecommendation(TravelRecommendation):
+    start_date: datetime
+    end_date: datetime
+
+
+class FlexibleSearchResponse(BaseModel):
+    search_params: FlexibleSearchRequest
+    calendar: List[PriceCalendarEntry]
+    recommendations: List[FlexibleRecommendation]
+    generated_at: datetime
+
+
+class BatchSearchRequest(BaseModel):
+    searches: List[TravelSearchRequest] = Field(..., min_length=1, max_length=50)
+
+
 # Price Alert Schemas
 class PriceAlertCreate(BaseModel):
     destination: str
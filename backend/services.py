@@ -6,11 +6,17 @@ Design is modular - swap these with real API integrations (Amadeus, Booking.com,
 
 import random
 import os
+import time
+import hashlib
 import httpx
 from datetime import datetime, timedelta
 from typing import List, Optional
-from schemas import FlightOption, HotelOption, ActivityOption, TravelSearchRequest
-import uuid
+from offers import FlightOffer, HotelOffer, ActivityOffer, AMENITIES, next_offer_id
+from metrics import timer, PROVIDER_CALL_SECONDS
+from resilience import (
+    guarded_call, fallback_offers, last_good, ProviderUnavailable,
+    DUFFEL_TIMEOUT, VIATOR_TIMEOUT, VIATOR_HEDGE_AFTER,
+)
 
 # Read real API keys
 DUFFEL_TOKEN = os.environ.get("DUFFEL_ACCESS_TOKEN", "").strip()
@@ -21,6 +27,42 @@ try:
 except ImportError:
     Duffel = None
 
+# Mock provider behaviour: "random" (default) or "seeded", where every mock result is derived
+# from a hash of the request parameters so identical searches return identical offers
+MOCK_PROVIDER_MODE = os.environ.get("MOCK_PROVIDER_MODE", "random").strip().lower()
+MOCK_SEED = os.environ.get("MOCK_SEED", "smart-travel")
+# Optional injected latency for mock results, to emulate real provider timing in load tests
+MOCK_LATENCY_PROFILE = os.environ.get("MOCK_LATENCY_PROFILE", "").strip().lower()
+
+# (mean ms, jitter ms) per provider
+MOCK_LATENCY_PROFILES = {
+    "fast": {"duffel": (120, 40), "duffel_stays": (80, 30), "viator": (90, 30)},
+    "realistic": {"duffel": (900, 450), "duffel_stays": (400, 150), "viator": (450, 200)},
+    "degraded": {"duffel": (3500, 2000), "duffel_stays": (1500, 800), "viator": (2500, 1200)},
+}
+
+
+def _mock_rng(*params):
+    """Random source for mock generation: seeded from the request in seeded mode, else global random."""
+    if MOCK_PROVIDER_MODE == "seeded":
+        key = "|".join([MOCK_SEED] + [str(p) for p in params])
+        return random.Random(int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "big"))
+    return random
+
+
+def _mock_offer_id(rng) -> str:
+    return next_offer_id() if rng is random else f"{rng.getrandbits(32):08x}"
+
+
+def _emulate_latency(provider: str, *params):
+    """Sleep according to MOCK_LATENCY_PROFILE to stand in for a real provider round trip."""
+    profile = MOCK_LATENCY_PROFILES.get(MOCK_LATENCY_PROFILE)
+    if not profile or provider not in profile:
+        return
+    mean_ms, jitter_ms = profile[provider]
+    rng = _mock_rng("latency", provider, *params)
+    time.sleep(max(0.0, rng.uniform(mean_ms - jitter_ms, mean_ms + jitter_ms)) / 1000)
+
 # Sample data for mock generation
 AIRLINES = [
     {"name": "Delta Airlines", "code": "DL"},
@@ -111,6 +153,33 @@ ACTIVITIES_BY_CATEGORY = {
 class FlightService:
     """Mock flight search service - replace with real API (Amadeus, Skyscanner, etc.)"""
     
+    @staticmethod
+    def _search_duffel(origin: str, dest_info: dict, departure_date: datetime, travelers: int) -> List[FlightOffer]:
+        """Duffel offer request; runs on the provider pool via resilience.guarded_call."""
+        flights = []
+        duffel = Duffel(access_token=DUFFEL_TOKEN)
+        passengers = [{"type": "adult"} for _ in range(travelers)]
+        slices = [{"origin": origin.upper(), "destination": dest_info["airport"], "departure_date": departure_date.strftime("%Y-%m-%d")}]
+        
+        with timer(PROVIDER_CALL_SECONDS, "flights", "duffel"):
+            offer_request = duffel.offer_requests.create().passengers(passengers).slices(slices).execute()
+        
+        for offer in offer_request.offers[:5]:  # Take top 5
+            fl = offer.slices[0].segments[0]
+            flights.append(FlightOffer(
+                id=offer.id,
+                airline=offer.owner.name,
+                flight_number=f"{fl.operating_carrier.airline.iata_code}{fl.operating_carrier.flight_number}",
+                departure_airport=fl.origin.iata_code,
+                arrival_airport=fl.destination.iata_code,
+                departure_time=datetime.fromisoformat(fl.departing_at.replace('Z', '+00:00') if 'Z' in fl.departing_at else fl.departing_at),
+                arrival_time=datetime.fromisoformat(fl.arriving_at.replace('Z', '+00:00') if 'Z' in fl.arriving_at else fl.arriving_at),
+                price=float(offer.total_amount),
+                duration_minutes=int(fl.duration.replace('PT', '').replace('H', '*60+').replace('M', '').strip('+').split('*60+')[0])*60, # Approximation for ISO8601 duration
+                stops=len(offer.slices[0].segments) - 1
+            ))
+        return flights
+
     @staticmethod
     def search_flights(
         origin: str,
@@ -119,7 +188,7 @@ class FlightService:
         return_date: Optional[datetime] = None,
         budget_max: float = 10000,
         travelers: int = 1
-    ) -> List[FlightOption]:
+    ) -> List[FlightOffer]:
         
         dest_info = DESTINATIONS.get(destination.lower())
         if not dest_info:
@@ -130,58 +199,54 @@ class FlightService:
         
         # Real API Integration: Duffel
         if DUFFEL_TOKEN and Duffel:
+            offers_key = ("flights", origin.upper(), dest_info["airport"], departure_date.date(), travelers)
             try:
-                duffel = Duffel(access_token=DUFFEL_TOKEN)
-                passengers = [{"type": "adult"} for _ in range(travelers)]
-                slices = [{"origin": origin.upper(), "destination": dest_info["airport"], "departure_date": departure_date.strftime("%Y-%m-%d")}]
-                
-                offer_request = duffel.offer_requests.create().passengers(passengers).slices(slices).execute()
-                
-                for offer in offer_request.offers[:5]:  # Take top 5
-                    fl = offer.slices[0].segments[0]
-                    flights.append(FlightOption(
-                        id=offer.id,
-                        airline=offer.owner.name,
-                        flight_number=f"{fl.operating_carrier.airline.iata_code}{fl.operating_carrier.flight_number}",
-                        departure_airport=fl.origin.iata_code,
-                        arrival_airport=fl.destination.iata_code,
-                        departure_time=datetime.fromisoformat(fl.departing_at.replace('Z', '+00:00') if 'Z' in fl.departing_at else fl.departing_at),
-                        arrival_time=datetime.fromisoformat(fl.arriving_at.replace('Z', '+00:00') if 'Z' in fl.arriving_at else fl.arriving_at),
-                        price=float(offer.total_amount),
-                        duration_minutes=int(fl.duration.replace('PT', '').replace('H', '*60+').replace('M', '').strip('+').split('*60+')[0])*60, # Approximation for ISO8601 duration
-                        stops=len(offer.slices[0].segments) - 1
-                    ))
-                
+                flights = guarded_call(
+                    "duffel",
+                    lambda: FlightService._search_duffel(origin, dest_info, departure_date, travelers),
+                    timeout=DUFFEL_TIMEOUT,
+                )
                 if len(flights) >= 3:
+                    last_good.put(offers_key, flights)
                     return flights
                 # Fewer than 3 results from Duffel — fall through to supplement with mock
+            except ProviderUnavailable as e:
+                cached = fallback_offers("duffel", offers_key, e.reason)
+                if cached:
+                    return cached
             except Exception as e:
                 print(f"Duffel API Error (Falling back to mock): {e}")
+                cached = fallback_offers("duffel", offers_key, "error")
+                if cached:
+                    return cached
         
         # Generate 3-5 outbound flight options
-        num_flights = random.randint(3, 5)
+        mock_start = time.perf_counter()
+        rng = _mock_rng("flights", origin.upper(), destination.lower(), departure_date.date(), travelers)
+        _emulate_latency("duffel", origin.upper(), destination.lower(), departure_date.date())
+        num_flights = rng.randint(3, 5)
         for i in range(num_flights):
-            airline = random.choice(AIRLINES)
+            airline = rng.choice(AIRLINES)
             
             # Price variation
             base = dest_info["base_price"]
-            price_variation = random.uniform(0.8, 1.4)
+            price_variation = rng.uniform(0.8, 1.4)
             price = round(base * price_variation * travelers, 2)
             
             # Random departure time
-            hour = random.randint(6, 22)
-            dep_time = departure_date.replace(hour=hour, minute=random.choice([0, 15, 30, 45]))
+            hour = rng.randint(6, 22)
+            dep_time = departure_date.replace(hour=hour, minute=rng.choice([0, 15, 30, 45]))
             
             # Flight duration (based on rough distance)
-            duration = random.randint(120, 840)  # 2-14 hours
+            duration = rng.randint(120, 840)  # 2-14 hours
             arr_time = dep_time + timedelta(minutes=duration)
             
-            stops = 0 if random.random() > 0.4 else random.randint(1, 2)
+            stops = 0 if rng.random() > 0.4 else rng.randint(1, 2)
             
-            flights.append(FlightOption(
-                id=str(uuid.uuid4())[:8],
+            flights.append(FlightOffer(
+                id=_mock_offer_id(rng),
                 airline=airline["name"],
-                flight_number=f"{airline['code']}{random.randint(100, 9999)}",
+                flight_number=f"{airline['code']}{rng.randint(100, 9999)}",
                 departure_airport=origin.upper(),
                 arrival_airport=dest_info["airport"],
                 departure_time=dep_time,
@@ -193,6 +258,7 @@ class FlightService:
         
         # Sort by price
         flights.sort(key=lambda x: x.price)
+        PROVIDER_CALL_SECONDS.observe(time.perf_counter() - mock_start, "flights", "mock")
         return flights
 
 
@@ -207,7 +273,7 @@ class HotelService:
         budget_max: float = 5000,
         travel_style: str = "mid-range",
         guests: int = 1
-    ) -> List[HotelOption]:
+    ) -> List[HotelOffer]:
         
         num_nights = (check_out - check_in).days
         if num_nights < 1:
@@ -223,6 +289,10 @@ class HotelService:
             except Exception as e:
                 print(f"Duffel Stays API Error (Falling back to mock): {e}")
         
+        mock_start = time.perf_counter()
+        rng = _mock_rng("hotels", destination.lower(), check_in.date(), check_out.date(), travel_style, guests)
+        _emulate_latency("duffel_stays", destination.lower(), check_in.date(), check_out.date())
+
         # Determine which hotel tiers to include based on travel style
         if travel_style == "luxury":
             tiers = ["luxury", "mid-range"]
@@ -234,42 +304,77 @@ class HotelService:
         for tier in tiers:
             for hotel_template in HOTEL_CHAINS.get(tier, []):
                 # Price variation based on destination and randomness
-                price_mult = random.uniform(0.85, 1.25)
+                price_mult = rng.uniform(0.85, 1.25)
                 price_per_night = round(hotel_template["base_price"] * price_mult, 2)
                 total_price = round(price_per_night * num_nights, 2)
                 
                 # Add location variation to name
-                location_suffix = random.choice(["Downtown", "City Center", "Airport", "Beach", "Old Town", ""])
+                location_suffix = rng.choice(["Downtown", "City Center", "Airport", "Beach", "Old Town", ""])
                 hotel_name = f"{hotel_template['name']} {destination.title()} {location_suffix}".strip()
                 
-                amenities = random.sample([
-                    "Free WiFi", "Pool", "Gym", "Spa", "Restaurant", 
-                    "Room Service", "Airport Shuttle", "Parking", "Bar",
-                    "Business Center", "Concierge", "Pet Friendly"
-                ], k=random.randint(4, 8))
+                amenity_mask = 0
+                for bit in rng.sample(range(len(AMENITIES)), k=rng.randint(4, 8)):
+                    amenity_mask |= 1 << bit
                 
                 room_types = ["Standard Room", "Deluxe Room", "Suite", "King Room", "Double Room"]
                 
-                hotels.append(HotelOption(
-                    id=str(uuid.uuid4())[:8],
+                hotels.append(HotelOffer(
+                    id=_mock_offer_id(rng),
                     hotel_name=hotel_name,
                     address=f"123 Main Street, {destination.title()}",
-                    rating=round(hotel_template["rating"] + random.uniform(-0.2, 0.2), 1),
+                    rating=round(hotel_template["rating"] + rng.uniform(-0.2, 0.2), 1),
                     price_per_night=price_per_night,
                     total_price=total_price,
-                    amenities=amenities,
-                    room_type=random.choice(room_types),
+                    _amenity_mask=amenity_mask,
+                    room_type=rng.choice(room_types),
                     image_url=None
                 ))
         
         # Sort by rating (best first)
         hotels.sort(key=lambda x: x.rating, reverse=True)
+        PROVIDER_CALL_SECONDS.observe(time.perf_counter() - mock_start, "hotels", "mock")
         return hotels
 
 
 class ActivityService:
     """Mock activity search service - replace with real API (Viator, GetYourGuide, etc.)"""
     
+    @staticmethod
+    def _search_viator(destination: str, interests: List[str], budget_max: float) -> List[ActivityOffer]:
+        """Viator free-text product search; runs on the provider pool via resilience.guarded_call."""
+        activities = []
+        headers = {
+            "exp-api-key": VIATOR_TOKEN,
+            "Accept-Language": "en-US",
+            "Accept": "application/json;version=2.0"
+        }
+        payload = {
+            "searchTerm": destination,
+            "searchTypes": ["PRODUCTS"]
+        }
+        with httpx.Client(timeout=VIATOR_TIMEOUT) as client, timer(PROVIDER_CALL_SECONDS, "activities", "viator"):
+            response = client.post("https://api.viator.com/partner/search/freetext", headers=headers, json=payload)
+        # Non-200 counts as a provider failure for the breaker
+        response.raise_for_status()
+
+        results = response.json().get("products", [])
+        for item in results[:6]:
+            price = float(item.get("pricing", {}).get("summary", {}).get("fromPrice", 100.0))
+            if price > budget_max:
+                continue
+            activities.append(ActivityOffer(
+                id=item.get("productCode", next_offer_id()),
+                activity_name=item.get("title", f"Tour in {destination}"),
+                description=item.get("description", "A highly rated experience.")[:120] + "...",
+                location=destination.title(),
+                price=price,
+                duration_hours=random.randint(2, 6), # Typically nested deeply in Viator API
+                category="adventure" if "adventure" in (item.get("searchType", "").lower()) else random.choice(list(interests or ["culture"])),
+                rating=round(float(item.get("reviews", {}).get("combinedAverageRating", 4.5)), 1),
+                image_url=None
+            ))
+        return activities
+
     @staticmethod
     def search_activities(
         destination: str,
@@ -277,7 +382,7 @@ class ActivityService:
         end_date: datetime,
         interests: List[str] = None,
         budget_max: float = 1000
-    ) -> List[ActivityOption]:
+    ) -> List[ActivityOffer]:
         
         if not interests:
             interests = ["culture", "food", "relaxation"]
@@ -286,40 +391,27 @@ class ActivityService:
         
         # Real API Integration: Viator
         if VIATOR_TOKEN and httpx:
+            offers_key = ("activities", destination.lower(), tuple(sorted(interests)), budget_max)
             try:
-                headers = {
-                    "exp-api-key": VIATOR_TOKEN,
-                    "Accept-Language": "en-US",
-                    "Accept": "application/json;version=2.0"
-                }
-                payload = {
-                    "searchTerm": destination,
-                    "searchTypes": ["PRODUCTS"]
-                }
-                with httpx.Client(timeout=3.0) as client:
-                    response = client.post("https://api.viator.com/partner/search/freetext", headers=headers, json=payload)
-                    
-                    if response.status_code == 200:
-                        results = response.json().get("products", [])
-                        for item in results[:6]:
-                            price = float(item.get("pricing", {}).get("summary", {}).get("fromPrice", 100.0))
-                            if price > budget_max:
-                                continue
-                            activities.append(ActivityOption(
-                                id=item.get("productCode", str(uuid.uuid4())[:8]),
-                                activity_name=item.get("title", f"Tour in {destination}"),
-                                description=item.get("description", "A highly rated experience.")[:120] + "...",
-                                location=destination.title(),
-                                price=price,
-                                duration_hours=random.randint(2, 6), # Typically nested deeply in Viator API
-                                category="adventure" if "adventure" in (item.get("searchType", "").lower()) else random.choice(list(interests or ["culture"])),
-                                rating=round(float(item.get("reviews", {}).get("combinedAverageRating", 4.5)), 1),
-                                image_url=None
-                            ))
-                        if activities:
-                            return activities
+                # Free-text search is idempotent, so a slow first attempt gets a hedge request
+                activities = guarded_call(
+                    "viator",
+                    lambda: ActivityService._search_viator(destination, interests, budget_max),
+                    timeout=VIATOR_TIMEOUT,
+                    hedge_after=VIATOR_HEDGE_AFTER,
+                )
+                if activities:
+                    last_good.put(offers_key, activities)
+                    return activities
+            except ProviderUnavailable as e:
+                cached = fallback_offers("viator", offers_key, e.reason)
+                if cached:
+                    return cached
             except Exception as e:
                 print(f"Viator API Error (Falling back to mock): {e}")
+                cached = fallback_offers("viator", offers_key, "error")
+                if cached:
+                    return cached
         
         # Expand interests to include related categories
         all_categories = set(interests)
@@ -338,12 +430,16 @@ class ActivityService:
         if not all_categories:
             all_categories = {"culture", "food", "relaxation"}
         
-        for category in all_categories:
+        mock_start = time.perf_counter()
+        rng = _mock_rng("activities", destination.lower(), start_date.date(), end_date.date(), sorted(all_categories), budget_max)
+        _emulate_latency("viator", destination.lower(), start_date.date())
+
+        for category in sorted(all_categories):
             category_activities = ACTIVITIES_BY_CATEGORY.get(category, [])
             
             for activity_template in category_activities:
                 # Price variation
-                price = round(float(activity_template["base_price"]) * random.uniform(0.9, 1.3), 2)
+                price = round(float(activity_template["base_price"]) * rng.uniform(0.9, 1.3), 2)
                 
                 if price > budget_max:
                     continue
@@ -351,20 +447,21 @@ class ActivityService:
                 # Localize the activity name
                 activity_name = f"{activity_template['name']} in {destination.title()}"
                 
-                activities.append(ActivityOption(
-                    id=str(uuid.uuid4())[:8],
+                activities.append(ActivityOffer(
+                    id=_mock_offer_id(rng),
                     activity_name=activity_name,
                     description=f"Experience an amazing {activity_template['name'].lower()} during your visit to {destination.title()}. Perfect for travelers interested in {category}.",
                     location=f"{destination.title()} City Center",
                     price=price,
                     duration_hours=activity_template["duration"],
                     category=category,
-                    rating=round(random.uniform(4.0, 5.0), 1),
+                    rating=round(rng.uniform(4.0, 5.0), 1),
                     image_url=None
                 ))
         
         # Sort by rating
         activities.sort(key=lambda x: x.rating, reverse=True)
+        PROVIDER_CALL_SECONDS.observe(time.perf_counter() - mock_start, "activities", "mock")
         return activities
 
 
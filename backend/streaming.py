@@ -0,0 +1,114 @@
+"""
+Streaming JSON Responses
+Iterates the DB cursor in batches and writes rows straight to the response as NDJSON
+or as a chunked JSON array, skipping per-row Pydantic validation on the hot path.
+"""
+
+import json
+import os
+from dataclasses import is_dataclass
+from datetime import date, datetime
+from typing import Any, Callable, Iterable, Iterator, get_args, get_origin
+
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+
+from models import SessionLocal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+STREAM_BATCH_SIZE = int(os.environ.get("STREAM_BATCH_SIZE", "500"))
+
+_field_plans = {}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if is_dataclass(value):
+        return {name: getattr(value, name) for name in value.__dataclass_fields__ if not name.startswith("_")}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value) -> bytes:
+    if orjson:
+        return orjson.dumps(value)
+    return json.dumps(value, default=_json_default, separators=(",", ":")).encode()
+
+
+class ORJSONResponse(Response):
+    """JSON response encoded with orjson (stdlib json fallback); dataclasses are encoded natively."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _field_plan(schema):
+    """Field names of a response schema, with nested list-of-model fields resolved once."""
+    plan = _field_plans.get(schema)
+    if plan is None:
+        plan = []
+        for name, field in schema.model_fields.items():
+            nested = None
+            if get_origin(field.annotation) in (list, tuple):
+                args = get_args(field.annotation)
+                if args and isinstance(args[0], type) and issubclass(args[0], BaseModel):
+                    nested = args[0]
+            plan.append((name, nested))
+        _field_plans[schema] = plan
+    return plan
+
+
+def serialize_row(obj, schema) -> dict:
+    """Build the dict a response_model would produce, reading ORM attributes directly."""
+    row = {}
+    for name, nested in _field_plan(schema):
+        value = getattr(obj, name, None)
+        if nested is not None:
+            value = [serialize_row(item, nested) for item in (value or [])]
+        row[name] = value
+    return row
+
+
+def _encode_batch(buffer, fmt: str, first: bool) -> bytes:
+    if fmt == "ndjson":
+        return b"\n".join(buffer) + b"\n"
+    chunk = b",".join(buffer)
+    return chunk if first else b"," + chunk
+
+
+def stream_rows(build_query: Callable, schema, fmt: str = "ndjson") -> Iterator[bytes]:
+    """Yield encoded rows one batch at a time; uses its own session since it outlives the request."""
+    db = SessionLocal()
+    try:
+        query = build_query(db).yield_per(STREAM_BATCH_SIZE)
+        if fmt == "json":
+            yield b"["
+        buffer = []
+        first = True
+        for obj in query:
+            buffer.append(dumps(serialize_row(obj, schema)))
+            if len(buffer) >= STREAM_BATCH_SIZE:
+                yield _encode_batch(buffer, fmt, first)
+                first = False
+                buffer = []
+        if buffer:
+            yield _encode_batch(buffer, fmt, first)
+        if fmt == "json":
+            yield b"]"
+    finally:
+        db.close()
+
+
+def streaming_response(build_query: Callable, schema, fmt: str) -> StreamingResponse:
+    media_type = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+    return StreamingResponse(stream_rows(build_query, schema, fmt), media_type=media_type)
+
+
+def ndjson_response(items: Iterable[Any]) -> StreamingResponse:
+    """Stream an iterable of JSON-ready objects as NDJSON, one line per item as it is produced."""
+    return StreamingResponse((dumps(item) + b"\n" for item in items), media_type="application/x-ndjson")